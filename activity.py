@@ -0,0 +1,115 @@
+"""
+    Time-windowed eligibility: only the entries of a recent or scheduled period count in the draw.
+"""
+import datetime
+import time
+from array import array
+
+from participants import COLUMNS
+
+
+ACTIVITY_BUCKETS = 60   # Buckets of a sliding window, which is accurate to window / ACTIVITY_BUCKETS
+
+
+def parse_time(text):
+    """
+    Timestamp of 'HH:MM' (today) or 'YYYY-MM-DD HH:MM'
+    """
+    try:
+        moment = datetime.datetime.strptime(text, '%H:%M')
+        moment = datetime.datetime.combine(datetime.date.today(), moment.time())
+    except ValueError:
+        moment = datetime.datetime.strptime(text, '%Y-%m-%d %H:%M')
+    return moment.timestamp()
+
+
+class ActivityWindow():
+    """
+        Entries per viewer over the last `window` seconds and/or between the scheduled start and end
+        wall-clock times.
+
+        Entries outside the schedule are ignored. With a sliding window, entries are accumulated into a
+        ring of time buckets as well as into the per-viewer counts of the window; when the window slides
+        past a bucket, the bucket's counts are subtracted and viewers left with nothing drop out. So the
+        eligible viewers and their counts are always up to date, at a cost proportional to the activity
+        that expired, never to the whole session. After the scheduled end the window stops sliding.
+    """
+
+    def __init__(self, window=None, start=None, end=None, num_buckets=ACTIVITY_BUCKETS):
+        self.window, self.start, self.end = window, start, end
+        self.span = window / num_buckets if window else None
+        self.buckets = [{} for _ in range(num_buckets if window else 1)]  # uid -> entries, by bucket number
+        self.newest = None      # Number of the newest bucket, bucket n covers [n * span, (n + 1) * span)
+        self.counts = {}        # uid -> entries in the window
+        self.num_expired = 0    # Entries slid out of the window
+
+    def __len__(self):
+        return len(self.counts)
+
+    def _slide(self, number):
+        """
+        Make `number` the newest bucket, expiring the buckets it pushes out of the window
+        """
+        if self.newest is None:
+            self.newest = number
+            return
+        if number <= self.newest:
+            return
+        num_buckets = len(self.buckets)
+        counts = self.counts
+        for expired in range(max(self.newest + 1, number - num_buckets + 1), number + 1):
+            bucket = self.buckets[expired % num_buckets]
+            for uid, count in bucket.items():
+                remaining = counts[uid] - count
+                if remaining:
+                    counts[uid] = remaining
+                else:
+                    del counts[uid]
+                self.num_expired += count
+            bucket.clear()
+        self.newest = number
+
+    def add(self, uid, count, when):
+        """
+        Register `count` entries of a viewer at wall-clock time `when`
+        """
+        if self.start is not None and when < self.start or self.end is not None and when >= self.end:
+            return
+        if self.span is not None:
+            number = int(when // self.span)
+            self._slide(number)
+            if number <= self.newest - len(self.buckets):
+                return  # Already out of the window
+            bucket = self.buckets[number % len(self.buckets)]
+            bucket[uid] = bucket.get(uid, 0) + count
+        self.counts[uid] = self.counts.get(uid, 0) + count
+
+    def active(self, now=None):
+        """
+        Slide the window to `now` and return the {uid: entries} of the eligible viewers
+        """
+        if self.span is not None:
+            now = time.time() if now is None else now
+            if self.end is not None:
+                now = min(now, self.end)
+            self._slide(int(now // self.span))
+        return self.counts
+
+    def snapshot(self, store, min_count=None, exclude=None, now=None):
+        """
+        Snapshot of the participants in the window, with their entries in the window as counts
+        """
+        counts = self.active(now)
+        rows = sorted(store.index[uid] for uid, count in counts.items()
+                      if (not min_count or count >= min_count) and not (exclude and uid in exclude))
+        snapshot = store.snapshot(rows)
+        return snapshot._replace(counts=array(COLUMNS['counts'], (counts[uid] for uid in snapshot.uids)))
+
+    def stats(self):
+        return {
+            'window_sec': self.window,
+            'start': self.start,
+            'end': self.end,
+            'eligible_viewers': len(self.active()),
+            'expired_entries': self.num_expired,
+        }
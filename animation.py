@@ -0,0 +1,72 @@
+"""
+    Timer-driven lottery animation.
+"""
+import asyncio
+import bisect
+import math
+import time
+from itertools import accumulate
+
+from PyQt5.QtCore import QObject, Qt, QTimer, pyqtSignal
+
+
+def frame_offsets(interval_min, interval_max, interval_inc):
+    """
+    Start time in ms of each frame, the frames slowing down from interval_min to interval_max
+    """
+    intervals = range(interval_min, interval_max, interval_inc)
+    return [0] + list(accumulate(intervals))
+
+
+class LotteryAnimation(QObject):
+    """
+        Plays a precomputed sequence of names, each shown at a fixed offset from the start.
+
+        The frames, including the final winner, are decided before the animation starts, so the whole
+        sequence follows from the lottery seed. A precise single-shot QTimer wakes up at the next frame's
+        due time measured on the monotonic clock. If the event loop was busy and frames are overdue,
+        they are skipped and the frame due now is shown, so the animation always ends on time.
+    """
+
+    finished = pyqtSignal()
+
+    def __init__(self, show_frame, names, offsets_ms, parent=None):
+        super(LotteryAnimation, self).__init__(parent)
+        assert len(names) == len(offsets_ms) > 0
+        self.show_frame = show_frame
+        self.names = names
+        self.offsets_ms = offsets_ms
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self._tick)
+        self.start_time = None
+        self.current = -1   # Frame on display
+        self.num_skipped = 0
+
+    def start(self):
+        self.start_time = time.monotonic()
+        self.current = -1
+        self.num_skipped = 0
+        self._tick()
+
+    async def play(self):
+        """
+        Start the animation and wait for its last frame
+        """
+        done = asyncio.get_running_loop().create_future()
+        self.finished.connect(lambda: done.done() or done.set_result(None))
+        self.start()
+        await done
+
+    def _tick(self):
+        elapsed_ms = (time.monotonic() - self.start_time) * 1000
+        due = bisect.bisect_right(self.offsets_ms, elapsed_ms) - 1
+        if due > self.current:
+            self.num_skipped += due - self.current - 1
+            self.current = due
+            self.show_frame(self.names[due])
+        if self.current == len(self.names) - 1:
+            self.finished.emit()
+            return
+        self.timer.start(max(0, math.ceil(self.offsets_ms[self.current + 1] - elapsed_ms)))
@@ -0,0 +1,123 @@
+"""
+    Synthetic / recorded DANMU_MSG traffic and an in-process event injector for benchmarks.
+
+    Events have the same shape as the ones dispatched by bilibili_api's LiveDanmaku, so they can be fed
+    straight into Danmuku._on_event (or any other handler) without a websocket connection.
+"""
+import asyncio
+import json
+import random
+import time
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+
+DEFAULT_KEYWORD = '抽奖'
+
+
+def make_danmu_event(uid, viewer_name, msg, medal_name='', medal_level=0, room_id=0):
+    medal = [medal_level, medal_name, 'anchor', room_id] if medal_name else []
+    info = [[0, 1, 25, 16777215, int(time.time() * 1000)], msg, [uid, viewer_name, 0, 0, 0, 10000, 1, ''],
+            medal, [0, 0, 9868950, '>50000'], ['', ''], 0, 0, None]
+    return {'room_display_id': room_id, 'room_real_id': room_id, 'type': 'DANMU_MSG',
+            'data': {'cmd': 'DANMU_MSG', 'info': info}}
+
+
+def pick_viewer(rng, num_viewers, distribution, seq):
+    if distribution == 'uniform':
+        return rng.randrange(num_viewers)
+    if distribution == 'zipf':
+        # A few heavy chatters and a long tail of viewers chatting once or twice
+        return min(int(rng.paretovariate(1.2)) - 1, num_viewers - 1)
+    if distribution == 'unique':
+        return seq   # Every danmu comes from a new viewer, worst case for the participant store
+    raise ValueError(f"Unknown viewer distribution: {distribution}")
+
+
+def synthetic_events(num_events, num_viewers=10000, distribution='uniform', keyword_ratio=0.5,
+                     medal_ratio=0.3, keyword=DEFAULT_KEYWORD, medal_name='粉丝团', seed=0):
+    """
+    Generate `num_events` DANMU_MSG events from `num_viewers` viewers.
+
+    keyword_ratio / medal_ratio are the fraction of danmu containing the keyword / wearing the medal.
+    """
+    rng = random.Random(seed)
+    events = []
+    for seq in range(num_events):
+        uid = 1000 + pick_viewer(rng, num_viewers, distribution, seq)
+        msg = f"{keyword}{seq % 7}" if rng.random() < keyword_ratio else f"弹幕{seq % 13}"
+        medal = medal_name if rng.random() < medal_ratio else ''
+        events.append(make_danmu_event(uid, f"观众{uid}", msg, medal, rng.randint(1, 30)))
+    return events
+
+
+def load_events(path):
+    """
+    Load recorded events, one JSON event per line (as dispatched by LiveDanmaku). Non danmu events are skipped.
+    """
+    with open(path, encoding='utf-8') as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    return [event for event in events if event.get('type', event.get('data', {}).get('cmd')) == 'DANMU_MSG']
+
+
+def percentiles(samples, points=(50, 95, 99)):
+    if not samples:
+        return {f'p{point}': 0 for point in points}
+    samples = sorted(samples)
+    return {f'p{point}': samples[min(len(samples) - 1, len(samples) * point // 100)] for point in points}
+
+
+def max_rss_kb():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+async def sample_loop_lag(lags, interval=0.01):
+    """
+    Record how late the event loop wakes up compared to the requested sleep, in ms
+    """
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - start - interval) * 1000)
+
+
+async def inject(handler, events, rate=0, tick=0.01):
+    """
+    Feed the events to the async `handler` at `rate` events/sec (0 for as fast as possible).
+
+    Events are injected in bursts every `tick` seconds so the rest of the loop (timers, GUI) keeps running.
+    Returns a report with the achieved throughput, handler latency percentiles and loop lag.
+    """
+    latencies, lags = [], []
+    lag_task = asyncio.create_task(sample_loop_lag(lags))
+    rss_before = max_rss_kb()
+    per_tick = max(1, int(rate * tick)) if rate else 1000
+    start = time.perf_counter()
+    for offset in range(0, len(events), per_tick):
+        for event in events[offset: offset + per_tick]:
+            handler_start = time.perf_counter_ns()
+            await handler(event)
+            latencies.append(time.perf_counter_ns() - handler_start)
+        if rate:
+            # Wait for the next tick of the schedule, never sleep less than 0 to let the loop breathe
+            due = start + (offset + per_tick) / rate
+            await asyncio.sleep(max(0, due - time.perf_counter()))
+        else:
+            await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    lag_task.cancel()
+    rss_after = max_rss_kb()
+    return {
+        'events': len(events),
+        'seconds': round(elapsed, 3),
+        'events_per_sec': round(len(events) / elapsed, 1) if elapsed else 0,
+        'handler_latency_us': {key: round(ns / 1000, 1) for key, ns in percentiles(latencies).items()},
+        'loop_lag_ms': {**{key: round(ms, 2) for key, ms in percentiles(lags).items()},
+                        'max': round(max(lags, default=0), 2)},
+        'max_rss_growth_kb': rss_after - rss_before if rss_before is not None else None,
+    }
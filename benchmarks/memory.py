@@ -0,0 +1,87 @@
+"""
+    Memory footprint of the participant store for huge audiences.
+
+    Registers distinct viewers (bilibili-like uids, 2 to 12 character CJK/ASCII names) in a
+    ParticipantStore and reports the bytes allocated per participant as the store grows, the cost of
+    the end-of-session snapshot, and what is left once the store is dropped. Several rounds show that
+    the footprint is stable from one session to the next.
+
+        python benchmarks/memory.py --participants 500000 --rounds 3
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from participants import ParticipantStore
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+
+NAME_CHARS = '一二三四五六七八九十天地玄黄宇宙洪荒日月盈昃辰宿列张小猫狗鱼abcdefghijklmnopqrstuvwxyz0123456789_'
+
+
+def viewers(num_viewers, seed=0):
+    """
+    Distinct (uid, name) pairs, names generated on the fly so that only the store keeps them
+    """
+    rng = random.Random(seed)
+    for uid in rng.sample(range(10 ** 8, 10 ** 10), num_viewers):
+        yield uid, ''.join(rng.choices(NAME_CHARS, k=rng.randint(2, 12)))
+
+
+def run_round(num_participants, num_steps, seed):
+    gc.collect()
+    base = tracemalloc.get_traced_memory()[0]
+    store = ParticipantStore()
+    steps = []
+    step = max(num_participants // num_steps, 1)
+    start = time.perf_counter()
+    now = time.time()
+    for row, (uid, name) in enumerate(viewers(num_participants, seed), 1):
+        store.add(uid, name, row % 30, 1, now, now)
+        if row % step == 0 or row == num_participants:
+            used = tracemalloc.get_traced_memory()[0] - base
+            steps.append({'participants': row, 'bytes': used, 'bytes_per_participant': round(used / row, 1)})
+    elapsed = time.perf_counter() - start
+    store_bytes = tracemalloc.get_traced_memory()[0] - base
+    snapshot = store.snapshot()
+    snapshot_bytes = tracemalloc.get_traced_memory()[0] - base - store_bytes
+    del snapshot, store
+    gc.collect()
+    return {
+        'steps': steps,
+        'bytes_per_participant': round(store_bytes / num_participants, 1),
+        'snapshot_bytes_per_participant': round(snapshot_bytes / num_participants, 1),
+        'residual_bytes': tracemalloc.get_traced_memory()[0] - base,
+        'adds_per_sec': round(num_participants / elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--participants', type=int, default=500000)
+    parser.add_argument('--rounds', type=int, default=3, help="sessions run one after the other")
+    parser.add_argument('--steps', type=int, default=5, help="footprint measurements per round")
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    rounds = [run_round(args.participants, args.steps, seed) for seed in range(args.rounds)]
+    report = {'participants': args.participants, 'rounds': rounds}
+    if resource is not None:
+        # Kilobytes on Linux, bytes on macOS
+        report['max_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+    Cold-start benchmark of danmuji.
+
+    Reports the import time of the application modules (parsed from `python -X importtime`) and the
+    time from process spawn to the first shown main window, and fails when the median time exceeds
+    the budget or when a heavy module (numpy, bilibili_api) is loaded before the first window.
+
+        python benchmarks/startup.py --runs 5 --budget-ms 2500
+        python benchmarks/startup.py --exe dist/弹幕抽奖姬.exe     # measure the packaged build
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules whose cumulative import time is reported
+REPORTED_MODULES = ['PyQt5.QtWidgets', 'qasync', 'ui', 'viewer_model', 'participants', 'core', 'manager', 'gui',
+                    'numpy', 'bilibili_api']
+FIRST_WINDOW_BUDGET_MS = 3000
+
+
+def measure_imports(module='gui'):
+    """
+    Returns {module: cumulative import time in ms} for the modules imported by `import <module>`
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative) / 1000
+    return times
+
+
+def measure_first_window(command):
+    """
+    Returns (ms from spawn to the first shown window, heavy modules loaded by then)
+    """
+    env = dict(os.environ, DANMUJI_STARTUP_PROBE='1')
+    start = time.time()
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+    for line in result.stdout.splitlines():
+        if line.startswith('{') and 'first_window' in line:
+            probe = json.loads(line)
+            return (probe['first_window'] - start) * 1000, probe['heavy_modules']
+    raise RuntimeError(f"No startup probe in the output of {command}:\n{result.stdout}\n{result.stderr}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=FIRST_WINDOW_BUDGET_MS,
+                        help="max median time to first window")
+    parser.add_argument('--exe', help="packaged executable to measure instead of `python danmuji.py`")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args()
+
+    import_times = measure_imports()
+    command = [args.exe] if args.exe else [sys.executable, 'danmuji.py']
+    runs = [measure_first_window(command) for _ in range(args.runs)]
+    first_window_ms = statistics.median(ms for ms, _ in runs)
+    heavy_modules = sorted({module for _, modules in runs for module in modules})
+
+    report = {
+        'import_ms': {module: import_times[module] for module in REPORTED_MODULES if module in import_times},
+        'first_window_ms': [round(ms, 1) for ms, _ in runs],
+        'first_window_median_ms': round(first_window_ms, 1),
+        'budget_ms': args.budget_ms,
+        'heavy_modules_at_first_window': heavy_modules,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for module, ms in report['import_ms'].items():
+            print(f"import {module:<20} {ms:8.1f} ms")
+        print(f"first window (median of {args.runs}) {first_window_ms:8.1f} ms, budget {args.budget_ms:.0f} ms")
+
+    failed = False
+    if first_window_ms > args.budget_ms:
+        print(f"FAIL: time to first window {first_window_ms:.1f} ms exceeds the budget", file=sys.stderr)
+        failed = True
+    if heavy_modules:
+        print(f"FAIL: {', '.join(heavy_modules)} imported before the first window", file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
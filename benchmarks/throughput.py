@@ -0,0 +1,97 @@
+"""
+    Danmu throughput benchmark for the headless and GUI paths.
+
+    Synthetic (or recorded) DANMU_MSG events are injected into Danmuku._on_event at a configurable rate.
+    In the GUI path the monitor callback is MainWindow.update_monitor with the refresh timer running, so
+    the cost of the Qt redraws shows up in the loop lag.
+
+        python benchmarks/throughput.py --events 100000 --viewers 20000 --distribution zipf
+        QT_QPA_PLATFORM=offscreen python benchmarks/throughput.py --gui --rate 500
+        python benchmarks/throughput.py --replay recorded_events.jsonl
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import Danmuku
+from dedup import DanmuDeduplicator
+from filters import FilterRules
+from loadgen import DEFAULT_KEYWORD, inject, load_events, synthetic_events
+
+
+def start_danmuku(callback, paizi, keyword, dedup_window=0):
+    """
+    Set up a Danmuku as start_monitor would, without connecting to a live room
+    """
+    danmuku = Danmuku()
+    danmuku.new_danmu_callback = callback
+    danmuku.paizi, danmuku.keyword = paizi, keyword
+    danmuku.rules = FilterRules.parse(paizi, keyword)
+    danmuku.dedup = DanmuDeduplicator(dedup_window)
+    return danmuku
+
+
+async def run_headless(events, args):
+    latest = {}
+
+    def on_danmu(num_danmu, participants):
+        latest['num_danmu'], latest['num_viewers'] = num_danmu, len(participants)
+
+    danmuku = start_danmuku(on_danmu, args.paizi, args.keyword, args.dedup_window)
+    report = await inject(danmuku._on_event, events, args.rate)
+    return dict(report, path='headless', **latest)
+
+
+async def run_gui(events, args):
+    from gui import MainWindow
+    from ui import Ui_MainWindow
+
+    main_window = MainWindow()
+    ui = Ui_MainWindow()
+    ui.setupUi(main_window)
+    main_window.setup_ui(ui)
+    main_window.show()
+
+    danmuku = start_danmuku(main_window.update_monitor, args.paizi, args.keyword, args.dedup_window)
+    main_window.monitor_timer.start()
+    report = await inject(danmuku._on_event, events, args.rate)
+    main_window.monitor_timer.stop()
+    main_window.refresh_monitor()
+    return dict(report, path='gui', num_danmu=danmuku.num_danmu, num_viewers=len(danmuku.participants),
+                refreshes=main_window.num_refreshes, coalesced=main_window.num_coalesced)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=50000)
+    parser.add_argument('--viewers', type=int, default=10000, help="number of distinct viewers")
+    parser.add_argument('--distribution', choices=['uniform', 'zipf', 'unique'], default='uniform')
+    parser.add_argument('--keyword-ratio', type=float, default=0.5)
+    parser.add_argument('--replay', help="JSON lines file of recorded events instead of synthetic traffic")
+    parser.add_argument('--rate', type=float, default=0, help="events/sec, 0 for as fast as possible")
+    parser.add_argument('--keyword', default=DEFAULT_KEYWORD)
+    parser.add_argument('--paizi')
+    parser.add_argument('--dedup-window', type=float, default=0, help="seconds of repeat suppression, 0 to disable")
+    parser.add_argument('--gui', action='store_true', help="benchmark the GUI path instead of the headless one")
+    args = parser.parse_args()
+
+    if args.replay:
+        events = load_events(args.replay)
+    else:
+        events = synthetic_events(args.events, args.viewers, args.distribution, args.keyword_ratio)
+
+    if args.gui:
+        import qasync
+        import gui  # Sets the Qt application attributes, must happen before qasync creates the QApplication
+        report = qasync.run(run_gui(events, args))
+    else:
+        report = asyncio.run(run_headless(events, args))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
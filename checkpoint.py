@@ -0,0 +1,145 @@
+"""
+    Incremental checkpoints of a monitoring session, to resume after a crash.
+
+    A checkpoint file holds one JSON line per checkpoint:
+
+        {"time": ..., "counters": {...}, "rows": [[uid, name, count, medal_level, first_seen, last_seen], ...],
+         "updates": [[row, count, medal_level, last_seen], ...]}
+
+    `rows` are the viewers registered since the previous line and `updates` the older rows whose count,
+    medal level or last-seen time changed, so each line only costs what changed. Every COMPACT_EVERY lines the file is
+    rewritten as a single full line. Full lines, the first one in particular, also hold the session's start time
+    and filter parameters:
+
+        {..., "full": true, "session": {"started_at": ..., "params": {"paizi": ..., "keyword": ..., ...}}}
+
+    A checkpoint is only resumed by a session with the same parameters, within RESUME_MAX_AGE of its last line.
+    Otherwise it is moved aside to <path>.stale and the session starts afresh.
+"""
+import json
+import logging
+import os
+import time
+
+
+CHECKPOINT_INTERVAL = 5.0   # Seconds between two checkpoints
+COMPACT_EVERY = 100
+RESUME_MAX_AGE = 30 * 60    # Seconds after which an unfinished session is not resumed anymore
+
+logger = logging.getLogger(__name__)
+
+
+class Checkpointer():
+    """
+        Checkpoints of one room's participant store and counters.
+
+        delta() runs on the event loop and only copies what changed; write() does the serialization and
+        the (fsync'ed) disk write and is meant to run in an executor.
+    """
+
+    def __init__(self, path, interval=CHECKPOINT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.saved_rows = 0     # Rows of the store already in the file
+        self.num_lines = 0
+        self.session = None     # {'started_at': ..., 'params': {...}} of the session being checkpointed
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self, store, params):
+        """
+        Start checkpointing a session with the given (JSON-serializable) filter parameters. If an unfinished
+        session with the same parameters was checkpointed recently, replay it into the empty participant
+        store and return its counters, otherwise return None.
+        """
+        params = json.loads(json.dumps(params))     # As they read back from the file
+        self.session = {'started_at': time.time(), 'params': params}
+        if not self.exists():
+            return None
+        deltas, torn = [], False
+        end = 0     # Offset after the last complete line
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError
+                    deltas.append(json.loads(line))
+                except ValueError:
+                    torn = True     # Last line of a crash
+                    break
+                end += len(line)
+        session = deltas[0].get('session') if deltas else None
+        if session is None or session['params'] != params or time.time() - deltas[-1]['time'] > RESUME_MAX_AGE:
+            logger.warning("Not resuming %s, it is older than %ds or was made with other parameters: %s",
+                           self.path, RESUME_MAX_AGE, session)
+            os.replace(self.path, self.path + '.stale')
+            return None
+        if torn:
+            # The next deltas must not be appended to the torn line
+            logger.warning("Dropping the torn end of %s after offset %d", self.path, end)
+            os.truncate(self.path, end)
+        for delta in deltas:
+            for uid, name, count, medal_level, first_seen, last_seen in delta['rows']:
+                store.add(uid, name, medal_level, count, first_seen, last_seen)
+            for row, count, medal_level, last_seen in delta['updates']:
+                store.counts[row], store.medal_levels[row], store.last_seen[row] = count, medal_level, last_seen
+        store.dirty.clear()
+        self.session = session
+        self.saved_rows = len(store)
+        self.num_lines = len(deltas)
+        return deltas[-1]['counters']
+
+    def delta(self, store, counters):
+        """
+        Collect what changed in the store since the last checkpoint. Returns None if nothing did.
+        """
+        start = 0 if self.num_lines >= COMPACT_EVERY else self.saved_rows
+        if start == len(store) and not store.dirty:
+            return None
+        rows = list(zip(store.uids[start:], store.names[start:], store.counts[start:], store.medal_levels[start:],
+                        store.first_seen[start:], store.last_seen[start:]))
+        updates = [(row, store.counts[row], store.medal_levels[row], store.last_seen[row])
+                   for row in store.dirty if row < start]
+        store.dirty.clear()
+        self.saved_rows = len(store)
+        delta = {'time': time.time(), 'counters': counters, 'rows': rows, 'updates': updates, 'full': start == 0}
+        if start == 0:
+            delta['session'] = self.session
+        return delta
+
+    def reset(self):
+        """
+        Make the next delta a full checkpoint, e.g. after a failed write lost the changes of the last one
+        """
+        self.num_lines = COMPACT_EVERY
+
+    def write(self, delta):
+        """
+        Append the delta to the checkpoint file, or replace the file with it if it is a full checkpoint
+        """
+        line = json.dumps(delta, ensure_ascii=False) + '\n'
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if delta['full']:
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self.path + '.tmp', self.path)
+            self.num_lines = 1
+        else:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.num_lines += 1
+
+    def remove(self):
+        """
+        Drop the checkpoint once the session ended normally
+        """
+        if self.exists():
+            os.remove(self.path)
+        self.saved_rows, self.num_lines = 0, 0
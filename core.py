@@ -2,7 +2,24 @@
     Test getting live danmu from bilibili live room.
 """
 import asyncio
-from bilibili_api import live, sync
+import logging
+import time
+from collections import Counter
+
+from activity import ActivityWindow
+from dedup import DEDUP_WINDOW, DanmuDeduplicator
+from exclusions import ExclusionIndex
+from filters import FilterRules
+from metrics import METRICS
+from participants import ParticipantStore
+from sources import DEFAULT_SOURCE_WEIGHTS, PARSERS
+from supervisor import ConnectionSupervisor
+
+
+WORKER_DRAIN_INTERVAL = 0.05    # Seconds between two polls of the worker thread's queue
+TOP_VIEWERS = 5     # Most active viewers reported in stats()
+
+logger = logging.getLogger(__name__)
 
 
 class Danmuku():
@@ -14,66 +31,319 @@ class Danmuku():
 
     def __init__(self):
         # Internal states
-        self.room = None
+        self.supervisor = None
+        self.room_id = None
+        self.worker = None
         self.num_danmu = 0
-        self.viewer_list = []
+        self.num_events = 0     # DANMU_MSG received, before filtering
+        self.start_time = None
+        self.participants = ParticipantStore()
+        self.new_danmu_callback = None
+        self.paizi, self.keyword = None, None
+        self.rules = FilterRules()
+        self.dedup = DanmuDeduplicator(0)
+        self.exclusions = ExclusionIndex()
+        self.num_excluded = 0
+        self.activity = None    # ActivityWindow if only the entries of a time window count
+        self.source_weights = dict(DEFAULT_SOURCE_WEIGHTS)   # Event type -> entries per event
+        self.num_entries = Counter()    # Event type -> accepted events
+        self.recorder = None
+        self.checkpointer, self.checkpoint_task, self.checkpoint_stopped = None, None, None
         self.start_monitor_task, self.stop_monitor_task = None, None
+        self.worker_error = None    # Why the worker thread exited on its own, if it did
+        self.resumed = None     # {'viewers', 'danmu', 'started_at'} if the session was resumed from a checkpoint
         self.loop = None
 
     async def get_room_info(self, room_id):
         """
         Returns room title, anchor name, live status
         """
+        # bilibili_api is heavy to import, only load it when it is actually needed
+        from bilibili_api import live
         room_info = await live.LiveRoom(room_id).get_room_info()
         return room_info['room_info']['title'], \
                room_info['anchor_info']['base_info']['uname'], \
                room_info['room_info']['live_status']
 
-    async def start_monitor(self, new_danmu_callback, room_id, paizi=None, keyword=None):
-        print("Start monitoring!")
+    async def start_monitor(self, new_danmu_callback, room_id, paizi=None, keyword=None, threaded=False,
+                            recorder=None, checkpointer=None, dedup_window=DEDUP_WINDOW, source_weights=None,
+                            exclusions=None, window=None, window_start=None, window_end=None):
+        """
+        Start monitoring the danmu of a live room.
+
+        The event types of source_weights (danmu only by default; paid gifts, super chats and guard
+        purchases when given a weight, see sources.py) enter their sender, credited with the type's weight.
+        Types of weight 0 are ignored. num_danmu counts the accepted events of all types.
+
+        paizi and keyword are compiled into FilterRules, see filters.py for their syntax. The keyword
+        rules only apply to danmu, paid entries only need to pass the medal rule. Before the filters, a
+        viewer repeating the same message within dedup_window seconds is dropped (0 disables). Entries of
+        the viewers in the ExclusionIndex are rejected before they are registered; the index may be
+        reloaded during the session, viewers excluded after they entered are dropped from the result.
+        With a window (seconds) and/or a window_start/window_end (timestamps), only the viewers with
+        entries in the last `window` seconds of the scheduled period are in the result, with the number
+        of those entries as their count.
+
+        With threaded=True, the connection, packet decoding and filtering run in a DanmuWorker thread
+        with its own event loop, and only batches of accepted danmu reach this (GUI) event loop.
+        Every accepted danmu (and rejected ones if the recorder asks for them) is written to the
+        SessionRecorder if one is given.
+        The connection is supervised: it is reopened with a backoff when it drops or stops answering
+        heartbeats, and the time spent disconnected is reported in stats().
+        With a Checkpointer, the participants and counters are checkpointed periodically, and a session
+        left unfinished by a crash is resumed from its last checkpoint if it was made with the same room and
+        filters shortly before; `resumed` then tells what was recovered.
+        """
+        logger.info("Start monitoring room %s", room_id)
         assert callable(new_danmu_callback)
-        self.room = live.LiveDanmaku(room_id, debug=False)
-
-        # Async function to record new danmu and report to callback
-        @self.room.on('DANMU_MSG')
-        async def on_new_danmu(event):
-            # Get message content
-            data = event['data']['info']
-            msg, viewer, tag = data[1: 4]
-            viewer_name = viewer[1]
-            tag_name = '' if len(tag) < 2 else tag[1]
-            # Decide to record or not
-            if (not paizi or paizi == tag_name) and (not keyword or keyword in msg):
-                self.num_danmu += 1
-                if viewer_name not in self.viewer_list:
-                    self.viewer_list.append(viewer_name)
-                print(f"Reporting danmu -- msg: {msg}, viewer_name: {viewer_name}")
-                new_danmu_callback(self.num_danmu, self.viewer_list)
-
-        # Create a new event loop in this thread and Create the coroutine task to run concurrently
-        self.start_monitor_task = asyncio.create_task(self.room.connect())
-
-    async def stop_monitor(self):
-        print("Stop monitoring!")
-        # Create another task to run disconnect() in the existing event loop
-        self.stop_monitor_task = asyncio.create_task(self.room.disconnect())
-        # Wait for disconnection
-        await self.stop_monitor_task
+        self.new_danmu_callback = new_danmu_callback
+        self.room_id = room_id
+        self.paizi, self.keyword = paizi, keyword
+        self.rules = FilterRules.parse(paizi, keyword)
+        self.dedup = DanmuDeduplicator(dedup_window)
+        self.exclusions = exclusions if exclusions is not None else ExclusionIndex()
+        self.num_excluded = 0
+        self.activity = None
+        if window or window_start or window_end:
+            self.activity = ActivityWindow(window, window_start, window_end)
+        self.source_weights = {source: weight for source, weight in (source_weights or DEFAULT_SOURCE_WEIGHTS).items()
+                               if weight > 0}
+        # All the keys exist from the start: a worker thread may count entries while stats() copies the counts
+        self.num_entries = Counter(dict.fromkeys(self.source_weights, 0))
+        self.recorder = recorder
+        self.num_events = 0
+        self.worker_error = None
+        self.resumed = None
+
+        if threaded:
+            from worker import DanmuWorker
+            self.worker = DanmuWorker(room_id, self._filter_event, list(self.source_weights))
+            self.worker.start()
+            await asyncio.get_running_loop().run_in_executor(None, self.worker.connected.wait)
+            if self.worker.error is not None or not self.worker.is_alive():
+                error, self.worker, self.recorder = self.worker.error, None, None
+                if recorder is not None:
+                    await asyncio.get_running_loop().run_in_executor(None, recorder.close)
+                raise RuntimeError(f"The worker thread of room {room_id} failed to start: {error!r}")
+        self.start_time = time.monotonic()
+
+        self.checkpointer = checkpointer
+        if checkpointer is not None:
+            params = {'room_id': room_id, 'paizi': paizi, 'keyword': keyword, 'sources': self.source_weights,
+                      'dedup_window': dedup_window, 'window': window, 'window_start': window_start,
+                      'window_end': window_end}
+            counters = checkpointer.load(self.participants, params)
+            if counters:
+                self.num_danmu, self.num_events = counters['num_danmu'], counters['num_events']
+                self.resumed = {'viewers': len(self.participants), 'danmu': self.num_danmu,
+                                'started_at': checkpointer.session['started_at']}
+                logger.info("Resumed %d viewers and %d danmu from %s", len(self.participants), self.num_danmu,
+                            checkpointer.path)
+                if self.activity is not None:
+                    # Only the last-seen times are checkpointed: resumed viewers count once, when last seen
+                    for uid, last_seen in zip(self.participants.uids, self.participants.last_seen):
+                        self.activity.add(uid, 1, last_seen)
+                self.new_danmu_callback(self.num_danmu, self.participants)
+            self.checkpoint_stopped = asyncio.Event()
+            self.checkpoint_task = asyncio.create_task(self._checkpoint_periodically())
+
+        if threaded:
+            self.start_monitor_task = asyncio.create_task(self._drain_worker())
+            return
+
+        # Record new entries and report to callback, reconnecting whenever the connection drops. All the event
+        # types share one listener, which dispatches on the event type.
+        self.supervisor = ConnectionSupervisor(room_id, dict.fromkeys(self.source_weights, self._on_event))
+        self.start_monitor_task = asyncio.create_task(self.supervisor.run())
+
+    def _filter_event(self, event):
+        """
+        Returns (Entry, weight) of a live event if it passes the filters, otherwise None
+        """
+        start = time.perf_counter_ns()
+        self.num_events += 1
+        data = event['data']
+        source = data['cmd']
+        entry = PARSERS[source](data)
+        if entry is None:
+            return None
+        if source == 'DANMU_MSG':
+            # Repeats are dropped before any filtering or recording
+            if self.dedup and self.dedup.is_repeat(entry.uid, entry.text):
+                METRICS.count('dedup_suppressed')
+                return None
+            msg = entry.text
+        else:
+            msg = f"[{source}] {entry.text}"
+        if self.exclusions.excludes(entry.uid):
+            self.num_excluded += 1
+            METRICS.count('excluded')
+            accepted = False
+        elif source == 'DANMU_MSG':
+            accepted = self.rules.match(entry.medal_name, entry.text)
+        else:
+            accepted = self.rules.match(entry.medal_name)
+        if self.recorder is not None and (accepted or self.recorder.record_rejected):
+            self.recorder.record(entry.uid, entry.name, entry.medal_name, entry.medal_level, msg, accepted)
+        METRICS.record('filter', time.perf_counter_ns() - start)
+        if not accepted:
+            return None
+        self.num_entries[source] += 1
+        return entry, self.source_weights[source]
+
+    async def _on_event(self, event):
+        start = time.perf_counter_ns()
+        METRICS.count('events')
+        accepted = self._filter_event(event)
+        if accepted:
+            entry, weight = accepted
+            self.num_danmu += 1
+            self.participants.add(entry.uid, entry.name, entry.medal_level, weight)
+            if self.activity is not None:
+                self.activity.add(entry.uid, weight, time.time())
+            logger.debug("Reporting %s -- msg: %s, viewer_name: %s", entry.source, entry.text, entry.name,
+                         extra={'rate_key': 'danmu', 'room_id': self.room_id, 'uid': entry.uid})
+            self.new_danmu_callback(self.num_danmu, self.participants)
+            METRICS.count('danmu')
+        METRICS.record('danmu_handler', time.perf_counter_ns() - start)
+
+    async def _drain_worker(self):
+        """
+        Apply the danmu batches delivered by the worker thread until it exits
+        """
+        while True:
+            running = self.worker.is_alive()
+            start = time.perf_counter_ns()
+            batches = self.worker.drain()
+            for num_danmu, viewers in batches:
+                self.num_danmu += num_danmu
+                for uid, viewer in viewers.items():
+                    self.participants.add(uid, viewer.name, viewer.medal_level, viewer.count, viewer.first_seen,
+                                          viewer.last_seen)
+                    if self.activity is not None:
+                        self.activity.add(uid, viewer.count, viewer.last_seen)
+            if batches:
+                self.new_danmu_callback(self.num_danmu, self.participants)
+                METRICS.record('worker_drain', time.perf_counter_ns() - start)
+                METRICS.count('worker_batches', len(batches))
+            if not running:
+                break
+            await asyncio.sleep(WORKER_DRAIN_INTERVAL)
+        if not self.worker.stopping:
+            self.worker_error = repr(self.worker.error) if self.worker.error is not None else "exited on its own"
+            logger.error("Room %s worker thread stopped before the session ended: %s", self.room_id,
+                         self.worker_error)
+
+    async def _checkpoint_periodically(self):
+        """
+        Checkpoint what changed every interval. Stopped through checkpoint_stopped rather than cancelled,
+        so that a write in progress always completes.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await asyncio.wait_for(self.checkpoint_stopped.wait(), self.checkpointer.interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            delta = self.checkpointer.delta(self.participants,
+                                            {'num_danmu': self.num_danmu, 'num_events': self.num_events})
+            if delta is not None:
+                start = time.perf_counter_ns()
+                try:
+                    await loop.run_in_executor(None, self.checkpointer.write, delta)
+                except Exception:
+                    # Best effort: the session goes on, and the next checkpoint is a full one
+                    logger.exception("Failed to write the checkpoint of room %s", self.room_id)
+                    self.checkpointer.reset()
+                    continue
+                METRICS.record('checkpoint_write', time.perf_counter_ns() - start)
+
+    def stats(self):
+        """
+        Returns the throughput stats of the current session, with the TOP_VIEWERS most active viewers
+        """
+        elapsed = time.monotonic() - self.start_time if self.start_time else 0
+        supervisor = self.worker.supervisor if self.worker is not None else self.supervisor
+        connection = supervisor.stats() if supervisor is not None else {}
+        # Traffic missed while disconnected, assuming it went on at the rate seen while connected
+        downtime = connection.get('downtime_sec', 0)
+        uptime = elapsed - downtime
+        return {
+            'num_events': self.num_events,
+            'num_danmu': self.num_danmu,
+            'num_viewers': len(self.participants),
+            'events_per_sec': self.num_events / elapsed if elapsed else 0,
+            'danmu_per_sec': self.num_danmu / elapsed if elapsed else 0,
+            'filter_hits': self.rules.hits(),
+            'dedup': self.dedup.stats(),
+            'excluded': self.num_excluded,
+            'top_viewers': [[self.participants.names[row], self.participants.counts[row]]
+                            for row in self.participants.top(TOP_VIEWERS).tolist()],
+            'activity_window': self.activity.stats() if self.activity is not None else None,
+            'entries_by_source': dict(self.num_entries),
+            'connection': connection,
+            'missed_danmu_estimate': round(self.num_danmu / uptime * downtime) if uptime > 0 else 0,
+            'worker_error': self.worker_error,
+        }
+
+    async def stop_monitor(self, min_count=None):
+        """
+        Stop monitoring and return the snapshot of the participants, restricted to the viewers with at least
+        min_count accepted entries if given (the weighted counts, a gift counting as its source's weight)
+        """
+        logger.info("Stop monitoring room %s", self.room_id)
+        if self.worker is not None:
+            # Disconnect in the worker's loop and wait for its last batches
+            await self.worker.stop()
+            await self.start_monitor_task
+            logger.info("Worker stats: %s", self.worker.stats())
+            self.supervisor = self.worker.supervisor
+            self.worker = None
+        else:
+            # Disconnect and wait for the supervisor to give up the connection
+            self.stop_monitor_task = asyncio.create_task(self.supervisor.stop())
+            await self.stop_monitor_task
+            await self.start_monitor_task
+        if self.checkpointer is not None:
+            # The session ended normally, there is nothing to resume anymore
+            self.checkpoint_stopped.set()
+            try:
+                await self.checkpoint_task
+                self.checkpointer.remove()
+            except Exception:
+                logger.exception("Failed to close the checkpoint of room %s", self.room_id)
+            self.checkpointer = None
+        if self.recorder is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.recorder.close)
+            logger.info("Recorded %d danmu to %s", self.recorder.num_events, self.recorder.path)
+            self.recorder = None
+        logger.info("Room %s stats: %s", self.room_id, self.stats())
         # get result and Clear stats
-        result = self.viewer_list
+        if self.activity is not None:
+            result = self.activity.snapshot(self.participants, min_count, self.exclusions)
+            self.activity = None
+        else:
+            eligible = None
+            if min_count or len(self.exclusions):
+                eligible = self.participants.select(min_count=min_count, exclude=self.exclusions)
+            result = self.participants.snapshot(eligible)
         self.num_danmu = 0
-        self.viewer_list = []
+        self.start_time = None
+        self.participants = ParticipantStore()
         return result
 
 
 # === DEBUG ONLY ===
 if __name__ == "__main__":
+    from bilibili_api import live, sync
+
     room_id = 23676151
     live_room = live.LiveRoom(room_id)
 
     # def stats_report_func(num_danmu, num_viewers):
     #     print(f"Num danmu: {num_danmu}, num_viewers: {num_viewers}")
-    #     print(f"Total view list: {list(danmuku.viewer_list)}")
+    #     print(f"Total view list: {list(danmuku.participants)}")
     #
     # danmuku.start_monitor(stats_report_func, room_id)
 
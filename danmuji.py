@@ -1,190 +1,119 @@
 """
-    Danmuji main event logics
-"""
-import asyncio
-import functools
-from traceback import format_exc
-
-import qasync
-from PyQt5 import QtWidgets
-from PyQt5.QtGui import QIntValidator, QIcon, QTextCursor
-from PyQt5.QtWidgets import QMessageBox, QMainWindow
-from PyQt5.QtCore import QCoreApplication, Qt
-from qasync import QEventLoop
-import numpy as np
-
-from core import Danmuku
-from ui import Ui_MainWindow
-
-
-QtWidgets.QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)   # enable highdpi scaling
-QtWidgets.QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)      # use highdpi icons
-
-
-VERSION = "v0.0.3"
-ICON_PATH = 'asset/icon.ico'
-WINDOW_MIN_WIDTH = 420
-WINDOW_MIN_HEIGHT = 700
-
-LOTTERY_INTERVAL_MIN = 10
-LOTTERY_INTERVAL_MAX = 300
-LOTTERY_INTERVAL_INC = 5
-
-
-class MainWindow(QMainWindow):
-
-    def __init__(self):
-        super(MainWindow, self).__init__()
-        # Input validator
-        self.onlyInt = QIntValidator()
-        # Danmuku
-        self.danmuku = Danmuku()
-
-    def setup_ui(self, ui_main_window):
-        self.ui = ui_main_window
-        # More adjustments on UI
-        # Icon
-        self.setWindowIcon(QIcon(ICON_PATH))
-        # Window title
-        self.setWindowTitle(QCoreApplication.translate("MainWindow", "Bilibili 弹幕抽奖姬 " + VERSION))
-        # Minimal window size
-        self.setMinimumSize(WINDOW_MIN_WIDTH, WINDOW_MIN_HEIGHT)
-        # Setup widget signal and slots
-        # Enable/disable danmu filter lineEdit widget when the corresponding checkbox state changes
-        self.ui.checkBox_paizi.toggled.connect(
-            lambda: self.ui.lineEdit_paizi.setEnabled(self.ui.checkBox_paizi.isChecked()))
-        self.ui.checkBox_keyword.toggled.connect(
-            lambda: self.ui.lineEdit_keyword.setEnabled(self.ui.checkBox_keyword.isChecked()))
-        # Setup lottery button signal
-        self.ui.pushButton_lottery.clicked.connect(self.lottery_button_on_click)
-        # Setup input lineEdit validators
-        # room_id lineEdit only allow integer input
-        self.ui.lineEdit_room_id.setValidator(self.onlyInt)
-
-    # === UI Event Logic ===
-
-    # Main lottery button events
-    def lottery_button_on_click(self):
-        # Change button state/text and call corresponding function
-        if self.ui.pushButton_lottery.text() == "开始统计":
-            asyncio.create_task(self.start_monitor())
-        else:
-            asyncio.create_task(self.start_lottery())
-
-    # Update monitor displays when new danmu arrives
-    def update_monitor(self, num_danmu, viewer_list):
-        self.ui.lcdNumber_num_danmu.display(num_danmu)
-        self.ui.lcdNumber_num_viewer.display(len(viewer_list))
-        self.ui.textBrowser_viewers.setText('\n'.join(viewer_list))
-        self.ui.textBrowser_viewers.moveCursor(QTextCursor.End)
-        self.ui.textBrowser_viewers.ensureCursorVisible()
-
-    # Reset monitor displays to 0
-    def reset_monitor(self):
-        self.ui.lcdNumber_num_danmu.display(0)
-        self.ui.lcdNumber_num_viewer.display(0)
-        self.ui.textBrowser_viewers.setText('')
+    Danmuji entry point
 
-    # Update room info display
-    def update_room_info(self, room_title, anchor_name):
-        self.ui.label_room_name.setText("直播间标题：\t" + room_title)
-        self.ui.label_anchor_name.setText("主播：\t\t" + anchor_name)
-        self.ui.label_room_name.adjustSize()
-        self.ui.label_anchor_name.adjustSize()
+    Without a subcommand the Qt main window is started. The `monitor` subcommand runs headless
+    and never imports PyQt:
 
-    async def start_monitor(self):
-        """
-        Start the live danmu monitoring
-        """
-        # Rest previous output
-        self.reset_monitor()  # Clear LCD
-        self.ui.textBrowser_lottery_result.setText('')  # Clear text display
-        # Get input
-        # Make sure room_id contains something
-        room_id = self.ui.lineEdit_room_id.text()
-        if not room_id:
-            QMessageBox.critical(self, "输入错误", "请填写Bilibili直播间房间号！")
-            return
-        room_id = int(room_id)
-        paizi = self.ui.lineEdit_paizi.text().strip()
-        keyword = self.ui.lineEdit_keyword.text().strip()
-
-        try:
-            # Get room info and alert if the room is not live
-            room_title, anchor_name, live_status = await self.danmuku.get_room_info(room_id)
-            if not live_status:
-                QMessageBox.warning(self, "直播未开始", f"房间{room_id}的直播尚未开始！")
-            self.update_room_info(room_title, anchor_name)
-
-            # Monitor live danmu
-            await self.danmuku.start_monitor(
-                self.update_monitor,
-                room_id,
-                paizi if self.ui.checkBox_paizi.isChecked() else None,
-                keyword if self.ui.checkBox_keyword.isChecked() else None
-            )
-        except Exception as e:
-            QMessageBox.critical(self, "连接Bilibili直播服务时出现错误", str(e))
-            return
-
-        # Change button caption at the end
-        self.ui.pushButton_lottery.setText("结束统计并抽奖")
-
-    async def start_lottery(self):
-        """
-        Stop monitoring and start lottery
-        """
-        self.ui.pushButton_lottery.setEnabled(False)
-        candidates = await self.danmuku.stop_monitor()
-
-        # The lottery process visualization
-        if len(candidates) > 0:
-            for interval_ms in range(LOTTERY_INTERVAL_MIN, LOTTERY_INTERVAL_MAX, LOTTERY_INTERVAL_INC):
-                self.ui.textBrowser_lottery_result.setText(np.random.choice(candidates))
-                await asyncio.sleep(interval_ms / 1000)
-
-            # Make the winner red
-            self.ui.textBrowser_lottery_result.setText(
-                '<p style="color: red">' + np.random.choice(candidates) + '</p>'
-            )
-
-        # Change button name at the end
-        self.ui.pushButton_lottery.setEnabled(True)
-        self.ui.pushButton_lottery.setText("开始统计")
-
-
-async def main():
-    def close_future(future, loop):
-        loop.call_later(10, future.cancel)
-        future.cancel()
-
-    loop = asyncio.get_event_loop()
-    future = asyncio.Future()
-
-    app = QtWidgets.QApplication(sys.argv)
-    if hasattr(app, "aboutToQuit"):
-        getattr(app, "aboutToQuit").connect(
-            functools.partial(close_future, future, loop)
-        )
-
-    # Set style
-    app.setStyle('Fusion')
-
-    # Setup main window and UI
-    main_window = MainWindow()
-    ui = Ui_MainWindow()
-    ui.setupUi(main_window)
-    main_window.setup_ui(ui)
-    main_window.show()
-
-    await future
-    return True
+        python -m danmuji monitor --room 23676151 --keyword 抽奖 --duration 600 --json
+"""
+import argparse
+import sys
+
+from activity import parse_time
+from dedup import DEDUP_WINDOW
+from logs import setup_logging
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='danmuji', description="Bilibili 弹幕抽奖姬")
+    parser.add_argument('--threaded', action='store_true',
+                        help="run the live connections in worker threads instead of the main event loop")
+    parser.add_argument('--favourite', metavar='ROOM', type=int, action='append', default=[],
+                        help="room whose info is prefetched when the window opens, repeatable")
+    parser.add_argument('--overlay', metavar='PORT', type=int,
+                        help="serve the live stats for OBS overlays on http://127.0.0.1:PORT/")
+    parser.add_argument('--metrics', metavar='FILE',
+                        help="write the pipeline latencies, throughput and queue depths to FILE as JSON")
+    parser.add_argument('--profile', metavar='FILE',
+                        help="profile the monitoring sessions to FILE (pyinstrument if installed, else cProfile)")
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                        help="DEBUG also logs every accepted danmu, rate limited")
+    parser.add_argument('--log-file', metavar='FILE', help="also log to FILE, rotated every 5 MB")
+    parser.add_argument('--log-json', action='store_true', help="log JSON lines instead of text")
+    subparsers = parser.add_subparsers(dest='command')
+
+    monitor_parser = subparsers.add_parser('monitor', help="monitor live rooms without GUI and draw a winner")
+    monitor_parser.add_argument('--room', type=int, action='append', required=True,
+                                help="live room id, repeat to monitor several rooms")
+    monitor_parser.add_argument('--paizi', help="only count danmu from viewers wearing one of these fan medals")
+    monitor_parser.add_argument('--keyword',
+                                help="keyword rules: 'a b' any of, '+a' required, '-a' excluded, '/re/' regex")
+    monitor_parser.add_argument('--duration', type=float,
+                                help="seconds to monitor before drawing, run until Ctrl-C if omitted")
+    monitor_parser.add_argument('--interval', type=float, default=1.0, help="seconds between two stats lines")
+    monitor_parser.add_argument('--json', action='store_true', help="write JSON lines instead of text")
+    monitor_parser.add_argument('--weighting', default='uniform',
+                                choices=['uniform', 'danmu_count', 'medal_level', 'first_seen'],
+                                help="how much each participant weighs in the draw")
+    monitor_parser.add_argument('--winners', type=int, default=1, help="number of distinct winners to draw")
+    monitor_parser.add_argument('--min-entries', type=int, metavar='N',
+                                help="only viewers with at least N accepted entries can win, each event counting "
+                                     "as many entries as its source's weight (see --source)")
+    monitor_parser.add_argument('--seed', type=int, help="seed of the draw, random if omitted")
+    monitor_parser.add_argument('--record', metavar='DIR', help="log the accepted danmu of each room to DIR")
+    monitor_parser.add_argument('--record-rejected', action='store_true',
+                                help="also log the danmu rejected by the filters")
+    monitor_parser.add_argument('--dedup-window', type=float, default=DEDUP_WINDOW, metavar='SECONDS',
+                                help="ignore a viewer repeating the same message within SECONDS, e.g. 10 against "
+                                     "giveaway spam (default: 0, every message counts)")
+    monitor_parser.add_argument('--source', action='append', metavar='NAME=WEIGHT',
+                                help="entries per event of a source: danmu, gift (paid gifts only), superchat or "
+                                     "guard, 0 to ignore it (default: danmu=1 only). Paid entries skip the keyword "
+                                     "rules, e.g. --source gift=1 --source superchat=3 --source guard=10")
+    monitor_parser.add_argument('--checkpoint', metavar='DIR',
+                                help="checkpoint each room to DIR and resume an unfinished session from there")
+    monitor_parser.add_argument('--history', metavar='FILE',
+                                help="record the session, its participants and winners to the SQLite database FILE")
+    monitor_parser.add_argument('--exclude', metavar='FILE', action='append', default=[],
+                                help="viewers listed in FILE (one uid per line) cannot enter, reloaded when FILE "
+                                     "changes, repeatable")
+    monitor_parser.add_argument('--exclude-winners', metavar='DAYS', type=float,
+                                help="viewers who won in the last DAYS days cannot enter (requires --history)")
+    monitor_parser.add_argument('--window', type=float, metavar='MINUTES',
+                                help="only the entries of the last MINUTES before the draw count")
+    monitor_parser.add_argument('--window-start', metavar='TIME', type=parse_time,
+                                help="only the entries from TIME on count, 'HH:MM' or 'YYYY-MM-DD HH:MM'")
+    monitor_parser.add_argument('--window-end', metavar='TIME', type=parse_time,
+                                help="only the entries before TIME count")
+    monitor_parser.add_argument('--threaded', action='store_true', default=argparse.SUPPRESS,
+                                help="run the live connections in worker threads")
+    monitor_parser.add_argument('--overlay', metavar='PORT', type=int, default=argparse.SUPPRESS,
+                                help="serve the live stats for OBS overlays on http://127.0.0.1:PORT/")
+
+    history_parser = subparsers.add_parser('history', help="query or export the recorded sessions")
+    history_parser.add_argument('query', choices=['sessions', 'regulars', 'winners', 'viewer', 'export'],
+                                help="latest sessions, viewers entering most of the last sessions, winners since "
+                                     "a date, sessions of one viewer, or export of a table")
+    history_parser.add_argument('--db', metavar='FILE', help="history database (default: history.sqlite3)")
+    history_parser.add_argument('--room', type=int, help="only the sessions of this room")
+    history_parser.add_argument('--last', type=int, default=20, metavar='N',
+                                help="number of latest sessions considered (default: %(default)s)")
+    history_parser.add_argument('--min-sessions', type=int, default=1, metavar='N',
+                                help="regulars: entered at least N of the sessions")
+    history_parser.add_argument('--since', metavar='YYYY-MM-DD', help="winners, export: sessions ended since then")
+    history_parser.add_argument('--uid', type=int, help="viewer: uid of the viewer")
+    history_parser.add_argument('--table', default='participants', choices=['sessions', 'participants', 'winners'],
+                                help="export: table to export (default: %(default)s)")
+    history_parser.add_argument('--output', metavar='FILE', help="export: .csv file, or .parquet (requires pyarrow)")
+    args = parser.parse_args(argv)
+    if args.command == 'monitor' and args.exclude_winners and not args.history:
+        parser.error("--exclude-winners requires --history")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    setup_logging(args.log_level, args.log_file, args.log_json)
+    if args.command == 'monitor':
+        import headless
+        headless.run(args)
+    elif args.command == 'history':
+        import history
+        history.run(args)
+    else:
+        import gui
+        gui.run(args.threaded, args.favourite, args.overlay, args.metrics, args.profile)
 
 
 if __name__ == "__main__":
-    import sys
-
-    try:
-        qasync.run(main())
-    except asyncio.exceptions.CancelledError:
-        sys.exit(0)
+    main(sys.argv[1:])
@@ -0,0 +1,69 @@
+"""
+    Sliding-window suppression of repeated danmu.
+"""
+import time
+
+
+DEDUP_WINDOW = 0.0      # Seconds during which a viewer repeating the same message is ignored, 0 disables
+DEDUP_BUCKETS = 4
+
+
+class DanmuDeduplicator():
+    """
+        Drops a danmu when the same viewer sent the same message less than `window` seconds ago.
+
+        The window is a ring of time buckets, each holding the hashes of the (uid, message) pairs
+        accepted during window / num_buckets seconds. A lookup checks the few live buckets and the
+        oldest bucket is recycled as time goes, so memory follows the unique activity of the last
+        window and expiry never scans the entries. A repeat does not extend the window, so a viewer
+        spamming the same message gets it through once per window.
+    """
+
+    def __init__(self, window=DEDUP_WINDOW, num_buckets=DEDUP_BUCKETS):
+        self.window = window
+        self.bucket_span = window / num_buckets
+        self.buckets = [set() for _ in range(num_buckets)]
+        self.current = 0    # Index of the bucket being filled
+        self.current_end = time.monotonic() + self.bucket_span
+        self.num_checked, self.num_suppressed = 0, 0
+
+    def __bool__(self):
+        return self.window > 0
+
+    def _rotate(self, now):
+        """
+        Move to the bucket covering `now`, clearing the buckets that expired on the way
+        """
+        num_buckets = len(self.buckets)
+        for _ in range(num_buckets):
+            if now < self.current_end:
+                return
+            self.current = (self.current + 1) % num_buckets
+            self.buckets[self.current].clear()
+            self.current_end += self.bucket_span
+        # Idle for more than a window, everything expired
+        self.current_end = now + self.bucket_span
+
+    def is_repeat(self, uid, msg):
+        """
+        Returns True if the danmu repeats one seen in the window, otherwise registers it
+        """
+        self.num_checked += 1
+        now = time.monotonic()
+        if now >= self.current_end:
+            self._rotate(now)
+        key = hash((uid, msg))
+        for bucket in self.buckets:
+            if key in bucket:
+                self.num_suppressed += 1
+                return True
+        self.buckets[self.current].add(key)
+        return False
+
+    def stats(self):
+        return {
+            'window_sec': self.window,
+            'checked': self.num_checked,
+            'suppressed': self.num_suppressed,
+            'tracked': sum(len(bucket) for bucket in self.buckets),
+        }
@@ -0,0 +1,200 @@
+"""
+    Viewers excluded from the lottery: past winners, moderators, bot accounts.
+
+    Exclusion files hold one uid per line, anything after a '#' is a comment:
+
+        12345678    # moderator
+        87654321
+
+    Files of at least BLOOM_MIN_SIZE uids (bot lists) are loaded into a Bloom filter instead of a set.
+"""
+import asyncio
+import logging
+import math
+import os
+
+
+BLOOM_MIN_SIZE = 100000
+BLOOM_ERROR_RATE = 1e-4     # Probability of excluding a viewer who is not on a Bloom-filtered list
+RELOAD_INTERVAL = 2.0       # Seconds between two checks of the exclusion files
+
+MASK64 = (1 << 64) - 1
+
+logger = logging.getLogger(__name__)
+
+
+def _mix(value):
+    """
+    splitmix64 finalizer, the scalar twin of _mix_array()
+    """
+    value = (value ^ (value >> 30)) * 0xBF58476D1CE4E5B9 & MASK64
+    value = (value ^ (value >> 27)) * 0x94D049BB133111EB & MASK64
+    return value ^ (value >> 31)
+
+
+def _mix_array(values):
+    import numpy as np
+    values = values.copy()
+    values ^= values >> np.uint64(30)
+    values *= np.uint64(0xBF58476D1CE4E5B9)
+    values ^= values >> np.uint64(27)
+    values *= np.uint64(0x94D049BB133111EB)
+    values ^= values >> np.uint64(31)
+    return values
+
+
+class BloomFilter():
+    """
+        Bloom filter of uids, built in one vectorized pass over a uid array.
+
+        Bit positions come from double hashing two splitmix64 hashes of the uid. A lookup is a few integer
+        operations and stops at the first unset bit, so a viewer who is not listed usually costs one probe.
+    """
+
+    def __init__(self, uids, error_rate=BLOOM_ERROR_RATE):
+        import numpy as np
+        uids = np.asarray(uids, dtype=np.int64).view(np.uint64)
+        capacity = max(len(uids), 1)
+        self.num_bits = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.size = len(uids)
+        bitmap = np.zeros(self.num_bits, dtype=bool)
+        with np.errstate(over='ignore'):
+            first = _mix_array(uids)
+            second = _mix_array(first) | np.uint64(1)
+            position = first.copy()
+            for _ in range(self.num_hashes):
+                bitmap[position % np.uint64(self.num_bits)] = True
+                position += second
+        self.bits = np.packbits(bitmap, bitorder='little').tobytes()
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, uid):
+        first = _mix(uid & MASK64)
+        second = _mix(first) | 1
+        bits, num_bits = self.bits, self.num_bits
+        position = first
+        for _ in range(self.num_hashes):
+            bit = position % num_bits
+            if not bits[bit >> 3] >> (bit & 7) & 1:
+                return False
+            position = (position + second) & MASK64
+        return True
+
+
+class ExclusionIndex():
+    """
+        Uids excluded from the lottery, checked in O(1) for every entry before its viewer is registered.
+
+        The index is made of the uids given directly (e.g. recent winners from the history) and of the
+        exclusion files. Small files go into an exact set, large ones into Bloom filters. reload() rebuilds
+        the index from the files in an executor and swaps it in with a single assignment, so the monitors,
+        worker threads included, never see a partial index; watch() does so whenever a file changes, which
+        applies an edited list to the running session.
+    """
+
+    def __init__(self, paths=(), uids=(), bloom_min_size=BLOOM_MIN_SIZE, error_rate=BLOOM_ERROR_RATE):
+        self.paths = list(paths)
+        self.static_uids = set(uids)
+        self.bloom_min_size, self.error_rate = bloom_min_size, error_rate
+        self.index = (frozenset(self.static_uids), ())  # (exact uids, Bloom filters)
+        self.mtimes = {}    # path -> modification time of the loaded version, None if missing
+        self.num_excluded, self.num_reloads = 0, 0
+
+    def __len__(self):
+        uids, blooms = self.index
+        return len(uids) + sum(len(bloom) for bloom in blooms)
+
+    def __contains__(self, uid):
+        uids, blooms = self.index
+        if uid in uids:
+            return True
+        for bloom in blooms:
+            if uid in bloom:
+                return True
+        return False
+
+    def excludes(self, uid):
+        """
+        Membership test of the hot path, counting the excluded entries
+        """
+        uids, blooms = self.index
+        if uid in uids or blooms and uid in self:
+            self.num_excluded += 1
+            return True
+        return False
+
+    def _mtimes(self):
+        mtimes = {}
+        for path in self.paths:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    @staticmethod
+    def _read(path):
+        uids = []
+        with open(path, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.split('#', 1)[0].strip()
+                if not line:
+                    continue
+                try:
+                    uids.append(int(line))
+                except ValueError:
+                    logger.warning("%s:%d: not a uid: %r", path, line_number, line)
+        return uids
+
+    def _build(self):
+        """
+        Read the files and build a new index. Runs in an executor.
+        """
+        mtimes = self._mtimes()
+        uids, blooms = set(self.static_uids), []
+        for path, mtime in mtimes.items():
+            if mtime is None:
+                continue
+            file_uids = self._read(path)
+            if len(file_uids) >= self.bloom_min_size:
+                blooms.append(BloomFilter(file_uids, self.error_rate))
+            else:
+                uids.update(file_uids)
+        return (frozenset(uids), tuple(blooms)), mtimes
+
+    async def reload(self):
+        """
+        Rebuild the index from the files. If a file cannot be read the previous index is kept until the
+        files change again.
+        """
+        try:
+            self.index, self.mtimes = await asyncio.get_running_loop().run_in_executor(None, self._build)
+        except (OSError, UnicodeDecodeError) as e:
+            logger.warning("Failed to load the exclusion lists: %s", e)
+            self.mtimes = self._mtimes()
+            return
+        self.num_reloads += 1
+        uids, blooms = self.index
+        logger.info("Excluding %d uids, %d of them in %d Bloom filter(s)", len(self),
+                    sum(len(bloom) for bloom in blooms), len(blooms))
+
+    async def watch(self, interval=RELOAD_INTERVAL):
+        """
+        Reload whenever an exclusion file changes, until cancelled
+        """
+        while True:
+            await asyncio.sleep(interval)
+            if self._mtimes() != self.mtimes:
+                await self.reload()
+
+    def stats(self):
+        uids, blooms = self.index
+        return {
+            'excluded_uids': len(uids),
+            'bloom_uids': sum(len(bloom) for bloom in blooms),
+            'excluded_entries': self.num_excluded,
+            'reloads': self.num_reloads,
+        }
@@ -0,0 +1,164 @@
+"""
+    Compiled danmu filter rules.
+
+    Rule syntax of the keyword field, terms separated by spaces, commas or '|':
+
+        抽奖 中奖       any of these keywords
+        +冲            must contain
+        -广告          must not contain
+        /第\\d+名/      regular expression, counts like an "any of" keyword
+
+    The medal field is a list of fan medal names, any of which is accepted.
+"""
+import re
+import unicodedata
+
+
+TERM_SEPARATORS = re.compile(r'[\s,，|｜]+')
+REGEX_TERM = re.compile(r'/((?:\\/|[^/])+)/')
+EMOJI = re.compile('[\U0001F000-\U0001FAFF\u2600-\u27BF\uFE0F\u200D]+')
+
+
+def normalize(text):
+    """
+    Full-width to half-width (NFKC), case folding and emoji stripping
+    """
+    return EMOJI.sub('', unicodedata.normalize('NFKC', text)).casefold()
+
+
+class KeywordAutomaton():
+    """
+        Aho–Corasick automaton finding all the keywords contained in a text in a single pass.
+    """
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+        for pattern_id, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = self.goto[state][char] = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                state = next_state
+            if pattern:
+                self.output[state] += (pattern_id,)
+        # Breadth-first construction of the failure links
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, next_state in self.goto[state].items():
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_state] = self.goto[fail].get(char, 0)
+                self.output[next_state] += self.output[self.fail[next_state]]
+                queue.append(next_state)
+
+    def search(self, text):
+        """
+        Returns the set of ids of the patterns found in the text
+        """
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+class FilterRules():
+    """
+        Danmu filter compiled once when monitoring starts.
+
+        Medals are checked with a set lookup, all the literal keywords (any-of, required and excluded)
+        share one Aho–Corasick automaton so a message is scanned once, and regexes are precompiled.
+        Every rule counts the messages it matched.
+    """
+
+    def __init__(self, medals=(), keywords=(), required=(), excluded=(), regexes=(), normalized=True):
+        self.normalized = normalized
+        prepare = normalize if normalized else (lambda text: text)
+        self.medals = frozenset(medals)
+        # Literal keywords: (kind, original term) in automaton pattern order
+        self.terms = [('keyword', term) for term in keywords] + [('required', term) for term in required] + \
+                     [('excluded', term) for term in excluded]
+        self.automaton = KeywordAutomaton([prepare(term) for _, term in self.terms])
+        self.any_ids = frozenset(i for i, (kind, _) in enumerate(self.terms) if kind == 'keyword')
+        self.required_ids = frozenset(i for i, (kind, _) in enumerate(self.terms) if kind == 'required')
+        self.excluded_ids = frozenset(i for i, (kind, _) in enumerate(self.terms) if kind == 'excluded')
+        self.regexes = [re.compile(regex, re.IGNORECASE) for regex in regexes]
+        self.has_keywords = bool(self.terms or self.regexes)
+        # Hit counters
+        self.term_hits = [0] * len(self.terms)
+        self.regex_hits = [0] * len(self.regexes)
+        self.medal_hits = dict.fromkeys(self.medals, 0)
+
+    @classmethod
+    def parse(cls, paizi=None, keyword=None, normalized=True):
+        """
+        Compile the medal and keyword fields of the GUI / command line, see the module docstring
+        """
+        medals = [medal for medal in TERM_SEPARATORS.split(paizi or '') if medal]
+        keywords, required, excluded = [], [], []
+        regexes = REGEX_TERM.findall(keyword or '')
+        for term in TERM_SEPARATORS.split(REGEX_TERM.sub(' ', keyword or '')):
+            if term.startswith('+') and len(term) > 1:
+                required.append(term[1:])
+            elif term.startswith('-') and len(term) > 1:
+                excluded.append(term[1:])
+            elif term:
+                keywords.append(term)
+        return cls(medals, keywords, required, excluded, [regex.replace('\\/', '/') for regex in regexes],
+                   normalized)
+
+    def __bool__(self):
+        return bool(self.medals or self.has_keywords)
+
+    def match(self, medal_name, msg=None):
+        """
+        Returns whether a danmu passes all the rules. Without msg, only the medal rule is checked.
+        """
+        if self.medals:
+            if medal_name not in self.medals:
+                return False
+            self.medal_hits[medal_name] += 1
+        if not self.has_keywords or msg is None:
+            return True
+
+        text = normalize(msg) if self.normalized else msg
+        found = self.automaton.search(text) if self.terms else ()
+        for term_id in found:
+            self.term_hits[term_id] += 1
+        regex_found = False
+        for regex_id, regex in enumerate(self.regexes):
+            if regex.search(text):
+                self.regex_hits[regex_id] += 1
+                regex_found = True
+
+        if self.excluded_ids and not self.excluded_ids.isdisjoint(found):
+            return False
+        if self.required_ids and not self.required_ids.issubset(found):
+            return False
+        if (self.any_ids or self.regexes) and not (regex_found or not self.any_ids.isdisjoint(found)):
+            return False
+        return True
+
+    def hits(self):
+        """
+        Returns {rule: number of danmu matched}
+        """
+        prefixes = {'keyword': '', 'required': '+', 'excluded': '-'}
+        # Copied first, a worker thread may be counting hits
+        hits = {f"medal:{medal}": count for medal, count in list(self.medal_hits.items())}
+        hits.update((f"keyword:{prefixes[kind]}{term}", count)
+                    for (kind, term), count in zip(self.terms, self.term_hits))
+        hits.update((f"regex:/{regex.pattern}/", count) for regex, count in zip(self.regexes, self.regex_hits))
+        return hits
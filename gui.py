@@ -0,0 +1,389 @@
+"""
+    Danmuji main window and event logics
+"""
+import asyncio
+import functools
+import html
+import json
+import logging
+import os
+import sys
+import time
+from traceback import format_exc
+
+import qasync
+from PyQt5 import QtWidgets
+from PyQt5.QtGui import QRegExpValidator, QIcon, QKeySequence
+from PyQt5.QtWidgets import QMessageBox, QMainWindow, QShortcut
+from PyQt5.QtCore import QCoreApplication, Qt, QTimer, QRegExp
+from qasync import QEventLoop
+
+from animation import LotteryAnimation, frame_offsets
+from exclusions import ExclusionIndex
+from history import HISTORY_PATH, HistoryStore
+from manager import MonitorManager
+from metrics import METRICS, SessionProfiler, sample_loop_lag
+from room_cache import RoomInfoCache
+from participants import ParticipantStore
+from ui import Ui_MainWindow
+from viewer_model import ViewerListModel, ViewerFilterModel
+
+
+QtWidgets.QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)   # enable highdpi scaling
+QtWidgets.QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)      # use highdpi icons
+
+
+VERSION = "v0.0.3"
+ICON_PATH = 'asset/icon.ico'
+WINDOW_MIN_WIDTH = 420
+WINDOW_MIN_HEIGHT = 700
+
+# When set, print the time the first window is shown (and the heavy modules loaded by then) and quit.
+# Used by benchmarks/startup.py
+STARTUP_PROBE_ENV = 'DANMUJI_STARTUP_PROBE'
+
+LOTTERY_INTERVAL_MIN = 10
+LOTTERY_INTERVAL_MAX = 300
+LOTTERY_INTERVAL_INC = 5
+LOTTERY_WEIGHTING = 'uniform'   # See lottery.WEIGHTINGS
+
+MONITOR_REFRESH_HZ = 20     # Max frame rate of the monitor displays
+SESSION_LOG_DIR = 'sessions'    # Accepted danmu of every session are logged here for auditing
+CHECKPOINT_DIR = 'checkpoints'  # Unfinished sessions are resumed from here after a crash
+ROOM_CACHE_PATH = 'room_cache.json'
+PREFETCH_RECENT_ROOMS = 8       # Recently monitored rooms whose info is refreshed at startup
+PREFETCH_DELAY_MS = 1000        # Prefetch after the window is up, it loads bilibili_api
+EXCLUDE_PATH = 'exclude.txt'    # Uids that cannot enter, one per line, reloaded when the file changes
+EXCLUDE_WINNERS_DAYS = 0        # Winners of the last days cannot enter again, 0 to allow them
+ACTIVITY_WINDOW_MIN = 0         # Only the entries of the last minutes before the draw count, 0 for the whole session
+# Entries per event type, see sources.py. Paid entries skip the keyword rules, e.g. add 'SEND_GIFT': 1 (paid gifts
+# only), 'SUPER_CHAT_MESSAGE': 3, 'GUARD_BUY': 10 to let them in.
+SOURCE_WEIGHTS = {'DANMU_MSG': 1}
+DEDUP_WINDOW_SEC = 0            # Repeats of a viewer's message within these seconds are ignored, 0 to count them all
+
+logger = logging.getLogger(__name__)
+
+
+class MainWindow(QMainWindow):
+
+    def __init__(self, threaded=False, favourite_rooms=(), overlay=None, metrics_path=None, profile_path=None):
+        super(MainWindow, self).__init__()
+        # Whether the live connection runs in a worker thread instead of the GUI event loop
+        self.threaded = threaded
+        # Input validator: one or more room ids separated by commas or spaces
+        self.room_ids_validator = QRegExpValidator(QRegExp(r"[0-9, ]*"))
+        # Danmu monitor of all the rooms, with room info cached between runs
+        self.manager = MonitorManager(RoomInfoCache(ROOM_CACHE_PATH))
+        self.favourite_rooms = list(favourite_rooms)
+        # Every lottery is recorded with its participants and winner
+        self.history = HistoryStore(HISTORY_PATH)
+        # Optional OverlayServer mirroring the monitor displays for OBS
+        self.overlay = overlay
+        # Metrics are dumped as JSON after every lottery if metrics_path is set, and every session is
+        # profiled if profile_path is set
+        self.metrics_path = metrics_path
+        self.profiler = SessionProfiler(profile_path) if profile_path else None
+        # Monitor displays are redrawn at a fixed frame rate instead of once per danmu
+        self.monitor_timer = QTimer(self)
+        self.monitor_timer.setInterval(1000 // MONITOR_REFRESH_HZ)
+        self.monitor_timer.timeout.connect(self.refresh_monitor)
+        self.pending_monitor = None     # Latest (num_danmu, participants) not drawn yet
+        # Virtualized viewer list, filtered by the viewer search box
+        self.viewer_model = ViewerListModel(self)
+        self.viewer_filter_model = ViewerFilterModel(self.viewer_model, self)
+        self.num_refreshes, self.num_coalesced = 0, 0
+
+    def setup_ui(self, ui_main_window):
+        self.ui = ui_main_window
+        # More adjustments on UI
+        # Icon
+        self.setWindowIcon(QIcon(ICON_PATH))
+        # Window title
+        self.setWindowTitle(QCoreApplication.translate("MainWindow", "Bilibili 弹幕抽奖姬 " + VERSION))
+        # Minimal window size
+        self.setMinimumSize(WINDOW_MIN_WIDTH, WINDOW_MIN_HEIGHT)
+        # Setup widget signal and slots
+        # Enable/disable danmu filter lineEdit widget when the corresponding checkbox state changes
+        self.ui.checkBox_paizi.toggled.connect(
+            lambda: self.ui.lineEdit_paizi.setEnabled(self.ui.checkBox_paizi.isChecked()))
+        self.ui.checkBox_keyword.toggled.connect(
+            lambda: self.ui.lineEdit_keyword.setEnabled(self.ui.checkBox_keyword.isChecked()))
+        # Viewer panel shows the participant store through the (filtered) list model
+        self.ui.listView_viewers.setModel(self.viewer_filter_model)
+        self.ui.lineEdit_viewer_search.textChanged.connect(self.viewer_filter_model.setFilterFixedString)
+        # Filter syntax hints, see filters.py
+        self.ui.lineEdit_paizi.setToolTip("多个牌子用空格或逗号分隔，带其中任一牌子即可")
+        self.ui.lineEdit_keyword.setToolTip("多个关键词用空格分隔，包含任一即可\n+词：必须包含\n-词：不能包含\n/正则/：正则表达式")
+        # Setup lottery button signal
+        self.ui.pushButton_lottery.clicked.connect(self.lottery_button_on_click)
+        # Setup input lineEdit validators
+        # room_id lineEdit only allow integer input
+        self.ui.lineEdit_room_id.setValidator(self.room_ids_validator)
+        # Pipeline metrics panel
+        QShortcut(QKeySequence('F12'), self, self.show_metrics)
+
+    def prefetch_room_info(self):
+        """
+        Warm the room info cache with the favourite and recently monitored rooms
+        """
+        room_ids = self.favourite_rooms + self.manager.room_cache.recent(PREFETCH_RECENT_ROOMS)
+        asyncio.create_task(self.manager.prefetch_room_info(list(dict.fromkeys(room_ids))))
+
+    def show_metrics(self):
+        """
+        Show the latency, throughput and queue depths of the danmu pipeline
+        """
+        snapshot = METRICS.snapshot()
+        lines = [f"{stage}: p50 {latency['p50_us']:.0f} µs, p99 {latency['p99_us']:.0f} µs, "
+                 f"max {latency['max_us']:.0f} µs ({latency['count']})"
+                 for stage, latency in snapshot['latency'].items()]
+        lines += [f"{name}: {counter['total']} ({counter['per_sec']:.1f}/s)"
+                  for name, counter in snapshot['counters'].items()]
+        lines += [f"{name}: {value}" for name, value in snapshot['gauges'].items()]
+        if self.overlay is not None:
+            lines += [f"overlay_{name}: {value}" for name, value in self.overlay.stats_summary().items()]
+        box = QMessageBox(QMessageBox.Information, "性能统计", '\n'.join(lines) or "暂无数据", parent=self)
+        box.setDetailedText(json.dumps(snapshot, ensure_ascii=False, indent=2))
+        box.open()
+
+    # === UI Event Logic ===
+
+    # Main lottery button events
+    def lottery_button_on_click(self):
+        # Change button state/text and call corresponding function
+        if self.ui.pushButton_lottery.text() == "开始统计":
+            asyncio.create_task(self.start_monitor())
+        else:
+            asyncio.create_task(self.start_lottery())
+
+    # Record the latest stats when new danmu arrives. The actual redraw happens on the next frame
+    def update_monitor(self, num_danmu, participants):
+        if self.pending_monitor is not None:
+            self.num_coalesced += 1
+        self.pending_monitor = (num_danmu, participants)
+
+    # Redraw monitor displays with the latest pending stats, inserting only newly seen viewers
+    def refresh_monitor(self):
+        if self.pending_monitor is None:
+            return
+        start = time.perf_counter_ns()
+        num_danmu, participants = self.pending_monitor
+        self.pending_monitor = None
+        self.ui.lcdNumber_num_danmu.display(num_danmu)
+        self.ui.lcdNumber_num_viewer.display(len(participants))
+        if self.overlay is not None:
+            self.overlay.update(num_danmu=num_danmu, num_viewers=len(participants))
+        if self.viewer_model.store is not participants:
+            self.viewer_model.set_store(participants)
+        elif self.viewer_model.sync() and not self.ui.lineEdit_viewer_search.text():
+            self.ui.listView_viewers.scrollToBottom()
+        self.num_refreshes += 1
+        self.ui.statusbar.showMessage(f"刷新 {self.num_refreshes} 帧，合并 {self.num_coalesced} 次更新")
+        METRICS.record('gui_refresh', time.perf_counter_ns() - start)
+
+    # Reset monitor displays to 0
+    def reset_monitor(self):
+        self.pending_monitor = None
+        self.num_refreshes, self.num_coalesced = 0, 0
+        self.ui.lcdNumber_num_danmu.display(0)
+        self.ui.lcdNumber_num_viewer.display(0)
+        self.viewer_model.set_store(ParticipantStore())
+        self.ui.statusbar.clearMessage()
+        if self.overlay is not None:
+            self.overlay.reset()
+
+    # Update room info display
+    def update_room_info(self, room_title, anchor_name):
+        self.ui.label_room_name.setText("直播间标题：\t" + room_title)
+        self.ui.label_anchor_name.setText("主播：\t\t" + anchor_name)
+        self.ui.label_room_name.adjustSize()
+        self.ui.label_anchor_name.adjustSize()
+
+    def on_live_status(self, room_id, info):
+        """
+        A cached live status turned out to be outdated when it was rechecked in the background
+        """
+        if info[2]:
+            return
+        box = QMessageBox(QMessageBox.Warning, "直播未开始", f"房间{room_id}的直播尚未开始！", parent=self)
+        box.open()     # Not modal, the monitoring goes on
+
+    async def start_monitor(self):
+        """
+        Start the live danmu monitoring
+        """
+        # Rest previous output
+        self.reset_monitor()  # Clear LCD
+        self.ui.textBrowser_lottery_result.setText('')  # Clear text display
+        # Get input
+        # Make sure room_id contains something
+        room_ids = [int(room_id) for room_id in self.ui.lineEdit_room_id.text().replace(',', ' ').split()]
+        if not room_ids:
+            QMessageBox.critical(self, "输入错误", "请填写Bilibili直播间房间号！")
+            return
+        room_ids = list(dict.fromkeys(room_ids))
+        paizi = self.ui.lineEdit_paizi.text().strip()
+        keyword = self.ui.lineEdit_keyword.text().strip()
+
+        try:
+            # Get room info and alert if a room is not live
+            room_infos = await self.manager.get_room_info(room_ids, self.on_live_status)
+            for room_id, (_, _, live_status) in room_infos.items():
+                if not live_status:
+                    QMessageBox.warning(self, "直播未开始", f"房间{room_id}的直播尚未开始！")
+            self.update_room_info(' / '.join(info[0] for info in room_infos.values()),
+                                  ' / '.join(info[1] for info in room_infos.values()))
+            if self.overlay is not None:
+                self.overlay.publish('room_info', rooms=[{'room_id': room_id, 'title': title, 'anchor': anchor}
+                                                         for room_id, (title, anchor, _) in room_infos.items()])
+
+            winner_uids = []
+            if EXCLUDE_WINNERS_DAYS:
+                since = time.time() - EXCLUDE_WINNERS_DAYS * 24 * 3600
+                winners = await asyncio.get_running_loop().run_in_executor(None, self.history.winners, since)
+                winner_uids = [winner['uid'] for winner in winners]
+
+            # Monitor live danmu
+            await self.manager.start_monitor(
+                self.update_monitor,
+                room_ids,
+                paizi if self.ui.checkBox_paizi.isChecked() else None,
+                keyword if self.ui.checkBox_keyword.isChecked() else None,
+                threaded=self.threaded,
+                record_dir=SESSION_LOG_DIR,
+                checkpoint_dir=CHECKPOINT_DIR,
+                exclusions=ExclusionIndex([EXCLUDE_PATH], winner_uids),
+                dedup_window=DEDUP_WINDOW_SEC,
+                source_weights=SOURCE_WEIGHTS,
+                window=ACTIVITY_WINDOW_MIN * 60
+            )
+        except Exception as e:
+            QMessageBox.critical(self, "连接Bilibili直播服务时出现错误", str(e))
+            return
+        for room_id, resumed in self.manager.resumed.items():
+            started_at = time.strftime('%H:%M:%S', time.localtime(resumed['started_at']))
+            QMessageBox.information(self, "已恢复上次统计",
+                                    f"房间{room_id}上次的统计（{started_at}开始）未正常结束，已恢复"
+                                    f"{resumed['viewers']}名观众、{resumed['danmu']}条弹幕并继续统计。")
+
+        METRICS.reset()
+        if self.profiler is not None:
+            self.profiler.start()
+        self.monitor_timer.start()
+        # Change button caption at the end
+        self.ui.pushButton_lottery.setText("结束统计并抽奖")
+
+    async def start_lottery(self):
+        """
+        Stop monitoring and start lottery
+        """
+        self.ui.pushButton_lottery.setEnabled(False)
+        snapshot = await self.manager.stop_monitor()
+        for room_id, error in self.manager.errors.items():
+            QMessageBox.warning(self, "弹幕统计中断", f"房间{room_id}的弹幕统计提前停止，结果可能不完整：{error}")
+        # Draw the last pending frame
+        self.monitor_timer.stop()
+        self.refresh_monitor()
+        logger.info("Monitor refreshed %d frames, coalesced %d updates", self.num_refreshes, self.num_coalesced)
+
+        # The lottery process visualization. The winner is drawn first and the frames leading to it are
+        # precomputed, so the whole animation follows from the seed.
+        if len(snapshot.uids) > 0:
+            from lottery import LotteryEngine   # Loads numpy, kept out of the startup path
+            engine = LotteryEngine(snapshot, LOTTERY_WEIGHTING)
+            winner_row = engine.draw()[0]
+            offsets_ms = frame_offsets(LOTTERY_INTERVAL_MIN, LOTTERY_INTERVAL_MAX, LOTTERY_INTERVAL_INC)
+            frames = [engine.names[row] for row in engine.animation_frames(winner_row, len(offsets_ms))]
+            animation = LotteryAnimation(self.ui.textBrowser_lottery_result.setPlainText, frames, offsets_ms, self)
+            try:
+                await animation.play()
+            finally:
+                animation.deleteLater()     # Parented to the window, it would live as long as the window otherwise
+            METRICS.count('animation_frames_skipped', animation.num_skipped)
+
+            # Make the winner red
+            winner = engine.names[winner_row]
+            self.ui.textBrowser_lottery_result.setText('<p style="color: red">' + html.escape(winner) + '</p>')
+            self.ui.statusbar.showMessage(f"抽奖种子：{engine.seed}")
+            if self.overlay is not None:
+                self.overlay.publish('result', winners=[winner], seed=engine.seed)
+            logger.info("Lottery winner: %s, seed: %s, pool fingerprint: %s", winner, engine.seed, engine.fingerprint())
+            self.history.record_session(self.manager.room_snapshots, self.manager.started_at, self.manager.ended_at,
+                                        [(snapshot.uids[winner_row], winner)], LOTTERY_WEIGHTING, engine.seed,
+                                        engine.fingerprint())
+        else:
+            self.history.record_session(self.manager.room_snapshots, self.manager.started_at, self.manager.ended_at)
+
+        if self.profiler is not None:
+            self.profiler.stop()
+        if self.metrics_path:
+            METRICS.dump(self.metrics_path)
+
+        # Change button name at the end
+        self.ui.pushButton_lottery.setEnabled(True)
+        self.ui.pushButton_lottery.setText("开始统计")
+
+
+async def main(threaded=False, favourite_rooms=(), overlay_port=None, metrics_path=None, profile_path=None):
+    def close_future(future, loop):
+        loop.call_later(10, future.cancel)
+        future.cancel()
+
+    loop = asyncio.get_event_loop()
+    future = asyncio.Future()
+
+    app = QtWidgets.QApplication(sys.argv)
+    if hasattr(app, "aboutToQuit"):
+        getattr(app, "aboutToQuit").connect(
+            functools.partial(close_future, future, loop)
+        )
+
+    # Set style
+    app.setStyle('Fusion')
+
+    # Setup main window and UI
+    overlay = None
+    if overlay_port:
+        from overlay import OverlayServer
+        overlay = OverlayServer(port=overlay_port)
+    main_window = MainWindow(threaded=threaded, favourite_rooms=favourite_rooms, overlay=overlay,
+                             metrics_path=metrics_path, profile_path=profile_path)
+    ui = Ui_MainWindow()
+    ui.setupUi(main_window)
+    main_window.setup_ui(ui)
+    main_window.show()
+
+    if os.environ.get(STARTUP_PROBE_ENV):
+        QTimer.singleShot(0, functools.partial(report_first_window, app))
+    else:
+        QTimer.singleShot(PREFETCH_DELAY_MS, main_window.prefetch_room_info)
+        if overlay is not None:
+            # aiohttp is loaded once the window is up
+            await overlay.start()
+
+    loop_lag_task = asyncio.create_task(sample_loop_lag())
+    try:
+        await future
+    finally:
+        loop_lag_task.cancel()
+        if overlay is not None:
+            await overlay.stop()
+        main_window.history.close()
+    return True
+
+
+def report_first_window(app):
+    heavy_modules = [module for module in ('numpy', 'bilibili_api') if module in sys.modules]
+    print(json.dumps({'first_window': time.time(), 'heavy_modules': heavy_modules}), flush=True)
+    app.quit()
+
+
+def run(threaded=False, favourite_rooms=(), overlay_port=None, metrics_path=None, profile_path=None):
+    try:
+        qasync.run(main(threaded, favourite_rooms, overlay_port, metrics_path, profile_path))
+    except asyncio.exceptions.CancelledError:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    run(threaded='--threaded' in sys.argv)
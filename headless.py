@@ -0,0 +1,167 @@
+"""
+    Headless danmu monitoring and lottery, for servers without a display.
+
+    Only depends on core/manager, never on PyQt.
+"""
+import asyncio
+import contextlib
+import json
+import sys
+import time
+
+from dedup import DEDUP_WINDOW
+from exclusions import ExclusionIndex
+from history import HistoryStore
+from manager import MonitorManager
+from metrics import METRICS, SessionProfiler, sample_loop_lag
+from sources import parse_source_weights
+
+
+REPORT_INTERVAL = 1.0   # Seconds between two stats lines
+
+
+class Reporter():
+    """
+        Writes monitoring events to stdout, either as JSON lines or as human readable text.
+    """
+
+    def __init__(self, json_lines=False, stream=sys.stdout):
+        self.json_lines = json_lines
+        self.stream = stream
+
+    def emit(self, event, **fields):
+        if self.json_lines:
+            line = json.dumps(dict(event=event, time=time.time(), **fields), ensure_ascii=False)
+        else:
+            line = f"[{event}] " + ", ".join(f"{key}: {value}" for key, value in fields.items())
+        self.stream.write(line + '\n')
+        self.stream.flush()
+
+
+async def monitor(room_ids, paizi=None, keyword=None, duration=None, report_interval=REPORT_INTERVAL,
+                  json_lines=False, threaded=False, record_dir=None, record_rejected=False, checkpoint_dir=None,
+                  weighting='uniform', num_winners=1, seed=None, min_count=None, overlay_port=None,
+                  metrics_path=None, dedup_window=DEDUP_WINDOW, source_weights=None, history_path=None,
+                  exclude_paths=(), exclude_winners_days=None, window=None, window_start=None, window_end=None):
+    """
+    Monitor the rooms for `duration` seconds (or until cancelled), streaming stats, then draw the winners.
+    With history_path, the session is recorded to that history database. The viewers listed in the
+    exclude_paths files, and those who won in the last exclude_winners_days days according to the history,
+    cannot enter. With window (seconds) and/or window_start/window_end (timestamps), only the entries of the
+    last `window` seconds of that period count.
+
+    Returns the winners' names.
+    """
+    reporter = Reporter(json_lines)
+    manager = MonitorManager()
+    overlay = None
+    if overlay_port:
+        from overlay import OverlayServer
+        overlay = OverlayServer(port=overlay_port)
+        await overlay.start()
+
+    room_infos = await manager.get_room_info(room_ids)
+    for room_id, (room_title, anchor_name, live_status) in room_infos.items():
+        reporter.emit('room_info', room_id=room_id, title=room_title, anchor=anchor_name, live=bool(live_status))
+    if overlay is not None:
+        overlay.publish('room_info', rooms=[{'room_id': room_id, 'title': title, 'anchor': anchor}
+                                            for room_id, (title, anchor, _) in room_infos.items()])
+
+    exclusions = None
+    if exclude_paths or exclude_winners_days:
+        winner_uids = []
+        if exclude_winners_days and history_path:
+            since = time.time() - exclude_winners_days * 24 * 3600
+            winner_uids = [winner['uid'] for winner in HistoryStore(history_path).winners(since)]
+        exclusions = ExclusionIndex(exclude_paths, winner_uids)
+
+    # Only keep the latest stats, they are reported at a fixed interval
+    latest = {'num_danmu': 0, 'num_viewers': 0}
+
+    def on_danmu(num_danmu, participants):
+        latest['num_danmu'], latest['num_viewers'] = num_danmu, len(participants)
+        if overlay is not None:
+            overlay.update(**latest)
+
+    await manager.start_monitor(on_danmu, room_ids, paizi, keyword, threaded=threaded, record_dir=record_dir,
+                                record_rejected=record_rejected, checkpoint_dir=checkpoint_dir,
+                                dedup_window=dedup_window, source_weights=source_weights, exclusions=exclusions,
+                                window=window, window_start=window_start, window_end=window_end)
+    for room_id, resumed in manager.resumed.items():
+        reporter.emit('resumed', room_id=room_id, **resumed)
+    reporter.emit('start', room_ids=room_ids, paizi=paizi, keyword=keyword, duration=duration)
+    deadline = time.monotonic() + duration if duration else None
+    loop_lag_task = asyncio.create_task(sample_loop_lag())
+    try:
+        while deadline is None or time.monotonic() < deadline:
+            delay = report_interval if deadline is None else min(report_interval, deadline - time.monotonic())
+            await asyncio.sleep(max(delay, 0))
+            reporter.emit('stats', **latest)
+    except (asyncio.CancelledError, KeyboardInterrupt):
+        pass
+    finally:
+        loop_lag_task.cancel()
+        room_stats = manager.stats()
+        snapshot = await manager.stop_monitor(min_count)
+
+    for room_id, stats in room_stats.items():
+        reporter.emit('room_stats', room_id=room_id, **stats)
+    if exclusions is not None:
+        reporter.emit('exclusions', **exclusions.stats())
+    for room_id, error in manager.errors.items():
+        reporter.emit('error', room_id=room_id, error=error)
+    reporter.emit('metrics', **METRICS.snapshot())
+    if metrics_path:
+        METRICS.dump(metrics_path)
+    winners, engine = [], None
+    if snapshot.uids:
+        from lottery import LotteryEngine
+        engine = LotteryEngine(snapshot, weighting, seed)
+        rows = engine.draw(num_winners)
+        winners = [engine.names[row] for row in rows]
+        reporter.emit('result', num_candidates=len(engine), winners=winners, weighting=weighting, seed=engine.seed,
+                      fingerprint=engine.fingerprint())
+    else:
+        reporter.emit('result', num_candidates=0, winners=winners)
+    if history_path:
+        history = HistoryStore(history_path)
+        if engine is not None:
+            history.record_session(manager.room_snapshots, manager.started_at, manager.ended_at,
+                                   [(snapshot.uids[row], snapshot.names[row]) for row in rows], weighting,
+                                   engine.seed, engine.fingerprint())
+        else:
+            history.record_session(manager.room_snapshots, manager.started_at, manager.ended_at)
+        await asyncio.get_running_loop().run_in_executor(None, history.close)
+        reporter.emit('history', path=history_path, **history.stats())
+    if overlay is not None:
+        overlay.publish('result', winners=winners, seed=engine.seed if engine is not None else None)
+        # Let the clients receive the result before shutting down
+        await asyncio.sleep(overlay.push_interval)
+        await overlay.stop()
+        reporter.emit('overlay', **overlay.stats_summary())
+    return winners
+
+
+def run(args):
+    """
+    Entry point of the `monitor` subcommand
+    """
+    # Keep stdout for the reports, anything printed by the libraries goes to stderr like the logs
+    profiler = SessionProfiler(args.profile) if args.profile else None
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            if profiler is not None:
+                profiler.start()
+            try:
+                asyncio.run(monitor(args.room, args.paizi, args.keyword, args.duration, args.interval, args.json,
+                                    args.threaded, args.record, args.record_rejected, args.checkpoint,
+                                    args.weighting, args.winners, args.seed, args.min_entries, args.overlay,
+                                    args.metrics, args.dedup_window, parse_source_weights(args.source),
+                                    args.history, args.exclude, args.exclude_winners,
+                                    args.window * 60 if args.window else None,
+                                    args.window_start, args.window_end))
+            finally:
+                if profiler is not None:
+                    profiler.stop()
+    except KeyboardInterrupt:
+        sys.exit(130)
@@ -0,0 +1,358 @@
+"""
+    Participation history of the monitoring sessions, in a local SQLite database.
+
+    Every finished session is recorded with its rooms, its participants (one row per viewer and room)
+    and its winners, so questions spanning sessions can be answered, e.g.:
+
+        python -m danmuji history regulars --room 23676151 --last 20
+        python -m danmuji history winners --since 2026-10-01
+        python -m danmuji history export --table participants --output participants.csv
+
+    The database is in WAL mode: sessions are written by a background thread in batched transactions
+    while queries read from their own connections without blocking it.
+"""
+import csv
+import datetime
+import json
+import logging
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import closing
+
+from metrics import METRICS
+
+
+HISTORY_PATH = 'history.sqlite3'
+EXPORT_BATCH_SIZE = 10000   # Rows fetched at once when exporting
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    ended_at REAL NOT NULL,
+    num_participants INTEGER NOT NULL,
+    weighting TEXT,
+    seed INTEGER,
+    fingerprint TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_ended_at ON sessions (ended_at);
+CREATE TABLE IF NOT EXISTS session_rooms (
+    room_id INTEGER NOT NULL,
+    session_id INTEGER NOT NULL,
+    PRIMARY KEY (room_id, session_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS participants (
+    session_id INTEGER NOT NULL,
+    room_id INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    medal_level INTEGER NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS participants_session ON participants (session_id, room_id);
+CREATE INDEX IF NOT EXISTS participants_uid ON participants (uid, session_id);
+CREATE TABLE IF NOT EXISTS winners (
+    session_id INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (session_id, rank)
+);
+CREATE INDEX IF NOT EXISTS winners_uid ON winners (uid);
+"""
+
+# Exported tables, filtered by time (session end) and room
+EXPORT_QUERIES = {
+    'sessions': """
+        SELECT s.id AS session_id, s.started_at, s.ended_at, s.num_participants, s.weighting, s.seed, s.fingerprint
+        FROM sessions s
+        WHERE s.ended_at >= :since
+          AND (:room_id IS NULL OR EXISTS (SELECT 1 FROM session_rooms r
+                                          WHERE r.room_id = :room_id AND r.session_id = s.id))
+        ORDER BY s.id""",
+    'participants': """
+        SELECT p.session_id, s.ended_at, p.room_id, p.uid, p.name, p.count, p.medal_level, p.first_seen, p.last_seen
+        FROM sessions s JOIN participants p ON p.session_id = s.id
+        WHERE s.ended_at >= :since AND (:room_id IS NULL OR p.room_id = :room_id)
+        ORDER BY p.session_id""",
+    'winners': """
+        SELECT w.session_id, s.ended_at, w.rank, w.uid, w.name
+        FROM sessions s JOIN winners w ON w.session_id = s.id
+        WHERE s.ended_at >= :since
+          AND (:room_id IS NULL OR EXISTS (SELECT 1 FROM session_rooms r
+                                          WHERE r.room_id = :room_id AND r.session_id = s.id))
+        ORDER BY w.session_id, w.rank""",
+}
+# Parquet type of every exported column
+COLUMN_TYPES = {
+    'session_id': 'int64', 'started_at': 'float64', 'ended_at': 'float64', 'num_participants': 'int64',
+    'weighting': 'string', 'seed': 'int64', 'fingerprint': 'string', 'room_id': 'int64', 'uid': 'int64',
+    'name': 'string', 'count': 'int64', 'medal_level': 'int64', 'first_seen': 'float64', 'last_seen': 'float64',
+    'rank': 'int64',
+}
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryStore():
+    """
+        Sessions, participants and winners recorded in a SQLite database.
+
+        record_session() only queues the session: a writer thread, started on the first record, inserts
+        everything queued in a single transaction, so recording never blocks the event loop and a burst
+        of sessions costs one commit. Queries open their own connection and see every session whose
+        write completed, flush() waits for the queued ones. Exports stream the rows in batches, whole
+        histories are never loaded in memory.
+    """
+
+    def __init__(self, path=HISTORY_PATH):
+        self.path = path
+        self.queue = queue.Queue()  # (session, Future of its id), None to stop the writer
+        self.writer = None
+        self.num_sessions, self.num_rows, self.num_transactions = 0, 0, 0
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.executescript(SCHEMA)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def record_session(self, room_snapshots, started_at, ended_at, winners=(), weighting=None, seed=None,
+                       fingerprint=None):
+        """
+        Queue a finished session: room_snapshots is {room_id: participant Snapshot} and winners a list of
+        (uid, name) in draw order. Returns a concurrent Future of the session id.
+        """
+        session = {
+            'started_at': started_at, 'ended_at': ended_at, 'room_snapshots': dict(room_snapshots),
+            'num_participants': len({uid for snapshot in room_snapshots.values() for uid in snapshot.uids}),
+            'winners': list(winners), 'weighting': weighting, 'seed': seed, 'fingerprint': fingerprint,
+        }
+        future = Future()
+        if self.writer is None:
+            self.writer = threading.Thread(target=self._write_sessions, name='history-writer', daemon=True)
+            self.writer.start()
+        self.queue.put((session, future))
+        return future
+
+    def _write_sessions(self):
+        with closing(self._connect()) as connection:
+            while True:
+                batch = [self.queue.get()]
+                # Everything queued meanwhile goes into the same transaction
+                while batch[-1] is not None:
+                    try:
+                        batch.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stopping = batch[-1] is None
+                sessions = [item for item in batch if item is not None]
+                if sessions:
+                    self._write_batch(connection, sessions)
+                for _ in batch:
+                    self.queue.task_done()
+                if stopping:
+                    return
+
+    def _write_batch(self, connection, sessions):
+        start = time.perf_counter_ns()
+        try:
+            with connection:
+                session_ids = [self._insert_session(connection, session) for session, _ in sessions]
+        except Exception as e:
+            logger.exception("Failed to record %d session(s) to %s", len(sessions), self.path)
+            for _, future in sessions:
+                future.set_exception(e)
+            return
+        self.num_transactions += 1
+        METRICS.record('history_write', time.perf_counter_ns() - start)
+        for (_, future), session_id in zip(sessions, session_ids):
+            future.set_result(session_id)
+
+    def _insert_session(self, connection, session):
+        cursor = connection.execute(
+            'INSERT INTO sessions (started_at, ended_at, num_participants, weighting, seed, fingerprint) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (session['started_at'], session['ended_at'], session['num_participants'], session['weighting'],
+             session['seed'], session['fingerprint']))
+        session_id = cursor.lastrowid
+        room_snapshots = session['room_snapshots']
+        connection.executemany('INSERT INTO session_rooms (room_id, session_id) VALUES (?, ?)',
+                               ((room_id, session_id) for room_id in room_snapshots))
+        for room_id, snapshot in room_snapshots.items():
+            connection.executemany(
+                'INSERT INTO participants VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                ((session_id, room_id, *row) for row in zip(*snapshot)))
+            self.num_rows += len(snapshot.uids)
+        connection.executemany('INSERT INTO winners (session_id, rank, uid, name) VALUES (?, ?, ?, ?)',
+                               ((session_id, rank, int(uid), name)
+                                for rank, (uid, name) in enumerate(session['winners'], 1)))
+        self.num_sessions += 1
+        return session_id
+
+    def flush(self):
+        """
+        Wait until every queued session is written
+        """
+        self.queue.join()
+
+    def close(self):
+        """
+        Write the queued sessions and stop the writer
+        """
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join()
+            self.writer = None
+
+    def _query(self, sql, params=()):
+        with closing(self._connect()) as connection:
+            return [dict(row) for row in connection.execute(sql, params)]
+
+    def sessions(self, room_id=None, limit=20):
+        """
+        Latest sessions, newest first
+        """
+        return self._query(
+            """SELECT s.id AS session_id, s.started_at, s.ended_at, s.num_participants, s.weighting, s.seed,
+                      (SELECT group_concat(r.room_id) FROM session_rooms r WHERE r.session_id = s.id) AS room_ids,
+                      (SELECT group_concat(w.name) FROM winners w WHERE w.session_id = s.id) AS winners
+               FROM sessions s
+               WHERE :room_id IS NULL OR s.id IN (SELECT session_id FROM session_rooms WHERE room_id = :room_id)
+               ORDER BY s.id DESC LIMIT :limit""",
+            {'room_id': room_id, 'limit': limit})
+
+    def regulars(self, room_id=None, last_sessions=20, min_sessions=1, limit=None):
+        """
+        Viewers who entered the last `last_sessions` sessions (of a room if given) at least min_sessions
+        times, most regular first, with the name they used last
+        """
+        return self._query(
+            """WITH recent AS (
+                   SELECT id AS session_id FROM sessions
+                   WHERE :room_id IS NULL OR id IN (SELECT session_id FROM session_rooms WHERE room_id = :room_id)
+                   ORDER BY id DESC LIMIT :last_sessions)
+               SELECT p.uid, p.name, COUNT(DISTINCT p.session_id) AS num_sessions, SUM(p.count) AS num_entries,
+                      MAX(p.session_id) AS last_session
+               FROM recent JOIN participants p ON p.session_id = recent.session_id
+               WHERE :room_id IS NULL OR p.room_id = :room_id
+               GROUP BY p.uid
+               HAVING num_sessions >= :min_sessions
+               ORDER BY num_sessions DESC, num_entries DESC
+               LIMIT :limit""",
+            {'room_id': room_id, 'last_sessions': last_sessions, 'min_sessions': min_sessions,
+             'limit': -1 if limit is None else limit})
+
+    def winners(self, since=0, room_id=None):
+        """
+        Winners of the sessions ended since the given time, newest first
+        """
+        return self._query(
+            """SELECT w.uid, w.name, w.rank, w.session_id, s.ended_at
+               FROM sessions s JOIN winners w ON w.session_id = s.id
+               WHERE s.ended_at >= :since
+                 AND (:room_id IS NULL OR s.id IN (SELECT session_id FROM session_rooms WHERE room_id = :room_id))
+               ORDER BY s.ended_at DESC, w.rank""",
+            {'since': since, 'room_id': room_id})
+
+    def participations(self, uid):
+        """
+        Sessions a viewer entered, newest first
+        """
+        return self._query(
+            """SELECT p.session_id, s.ended_at, p.room_id, p.name, p.count, p.medal_level,
+                      EXISTS (SELECT 1 FROM winners w WHERE w.session_id = p.session_id AND w.uid = p.uid) AS won
+               FROM participants p JOIN sessions s ON s.id = p.session_id
+               WHERE p.uid = ?
+               ORDER BY p.session_id DESC""",
+            (uid,))
+
+    def export(self, table, path, since=0, room_id=None):
+        """
+        Stream a table to a CSV file, or to a Parquet file (requires pyarrow) if the path ends with .parquet.
+        Returns the number of rows written.
+        """
+        if table not in EXPORT_QUERIES:
+            raise ValueError(f"Unknown table: {table}")
+        with closing(self._connect()) as connection:
+            cursor = connection.execute(EXPORT_QUERIES[table], {'since': since, 'room_id': room_id})
+            columns = [description[0] for description in cursor.description]
+            batches = iter(lambda: cursor.fetchmany(EXPORT_BATCH_SIZE), [])
+            if path.endswith('.parquet'):
+                return self._write_parquet(path, columns, batches)
+            num_rows = 0
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                for rows in batches:
+                    writer.writerows(rows)
+                    num_rows += len(rows)
+            return num_rows
+
+    @staticmethod
+    def _write_parquet(path, columns, batches):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export requires pyarrow") from None
+        schema = pa.schema([(column, pa.type_for_alias(COLUMN_TYPES[column])) for column in columns])
+        num_rows = 0
+        with pq.ParquetWriter(path, schema) as writer:
+            for rows in batches:
+                writer.write_batch(pa.RecordBatch.from_arrays(
+                    [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)], schema=schema))
+                num_rows += len(rows)
+        return num_rows
+
+    def stats(self):
+        return {
+            'sessions_written': self.num_sessions,
+            'participant_rows_written': self.num_rows,
+            'transactions': self.num_transactions,
+            'queued': self.queue.qsize(),
+        }
+
+
+def parse_date(text):
+    """
+    Timestamp of a YYYY-MM-DD date (local midnight)
+    """
+    return time.mktime(datetime.datetime.strptime(text, '%Y-%m-%d').timetuple())
+
+
+def run(args):
+    """
+    Entry point of the `history` subcommand. Writes the query results as JSON lines.
+    """
+    history = HistoryStore(args.db or HISTORY_PATH)
+    since = parse_date(args.since) if args.since else 0
+    if args.query == 'export':
+        if not args.output:
+            sys.exit("history export: --output is required")
+        try:
+            num_rows = history.export(args.table, args.output, since, args.room)
+        except RuntimeError as e:
+            sys.exit(str(e))
+        logger.info("Exported %d %s rows to %s", num_rows, args.table, args.output)
+        return
+    if args.query == 'sessions':
+        rows = history.sessions(args.room, args.last)
+    elif args.query == 'regulars':
+        rows = history.regulars(args.room, args.last, args.min_sessions)
+    elif args.query == 'winners':
+        rows = history.winners(since, args.room)
+    else:
+        if args.uid is None:
+            sys.exit("history viewer: --uid is required")
+        rows = history.participations(args.uid)
+    for row in rows:
+        sys.stdout.write(json.dumps(row, ensure_ascii=False) + '\n')
@@ -0,0 +1,123 @@
+"""
+    Logging setup of the application.
+
+    Records are filtered and queued by the thread that logs them, and written to the console and the
+    optional rotating log file by a background QueueListener thread, so a slow console never blocks
+    the danmu processing. Modules log through `logging.getLogger(__name__)`.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from collections import Counter
+
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+LOG_QUEUE_SIZE = 10000          # Records waiting for the writer thread before new ones are dropped
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+# Max records per second of each rate limited message type, set with extra={'rate_key': ...}
+RATE_LIMITS = {'danmu': 20}
+
+# Attributes of every LogRecord, anything else was passed through `extra`
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'rate_key', 'suppressed'}
+
+
+class RateLimitFilter(logging.Filter):
+    """
+        Token bucket per message type. Records without a rate_key, or with a key that has no limit, all
+        go through. The number of records dropped since the last one that went through is attached to
+        it as `suppressed`.
+    """
+
+    def __init__(self, limits=RATE_LIMITS):
+        super(RateLimitFilter, self).__init__()
+        self.limits = limits
+        self.buckets = {}   # rate_key -> (tokens, time of the last refill)
+        self.suppressed = Counter()
+
+    def filter(self, record):
+        key = getattr(record, 'rate_key', None)
+        rate = self.limits.get(key)
+        if rate is None:
+            return True
+        now = time.monotonic()
+        tokens, last = self.buckets.get(key, (rate, now))
+        tokens = min(rate, tokens + (now - last) * rate)
+        if tokens < 1:
+            self.buckets[key] = (tokens, now)
+            self.suppressed[key] += 1
+            return False
+        self.buckets[key] = (tokens - 1, now)
+        record.suppressed = self.suppressed.pop(key, 0)
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+        Drops (and counts) the records that do not fit in the queue instead of raising
+    """
+
+    def __init__(self, log_queue):
+        super(NonBlockingQueueHandler, self).__init__(log_queue)
+        self.num_dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.num_dropped += 1
+
+
+class TextFormatter(logging.Formatter):
+
+    def format(self, record):
+        line = super(TextFormatter, self).format(record)
+        if getattr(record, 'suppressed', 0):
+            line += f" [{record.suppressed} similar messages suppressed]"
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """
+        One JSON object per record, including the fields passed through `extra`
+    """
+
+    def format(self, record):
+        entry = {'time': record.created, 'level': record.levelname, 'logger': record.name,
+                 'message': record.getMessage()}
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        entry.update((key, value) for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level='INFO', log_file=None, json_format=False):
+    """
+    Route all the logging through a queue to the console (stderr) and the optional rotating log file.
+    Returns the QueueListener, which is stopped at exit.
+    """
+    formatter = JsonFormatter() if json_format else TextFormatter(LOG_FORMAT)
+    handlers = []
+    if sys.stderr is not None:  # No console in windowed builds
+        handlers.append(logging.StreamHandler(sys.stderr))
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(log_file, maxBytes=LOG_FILE_MAX_BYTES,
+                                                             backupCount=LOG_FILE_BACKUPS, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter())
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,173 @@
+"""
+    Connection manager monitoring several live rooms at once.
+"""
+import asyncio
+import logging
+import os
+import time
+from functools import partial
+
+from checkpoint import Checkpointer
+from core import Danmuku
+from dedup import DEDUP_WINDOW
+from participants import ParticipantStore
+from recorder import SessionRecorder
+
+
+LIVE_STATUS_MAX_AGE = 5.0   # Cached live statuses older than this (seconds) are rechecked when a session starts
+
+logger = logging.getLogger(__name__)
+
+
+class MonitorManager():
+    """
+        Monitors N live rooms concurrently on the running event loop.
+
+        Every room is served by its own Danmuku, which keeps a per-room participant pool and throughput
+        stats. The manager merges the rooms into a single pool (a viewer chatting in two rooms enters
+        once) and reports the merged pool to the callback. With a single room the room's own pool is
+        reported directly, so nothing is duplicated.
+
+        Room info requests run concurrently and go through bilibili_api's shared HTTP session, and are
+        served from a RoomInfoCache if one is given.
+    """
+
+    def __init__(self, room_cache=None):
+        self.rooms = {}     # room_id -> Danmuku
+        self.room_cache = room_cache
+        self.merged = ParticipantStore()
+        self.merged_rows = {}   # room_id -> rows of the room pool already merged
+        self.new_danmu_callback = None
+        self.room_snapshots = {}    # room_id -> Snapshot of the last finished session
+        self.started_at, self.ended_at = None, None     # Wall-clock times of the last session
+        self.errors = {}    # room_id -> why the room stopped receiving danmu before the end of the last session
+        self.resumed = {}   # room_id -> what was recovered, for the rooms resumed from a checkpoint
+        self.exclusions, self.exclusions_task = None, None
+
+    async def get_room_info(self, room_ids, on_live_status=None):
+        """
+        Returns {room_id: (room title, anchor name, live status)}. Cached infos are returned right away, so a
+        session starts without waiting for the API; the live status of the entries older than
+        LIVE_STATUS_MAX_AGE is rechecked in the background, and on_live_status(room_id, info) is called with
+        the fresh info of the rooms whose status changed.
+        """
+        fetch = Danmuku().get_room_info
+        if self.room_cache is None:
+            infos = await asyncio.gather(*(fetch(room_id) for room_id in room_ids))
+            return dict(zip(room_ids, infos))
+        infos = await asyncio.gather(*(self.room_cache.get(room_id, fetch) for room_id in room_ids))
+        infos = dict(zip(room_ids, infos))
+        for room_id, info in infos.items():
+            if self.room_cache.age(room_id) > LIVE_STATUS_MAX_AGE:
+                task = self.room_cache.refresh(room_id, fetch)
+                if on_live_status is not None:
+                    task.add_done_callback(partial(self._on_live_status_rechecked, room_id, info, on_live_status))
+        return infos
+
+    @staticmethod
+    def _on_live_status_rechecked(room_id, cached, on_live_status, task):
+        if task.cancelled() or task.exception() is not None:
+            return  # Counted by the cache, the cached status stands
+        info = task.result()
+        if info[2] != cached[2]:
+            on_live_status(room_id, info)
+
+    async def prefetch_room_info(self, room_ids):
+        """
+        Warm the room info cache, so that monitoring these rooms starts without waiting for the API
+        """
+        if self.room_cache is not None:
+            await self.room_cache.prefetch(room_ids, Danmuku().get_room_info)
+
+    async def start_monitor(self, new_danmu_callback, room_ids, paizi=None, keyword=None, threaded=False,
+                            record_dir=None, record_rejected=False, checkpoint_dir=None, dedup_window=DEDUP_WINDOW,
+                            source_weights=None, exclusions=None, window=None, window_start=None, window_end=None):
+        """
+        Start monitoring the rooms. With record_dir, each room's danmu are logged to
+        <record_dir>/<room_id>-<start time>.events/.strings. With checkpoint_dir, each room is checkpointed
+        to <checkpoint_dir>/<room_id>.jsonl and resumed from there if its last session, with the same filters,
+        did not end normally shortly before; the rooms resumed are in `resumed`.
+        Repeats of a viewer's message within dedup_window seconds are ignored (0 disables). source_weights selects the
+        event types entering viewers and their weights, see sources.py. The ExclusionIndex, shared by all the
+        rooms, is loaded before connecting and reloaded whenever its files change. window, window_start and
+        window_end restrict the result to the entries of a time window, see Danmuku.start_monitor().
+        """
+        assert callable(new_danmu_callback)
+        self.new_danmu_callback = new_danmu_callback
+        self.rooms = {room_id: Danmuku() for room_id in room_ids}
+        self.merged = ParticipantStore()
+        self.merged_rows = {room_id: 0 for room_id in room_ids}
+        self.started_at, self.ended_at = time.time(), None
+        self.resumed = {}
+        self.exclusions = exclusions
+        try:
+            if exclusions is not None:
+                await exclusions.reload()
+                self.exclusions_task = asyncio.create_task(exclusions.watch())
+            session_name = time.strftime('%Y%m%d-%H%M%S')
+            for room_id, danmuku in self.rooms.items():
+                recorder = None
+                if record_dir:
+                    recorder = SessionRecorder(os.path.join(record_dir, f"{room_id}-{session_name}"), record_rejected)
+                checkpointer = None
+                if checkpoint_dir:
+                    checkpointer = Checkpointer(os.path.join(checkpoint_dir, f"{room_id}.jsonl"))
+                await danmuku.start_monitor(partial(self._on_room_danmu, room_id), room_id, paizi, keyword,
+                                            threaded=threaded, recorder=recorder, checkpointer=checkpointer,
+                                            dedup_window=dedup_window, source_weights=source_weights,
+                                            exclusions=exclusions, window=window, window_start=window_start,
+                                            window_end=window_end)
+                if danmuku.resumed:
+                    self.resumed[room_id] = danmuku.resumed
+        except Exception:
+            await self.stop_monitor()
+            raise
+
+    def _on_room_danmu(self, room_id, num_danmu, participants):
+        if len(self.rooms) == 1:
+            self.new_danmu_callback(num_danmu, participants)
+            return
+        # Merge the viewers appended to the room pool since the last report
+        row = self.merged_rows[room_id]
+        for uid, viewer_name in zip(participants.uids[row:], participants.names[row:]):
+            self.merged.add(uid, viewer_name)
+        self.merged_rows[room_id] = len(participants)
+        self.new_danmu_callback(self.num_danmu(), self.merged)
+
+    def num_danmu(self):
+        return sum(danmuku.num_danmu for danmuku in self.rooms.values())
+
+    def stats(self):
+        """
+        Returns {room_id: throughput stats} of the rooms being monitored
+        """
+        return {room_id: danmuku.stats() for room_id, danmuku in self.rooms.items()}
+
+    async def stop_monitor(self, min_count=None):
+        """
+        Stop all the rooms and return the snapshot of the merged participant pool, restricted to the viewers
+        with at least min_count accepted entries (weighted counts) if given
+        """
+        if self.exclusions_task is not None:
+            self.exclusions_task.cancel()
+            self.exclusions_task = None
+            logger.info("Exclusions: %s", self.exclusions.stats())
+        running = {room_id: danmuku for room_id, danmuku in self.rooms.items() if danmuku.start_time}
+        # With several rooms the threshold applies to the merged counts
+        room_min_count = min_count if len(running) == 1 else None
+        snapshots = await asyncio.gather(*(danmuku.stop_monitor(room_min_count) for danmuku in running.values()))
+        self.room_snapshots = dict(zip(running, snapshots))
+        self.errors = {room_id: danmuku.worker_error for room_id, danmuku in running.items() if danmuku.worker_error}
+        self.ended_at = time.time()
+        if len(snapshots) == 1:
+            result = snapshots[0]
+        else:
+            # The live merged pool only tracks new viewers, rebuild it with the final per-room counts
+            merged = ParticipantStore()
+            for snapshot in snapshots:
+                for uid, name, count, medal_level, first_seen, last_seen in zip(*snapshot):
+                    merged.add(uid, name, medal_level, count, first_seen, last_seen)
+            result = merged.snapshot(merged.select(min_count=min_count) if min_count else None)
+        self.rooms = {}
+        self.merged = ParticipantStore()
+        return result
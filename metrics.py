@@ -0,0 +1,190 @@
+"""
+    Low-overhead instrumentation of the danmu pipeline.
+
+    Stages are timed with time.perf_counter_ns() around the hot paths and recorded into fixed-size
+    histograms, so recording is a couple of integer operations and never allocates:
+
+        start = time.perf_counter_ns()
+        ...
+        METRICS.record('filter', time.perf_counter_ns() - start)
+
+    METRICS.snapshot() returns the latency percentiles, counter rates and gauges (queue depths) as a
+    JSON-serializable dict. Worker threads record into the same registry: a new stage or counter is added
+    under a lock, which the snapshot holds while it copies the registry.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import Counter
+
+
+HISTOGRAM_BUCKETS = 256
+LOOP_LAG_INTERVAL = 0.1     # Seconds between two event loop lag samples
+
+logger = logging.getLogger(__name__)
+
+
+class Histogram():
+    """
+        Latency histogram in nanoseconds with 4 linear sub-buckets per power of two, so percentiles are
+        within 12.5% of the exact value.
+    """
+
+    def __init__(self):
+        self.buckets = [0] * HISTOGRAM_BUCKETS
+        self.count, self.total, self.max = 0, 0, 0
+
+    @staticmethod
+    def bucket(value):
+        if value < 8:
+            return value
+        shift = value.bit_length() - 3
+        return min(shift * 4 + (value >> shift), HISTOGRAM_BUCKETS - 1)
+
+    @staticmethod
+    def bucket_value(bucket):
+        """
+        Middle of the range of values falling into the bucket
+        """
+        if bucket < 8:
+            return bucket
+        shift, mantissa = bucket // 4 - 1, bucket % 4 + 4
+        return (2 * mantissa + 1) << shift >> 1
+
+    def record(self, value):
+        self.buckets[self.bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        if not self.count:
+            return 0
+        rank = q / 100 * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(self.bucket_value(bucket), self.max)
+        return self.max
+
+    def summary(self):
+        """
+        Count and latencies in microseconds
+        """
+        return {
+            'count': self.count,
+            'mean_us': self.total / self.count / 1000 if self.count else 0,
+            'p50_us': self.percentile(50) / 1000,
+            'p90_us': self.percentile(90) / 1000,
+            'p99_us': self.percentile(99) / 1000,
+            'max_us': self.max / 1000,
+        }
+
+
+class Metrics():
+    """
+        Registry of the stage latencies, event counters and gauges of the application.
+    """
+
+    def __init__(self):
+        self.histograms = {}    # stage -> Histogram
+        self.counters = Counter()
+        self.gauges = {}        # name -> callable returning the current value
+        self.start_time = time.monotonic()
+        self.lock = threading.Lock()    # Held while adding a stage or counter, and while taking a snapshot
+
+    def record(self, stage, duration_ns):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(stage, Histogram())
+        histogram.record(duration_ns)
+
+    def count(self, name, num=1):
+        counters = self.counters
+        if name in counters:
+            counters[name] += num
+        else:
+            with self.lock:
+                counters[name] += num
+
+    def gauge(self, name, getter):
+        self.gauges[name] = getter
+
+    def remove_gauge(self, name):
+        self.gauges.pop(name, None)
+
+    def reset(self):
+        self.histograms = {}
+        self.counters = Counter()
+        self.start_time = time.monotonic()
+
+    def snapshot(self):
+        elapsed = time.monotonic() - self.start_time
+        with self.lock:
+            histograms, counters = list(self.histograms.items()), list(self.counters.items())
+        return {
+            'elapsed_sec': elapsed,
+            'latency': {stage: histogram.summary() for stage, histogram in histograms},
+            'counters': {name: {'total': total, 'per_sec': total / elapsed if elapsed else 0}
+                         for name, total in counters},
+            'gauges': {name: getter() for name, getter in list(self.gauges.items())},
+        }
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+
+
+# Shared by the whole application
+METRICS = Metrics()
+
+
+async def sample_loop_lag(metrics=METRICS, interval=LOOP_LAG_INTERVAL):
+    """
+    Record how late the running event loop wakes up a sleeping task, until cancelled
+    """
+    interval_ns = int(interval * 1e9)
+    while True:
+        start = time.perf_counter_ns()
+        await asyncio.sleep(interval)
+        metrics.record('loop_lag', max(time.perf_counter_ns() - start - interval_ns, 0))
+
+
+class SessionProfiler():
+    """
+        Profiles a monitoring session with pyinstrument's sampling profiler if it is installed (HTML
+        report if the path ends with .html, text otherwise), or with cProfile (pstats file) otherwise.
+        cProfile only sees the thread it was started from.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.profiler, self.kind = None, None
+
+    def start(self):
+        try:
+            from pyinstrument import Profiler
+            self.profiler, self.kind = Profiler(async_mode='enabled'), 'pyinstrument'
+            self.profiler.start()
+        except ImportError:
+            import cProfile
+            self.profiler, self.kind = cProfile.Profile(), 'cProfile'
+            self.profiler.enable()
+
+    def stop(self):
+        if self.profiler is None:
+            return
+        if self.kind == 'pyinstrument':
+            self.profiler.stop()
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.write(self.profiler.output_html() if self.path.endswith('.html') else self.profiler.output_text())
+        else:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.path)
+        logger.info("%s profile written to %s", self.kind, self.path)
+        self.profiler = None
@@ -0,0 +1,215 @@
+"""
+    Local stats server for OBS overlays.
+
+    Add a browser source pointing at http://127.0.0.1:8765/ to show the live counts and the lottery
+    result, or subscribe to /events (Server-Sent Events) or /ws (WebSocket) for the raw JSON messages:
+
+        {"event": "state", "stats": {...}, "room_info": {...}, "result": {...}}    full state, sent first
+        {"event": "stats", "num_danmu": 120}                                        changed fields only
+        {"event": "result", "winners": [...], "seed": ...}
+"""
+import asyncio
+import json
+import logging
+
+from metrics import METRICS
+
+
+OVERLAY_HOST = '127.0.0.1'
+OVERLAY_PORT = 8765
+OVERLAY_PUSH_INTERVAL = 0.2     # Seconds between two stats deltas
+CLIENT_QUEUE_SIZE = 64          # Messages queued for a client before it is dropped as too slow
+
+logger = logging.getLogger(__name__)
+
+OVERLAY_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Danmuji</title>
+<style>body{margin:0;font:bold 32px sans-serif;color:#fff;text-shadow:0 0 4px #000}#winner{color:#f33}</style>
+</head><body>
+<div>弹幕 <span id="num_danmu">0</span> · 观众 <span id="num_viewers">0</span></div>
+<div id="winner"></div>
+<script>
+const source = new EventSource('/events');
+function show(stats) {
+    for (const key in stats) {
+        const element = document.getElementById(key);
+        if (element) element.textContent = stats[key];
+    }
+}
+function showResult(result) {
+    document.getElementById('winner').textContent = result ? result.winners.join(' / ') : '';
+}
+source.addEventListener('state', e => { const state = JSON.parse(e.data); show(state.stats); showResult(state.result); });
+source.addEventListener('stats', e => show(JSON.parse(e.data)));
+source.addEventListener('result', e => showResult(JSON.parse(e.data)));
+</script></body></html>
+"""
+
+
+class OverlayServer():
+    """
+        Optional HTTP server running on the application's event loop.
+
+            GET /           overlay page for OBS
+            GET /state      current state as JSON
+            GET /events     Server-Sent Events stream
+            GET /ws         WebSocket stream
+
+        Stats updates are coalesced: update() only records the latest values, and every push_interval
+        the fields that changed since the last push go out as one 'stats' delta. Each message is
+        serialized and encoded once, and the same payload is queued to every client. A client whose
+        queue is full is dropped rather than slowing down the others. aiohttp is only imported when
+        the server is started.
+    """
+
+    def __init__(self, host=OVERLAY_HOST, port=OVERLAY_PORT, push_interval=OVERLAY_PUSH_INTERVAL):
+        self.host, self.port = host, port
+        self.push_interval = push_interval
+        self.stats = {'num_danmu': 0, 'num_viewers': 0}
+        self.pushed_stats = dict(self.stats)
+        self.events = {}        # Latest message of each other event, e.g. room_info and result
+        self.clients = set()    # Message queue of each client
+        self.runner, self.push_task = None, None
+        self.num_messages, self.num_dropped_clients = 0, 0
+
+    async def start(self):
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get('/', self._page)
+        app.router.add_get('/state', self._state)
+        app.router.add_get('/events', self._event_stream)
+        app.router.add_get('/ws', self._websocket)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        self.push_task = asyncio.create_task(self._push_periodically())
+        METRICS.gauge('overlay_clients', lambda: len(self.clients))
+        logger.info("Overlay server listening on http://%s:%d/", self.host, self.port)
+
+    async def stop(self):
+        if self.push_task is not None:
+            self.push_task.cancel()
+        for queue in list(self.clients):
+            self._close(queue)
+        if self.runner is not None:
+            await self.runner.cleanup()
+        self.runner, self.push_task = None, None
+        METRICS.remove_gauge('overlay_clients')
+
+    # === Publishing ===
+
+    def update(self, **stats):
+        """
+        Record the latest stats, pushed to the clients on the next tick
+        """
+        self.stats.update(stats)
+
+    def publish(self, event, **fields):
+        """
+        Push an event to the clients right away, new clients receive its latest value too
+        """
+        self.events[event] = fields
+        self._broadcast(event, fields)
+
+    def reset(self):
+        """
+        Clear the state for a new session
+        """
+        self.stats = dict.fromkeys(self.stats, 0)
+        self.pushed_stats = dict(self.stats)
+        self.events = {}
+        self._broadcast('state', self._full_state())
+
+    def _full_state(self):
+        return {'stats': self.stats, **self.events}
+
+    async def _push_periodically(self):
+        while True:
+            await asyncio.sleep(self.push_interval)
+            delta = {key: value for key, value in self.stats.items() if self.pushed_stats.get(key) != value}
+            if delta:
+                self.pushed_stats.update(delta)
+                self._broadcast('stats', delta)
+
+    @staticmethod
+    def _encode(event, fields):
+        """
+        Returns the (WebSocket text, SSE bytes) of a message
+        """
+        text = json.dumps({'event': event, **fields}, ensure_ascii=False)
+        return text, f"event: {event}\ndata: {text}\n\n".encode('utf-8')
+
+    def _broadcast(self, event, fields):
+        if not self.clients:
+            return
+        message = self._encode(event, fields)
+        self.num_messages += 1
+        for queue in list(self.clients):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.num_dropped_clients += 1
+                logger.warning("Dropped an overlay client too slow to keep up")
+                self._close(queue)
+
+    # === Clients ===
+
+    def _subscribe(self):
+        queue = asyncio.Queue(CLIENT_QUEUE_SIZE)
+        queue.put_nowait(self._encode('state', self._full_state()))
+        self.clients.add(queue)
+        return queue
+
+    def _close(self, queue):
+        """
+        Make the client's handler return after its pending messages
+        """
+        self.clients.discard(queue)
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    async def _page(self, request):
+        from aiohttp import web
+        return web.Response(text=OVERLAY_PAGE, content_type='text/html')
+
+    async def _state(self, request):
+        from aiohttp import web
+        return web.json_response(self._full_state(), headers={'Access-Control-Allow-Origin': '*'})
+
+    async def _event_stream(self, request):
+        from aiohttp import web
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache',
+                                               'Access-Control-Allow-Origin': '*'})
+        await response.prepare(request)
+        queue = self._subscribe()
+        try:
+            while (message := await queue.get()) is not None:
+                await response.write(message[1])
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(queue)
+        return response
+
+    async def _websocket(self, request):
+        from aiohttp import web
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        queue = self._subscribe()
+        try:
+            while (message := await queue.get()) is not None and not ws.closed:
+                await ws.send_str(message[0])
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(queue)
+            await ws.close()
+        return ws
+
+    def stats_summary(self):
+        return {
+            'clients': len(self.clients),
+            'messages': self.num_messages,
+            'dropped_clients': self.num_dropped_clients,
+        }
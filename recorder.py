@@ -0,0 +1,226 @@
+"""
+    Append-only session log of the danmu seen while monitoring, for auditing lottery results.
+
+    A session log is a pair of files:
+
+        <path>.events   fixed-width little endian records, see EVENT_FORMAT
+        <path>.strings  string table of viewer and medal names, each a uint32 length + utf-8 bytes
+
+    Events refer to names by their index in the string table (id 0 is the empty string) and only keep an
+    8-byte hash of the message. The fixed width lets SessionLog memory-map the events as a NumPy record
+    array, so a multi-hour session can be replayed or re-filtered with vectorized operations.
+"""
+import hashlib
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+
+
+# time (unix seconds), uid, name id, medal name id, medal level, accepted, padding, message hash
+EVENT_FORMAT = '<dqIIBBxxQ'
+EVENT_SIZE = struct.calcsize(EVENT_FORMAT)
+STRING_HEADER = struct.Struct('<I')
+
+FLUSH_INTERVAL = 1.0    # Max seconds an event stays in the memory buffer
+MAX_BUFFERED_EVENTS = 4096
+REPLAY_CHUNK = 65536
+
+
+def message_hash(msg):
+    return int.from_bytes(hashlib.blake2b(msg.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class SessionRecorder():
+    """
+        Buffered writer of a session log.
+
+        record() only packs the event into an in-memory buffer. Full buffers (or buffers older than
+        flush_interval) are handed to a background thread which appends them to the files, so the
+        event loop never waits for the disk. When no event comes to trigger the flush, the writer thread
+        takes the stale buffer itself, so an event is on disk within two flush intervals even if the
+        chat goes quiet. A recorder must be fed from a single thread.
+    """
+
+    def __init__(self, path, record_rejected=False, flush_interval=FLUSH_INTERVAL,
+                 max_buffered_events=MAX_BUFFERED_EVENTS):
+        self.path = path
+        self.record_rejected = record_rejected
+        self.flush_interval = flush_interval
+        self.max_buffered_bytes = max_buffered_events * EVENT_SIZE
+        self.string_ids = {'': 0}
+        self.events, self.strings = bytearray(), bytearray(STRING_HEADER.pack(0))
+        self.lock = threading.Lock()    # Guards the buffers, shared with the writer thread's periodic flush
+        self.last_flush = time.monotonic()
+        self.num_events = 0
+        self.pack_event = struct.Struct(EVENT_FORMAT).pack
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self._write, name=f"SessionRecorder-{os.path.basename(path)}",
+                                       daemon=True)
+        self.writer.start()
+
+    def _string_id(self, string):
+        string_id = self.string_ids.get(string)
+        if string_id is None:
+            string_id = self.string_ids[string] = len(self.string_ids)
+            data = string.encode('utf-8')
+            self.strings += STRING_HEADER.pack(len(data))
+            self.strings += data
+        return string_id
+
+    def record(self, uid, viewer_name, medal_name, medal_level, msg, accepted):
+        msg_hash = message_hash(msg)
+        with self.lock:
+            self.events += self.pack_event(time.time(), uid, self._string_id(viewer_name),
+                                           self._string_id(medal_name), medal_level, accepted, msg_hash)
+            self.num_events += 1
+            if len(self.events) >= self.max_buffered_bytes or time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush()
+
+    def flush(self):
+        """
+        Hand the buffered events over to the writer thread
+        """
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if self.events or self.strings:
+            self.queue.put((bytes(self.strings), bytes(self.events)))
+            self.events, self.strings = bytearray(), bytearray()
+        self.last_flush = time.monotonic()
+
+    def _write(self):
+        with open(self.path + '.strings', 'ab') as strings_file, open(self.path + '.events', 'ab') as events_file:
+            while True:
+                try:
+                    item = self.queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    # No event came to flush the buffer, flush it from here
+                    with self.lock:
+                        if time.monotonic() - self.last_flush >= self.flush_interval:
+                            self._flush()
+                    continue
+                if item is None:
+                    return
+                strings, events = item
+                # Strings first, so that every event on disk refers to a string already written
+                strings_file.write(strings)
+                strings_file.flush()
+                events_file.write(events)
+                events_file.flush()
+
+    def close(self):
+        """
+        Write the remaining events and wait for the writer thread. Blocking, run it in an executor.
+        """
+        self.flush()
+        self.queue.put(None)
+        self.writer.join()
+
+
+class SessionLog():
+    """
+        Memory-mapped reader of a session log.
+    """
+
+    def __init__(self, path):
+        import numpy as np
+
+        self.path = path
+        self.strings = self._read_strings(path + '.strings')
+        self.string_ids = {string: string_id for string_id, string in enumerate(self.strings)}
+        dtype = np.dtype({
+            'names': ['time', 'uid', 'name_id', 'medal_id', 'medal_level', 'accepted', 'msg_hash'],
+            'formats': ['<f8', '<i8', '<u4', '<u4', 'u1', 'u1', '<u8'],
+            'offsets': [0, 8, 16, 20, 24, 25, 28],
+            'itemsize': EVENT_SIZE,
+        })
+        size = os.path.getsize(path + '.events')
+        if size:
+            with open(path + '.events', 'rb') as f:
+                self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # Ignore a partially written trailing record
+            self.events = np.frombuffer(self.mmap, dtype=dtype, count=size // EVENT_SIZE)
+        else:
+            self.mmap, self.events = None, np.zeros(0, dtype=dtype)
+
+    @staticmethod
+    def _read_strings(path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        strings, offset = [], 0
+        while offset + STRING_HEADER.size <= len(data):
+            length, = STRING_HEADER.unpack_from(data, offset)
+            offset += STRING_HEADER.size
+            strings.append(data[offset: offset + length].decode('utf-8'))
+            offset += length
+        return strings
+
+    def __len__(self):
+        return len(self.events)
+
+    def select(self, accepted=None, medal=None, min_medal_level=0, start=None, end=None, msg=None):
+        """
+        Returns the boolean mask of the events matching all the given conditions
+        """
+        import numpy as np
+
+        events = self.events
+        mask = np.ones(len(events), dtype=bool)
+        if accepted is not None:
+            mask &= events['accepted'] == int(accepted)
+        if medal is not None:
+            mask &= events['medal_id'] == self.string_ids.get(medal, -1)
+        if min_medal_level:
+            mask &= events['medal_level'] >= min_medal_level
+        if start is not None:
+            mask &= events['time'] >= start
+        if end is not None:
+            mask &= events['time'] < end
+        if msg is not None:
+            mask &= events['msg_hash'] == message_hash(msg)
+        return mask
+
+    def participants(self, mask=None):
+        """
+        Returns [(uid, viewer name)] of the selected events, in order of first appearance
+        """
+        import numpy as np
+
+        events = self.events if mask is None else self.events[mask]
+        _, first_rows = np.unique(events['uid'], return_index=True)
+        first_rows.sort()
+        return [(int(uid), self.strings[name_id])
+                for uid, name_id in zip(events['uid'][first_rows], events['name_id'][first_rows])]
+
+    def replay(self, mask=None):
+        """
+        Yield (time, uid, viewer name, medal name, medal level, accepted, message hash) of the selected events
+        """
+        events = self.events if mask is None else self.events[mask]
+        strings = self.strings
+        # Convert in chunks, a multi-hour session does not fit in a list of Python tuples
+        for offset in range(0, len(events), REPLAY_CHUNK):
+            for ts, uid, name_id, medal_id, medal_level, accepted, msg_hash in events[offset: offset + REPLAY_CHUNK].tolist():
+                yield ts, uid, strings[name_id], strings[medal_id], medal_level, bool(accepted), msg_hash
+
+    def close(self):
+        self.events = None
+        if self.mmap is not None:
+            self.mmap.close()
+
+
+# === DEBUG ONLY ===
+if __name__ == "__main__":
+    import sys
+
+    log = SessionLog(sys.argv[1])
+    accepted = log.select(accepted=True)
+    print(f"{len(log)} events, {int(accepted.sum())} accepted, {len(log.participants(accepted))} participants")
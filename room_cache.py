@@ -0,0 +1,149 @@
+"""
+    Room info cache, so that starting a session does not wait for the bilibili API.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+
+ROOM_INFO_TTL = 60.0                # Seconds an entry is served without being refreshed
+ROOM_INFO_MAX_AGE = 7 * 24 * 3600   # Older entries are refetched before being served
+ROOM_INFO_MAX_ENTRIES = 256
+
+logger = logging.getLogger(__name__)
+
+
+class RoomInfoCache():
+    """
+        LRU cache of (room title, anchor name, live status) by room id, persisted to a JSON file.
+
+        Fresh entries (younger than ttl) are served as is. Stale entries are served immediately too and
+        refreshed in the background, unless they are older than max_age, in which case the caller waits
+        for the API. Concurrent requests for the same room share a single API call. The least recently
+        used entries are evicted beyond max_entries.
+    """
+
+    def __init__(self, path=None, ttl=ROOM_INFO_TTL, max_age=ROOM_INFO_MAX_AGE, max_entries=ROOM_INFO_MAX_ENTRIES):
+        self.path = path
+        self.ttl, self.max_age, self.max_entries = ttl, max_age, max_entries
+        self.entries = OrderedDict()    # room_id -> (fetched_at, info), least recently used first
+        self.fetching = {}              # room_id -> task of the API call in progress
+        self.save_task, self.save_pending = None, False
+        self.num_hits, self.num_stale_hits, self.num_misses, self.num_errors = 0, 0, 0, 0
+        if path:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        for room_id, (fetched_at, *info) in entries.items():
+            self.entries[int(room_id)] = (fetched_at, tuple(info))
+        self._evict()
+
+    def save(self, data):
+        """
+        Write serialized entries to the cache file. Runs in an executor.
+        """
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(self.path + '.tmp', self.path)
+
+    def _save_soon(self):
+        if not self.path:
+            return
+        if self.save_task is not None and not self.save_task.done():
+            self.save_pending = True    # Saved again once the current write is done
+            return
+        self.save_pending = False
+        # Serialized on the event loop, written in an executor
+        data = json.dumps({room_id: [fetched_at, *info] for room_id, (fetched_at, info) in self.entries.items()},
+                          ensure_ascii=False)
+        self.save_task = asyncio.get_running_loop().run_in_executor(None, self.save, data)
+        self.save_task.add_done_callback(self._on_saved)
+
+    def _on_saved(self, task):
+        if task.exception() is not None:
+            logger.warning("Failed to save the room info cache: %r", task.exception())
+        if self.save_pending:
+            self._save_soon()
+
+    def _evict(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def age(self, room_id):
+        entry = self.entries.get(room_id)
+        return time.time() - entry[0] if entry else None
+
+    async def get(self, room_id, fetch, max_age=None):
+        """
+        Returns the info of a room, calling `await fetch(room_id)` if it is missing or too old
+        """
+        max_age = self.max_age if max_age is None else max_age
+        entry = self.entries.get(room_id)
+        if entry is not None:
+            age = time.time() - entry[0]
+            if age <= max_age:
+                self.entries.move_to_end(room_id)
+                if age <= self.ttl:
+                    self.num_hits += 1
+                else:
+                    self.num_stale_hits += 1
+                    self.refresh(room_id, fetch)
+                return entry[1]
+        self.num_misses += 1
+        return await self.refresh(room_id, fetch)
+
+    def refresh(self, room_id, fetch):
+        """
+        Fetch the info of a room in the background. Returns the task of the API call.
+        """
+        task = self.fetching.get(room_id)
+        if task is None:
+            task = self.fetching[room_id] = asyncio.ensure_future(self._fetch(room_id, fetch))
+            # Background refreshes may fail with nobody waiting for them
+            task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return task
+
+    async def _fetch(self, room_id, fetch):
+        try:
+            info = tuple(await fetch(room_id))
+        except Exception:
+            self.num_errors += 1
+            raise
+        finally:
+            del self.fetching[room_id]
+        self.entries[room_id] = (time.time(), info)
+        self.entries.move_to_end(room_id)
+        self._evict()
+        self._save_soon()
+        return info
+
+    async def prefetch(self, room_ids, fetch):
+        """
+        Refresh the rooms that are not fresh, e.g. the favourite rooms at startup. Errors are ignored.
+        """
+        tasks = [self.refresh(room_id, fetch) for room_id in room_ids
+                 if room_id not in self.entries or self.age(room_id) > self.ttl]
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def recent(self, num_rooms):
+        """
+        The most recently used room ids, most recent first
+        """
+        return list(reversed(self.entries))[:num_rooms]
+
+    def stats(self):
+        return {
+            'entries': len(self.entries),
+            'hits': self.num_hits,
+            'stale_hits': self.num_stale_hits,
+            'misses': self.num_misses,
+            'errors': self.num_errors,
+        }
@@ -0,0 +1,87 @@
+"""
+    Live event sources entering viewers in the lottery.
+
+    Every subscribed event type has a parser in PARSERS turning its payload into an Entry, so the
+    monitor handles all of them with one listener and one dict lookup per event. Supporting a new type
+    is a matter of adding its parser and a name. A parser returns None for events that do not enter
+    anybody, e.g. free (silver) gifts.
+
+    Only danmu enter by default. Paid entries (gifts, super chats, guard purchases) are enabled by giving
+    them a weight, e.g. gift=1 superchat=3 guard=10. They only need to pass the fan medal rule: the
+    keyword rules apply to danmu only.
+"""
+from collections import namedtuple
+
+
+# Source-independent record of one entry. text is the danmu or super chat message, or a description
+# of the gift or guard purchase.
+Entry = namedtuple('Entry', ['source', 'uid', 'name', 'medal_name', 'medal_level', 'text'])
+
+# Entries credited to a viewer per event of each enabled type
+DEFAULT_SOURCE_WEIGHTS = {
+    'DANMU_MSG': 1,
+}
+# Short names used on the command line
+SOURCE_NAMES = {
+    'danmu': 'DANMU_MSG',
+    'gift': 'SEND_GIFT',
+    'superchat': 'SUPER_CHAT_MESSAGE',
+    'guard': 'GUARD_BUY',
+}
+
+
+def _medal(medal_info):
+    if not medal_info:
+        return '', 0
+    return medal_info.get('medal_name', ''), medal_info.get('medal_level', 0)
+
+
+def parse_danmu(data):
+    msg, viewer, medal = data['info'][1: 4]
+    return Entry('DANMU_MSG', viewer[0], viewer[1], medal[1] if len(medal) > 1 else '', medal[0] if medal else 0,
+                 msg)
+
+
+def parse_gift(data):
+    gift = data['data']
+    if gift.get('coin_type') != 'gold':
+        return None     # Free gift
+    medal_name, medal_level = _medal(gift.get('medal_info'))
+    return Entry('SEND_GIFT', gift['uid'], gift['uname'], medal_name, medal_level,
+                 f"{gift['giftName']} x{gift['num']}")
+
+
+def parse_super_chat(data):
+    super_chat = data['data']
+    medal_name, medal_level = _medal(super_chat.get('medal_info'))
+    return Entry('SUPER_CHAT_MESSAGE', super_chat['uid'], super_chat['user_info']['uname'], medal_name, medal_level,
+                 super_chat['message'])
+
+
+def parse_guard(data):
+    guard = data['data']
+    return Entry('GUARD_BUY', guard['uid'], guard['username'], '', 0, guard['gift_name'])
+
+
+# Event type -> parser of its `data` payload
+PARSERS = {
+    'DANMU_MSG': parse_danmu,
+    'SEND_GIFT': parse_gift,
+    'SUPER_CHAT_MESSAGE': parse_super_chat,
+    'GUARD_BUY': parse_guard,
+}
+
+
+def parse_source_weights(specs):
+    """
+    Apply 'name=weight' overrides, e.g. ['gift=2', 'guard=0'], to the default weights. Returns the weights
+    of the enabled sources.
+    """
+    weights = dict(DEFAULT_SOURCE_WEIGHTS)
+    for spec in specs or ():
+        name, _, weight = spec.partition('=')
+        source = SOURCE_NAMES.get(name.strip().lower(), name.strip())
+        if source not in PARSERS:
+            raise ValueError(f"Unknown event source: {name}")
+        weights[source] = int(weight)
+    return {source: weight for source, weight in weights.items() if weight > 0}
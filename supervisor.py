@@ -0,0 +1,160 @@
+"""
+    Supervised live room connection, reconnecting whenever it drops.
+"""
+import asyncio
+import logging
+import random
+import time
+
+
+HEARTBEAT_TIMEOUT = 70.0    # Seconds without any event before a connection is considered dead
+BACKOFF_BASE = 1.0          # First reconnect delay in seconds, doubled on every failed attempt
+BACKOFF_MAX = 60.0
+DISCONNECT_TIMEOUT = 5.0
+# Events proving that the connection is alive even when nobody chats. VIEW is the answer to the
+# 30 s heartbeat.
+LIVENESS_EVENTS = ('VIEW', 'VERIFICATION_SUCCESSFUL')
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionSupervisor():
+    """
+        Keeps a bilibili_api LiveDanmaku connected until stop() is called.
+
+        A connection is considered lost when connect() returns or raises, or when nothing, not even the
+        heartbeat answer, was received for heartbeat_timeout seconds. A new connection is then opened
+        after a jittered exponential backoff, which is reset as soon as a connection delivers events.
+        The listeners are registered again on every connection, so whatever state they update (the
+        participant store, the counters) carries over reconnects.
+
+        Each gap between the last event before a drop and the first event after the reconnect is kept
+        as a downtime window, to know how much traffic was missed.
+    """
+
+    def __init__(self, room_id, listeners, heartbeat_timeout=HEARTBEAT_TIMEOUT, backoff_base=BACKOFF_BASE,
+                 backoff_max=BACKOFF_MAX):
+        self.room_id = room_id
+        self.listeners = listeners  # event name -> async handler
+        self.heartbeat_timeout = heartbeat_timeout
+        self.backoff_base, self.backoff_max = backoff_base, backoff_max
+        self.room, self.connect_task = None, None
+        self.stopping, self.timed_out = False, False
+        self.wakeup = asyncio.Event()   # Interrupts the backoff when stopping
+        self.attempt = 0
+        self.connected_at, self.last_event = None, None
+        self.down_since = None      # Start of the current downtime window
+        # Connection metrics
+        self.num_connects, self.num_reconnects, self.num_timeouts = 0, 0, 0
+        self.downtime_windows = []  # (start, end) wall-clock times
+
+    def _make_room(self):
+        from bilibili_api import live
+        room = live.LiveDanmaku(self.room_id, debug=False)
+        for name, handler in self.listeners.items():
+            room.add_event_listener(name, self._watched(handler))
+        for name in LIVENESS_EVENTS:
+            if name not in self.listeners:
+                room.add_event_listener(name, self._on_liveness)
+        return room
+
+    def _watched(self, handler):
+        async def watched_handler(event):
+            self._on_traffic()
+            await handler(event)
+        return watched_handler
+
+    async def _on_liveness(self, event):
+        self._on_traffic()
+
+    def _on_traffic(self):
+        now = time.time()
+        if self.down_since is not None:
+            self.downtime_windows.append((self.down_since, now))
+            logger.info("Room %s reconnected after %.1fs of downtime", self.room_id, now - self.down_since)
+            self.down_since = None
+        self.attempt = 0
+        self.last_event = now
+
+    async def run(self):
+        """
+        Connect, and reconnect after every drop until stop() is called
+        """
+        self.last_event = time.time()
+        watchdog = asyncio.create_task(self._watch_heartbeat())
+        try:
+            while not self.stopping:
+                self.room = self._make_room()
+                self.connected_at, self.timed_out = time.time(), False
+                self.num_connects += 1
+                self.connect_task = asyncio.create_task(self.room.connect())
+                try:
+                    await self.connect_task
+                    reason = "closed by the server"
+                except asyncio.CancelledError:
+                    if not (self.timed_out or self.stopping):
+                        raise
+                    reason = "heartbeat timeout"
+                except Exception as e:
+                    reason = repr(e)
+                if self.stopping:
+                    break
+                if self.down_since is None:
+                    self.down_since = self.last_event
+                # Full backoff on the first failure, then doubled up to backoff_max, with jitter
+                delay = min(self.backoff_max, self.backoff_base * 2 ** self.attempt) * random.uniform(0.5, 1)
+                self.attempt += 1
+                self.num_reconnects += 1
+                logger.warning("Room %s connection lost (%s), reconnecting in %.1fs", self.room_id, reason, delay)
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            watchdog.cancel()
+            if self.down_since is not None:
+                # Stopped while disconnected
+                self.downtime_windows.append((self.down_since, time.time()))
+                self.down_since = None
+
+    async def _watch_heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_timeout / 4)
+            if self.connect_task is None or self.connect_task.done():
+                continue
+            if time.time() - max(self.last_event, self.connected_at) > self.heartbeat_timeout:
+                self.num_timeouts += 1
+                self.timed_out = True
+                self.connect_task.cancel()
+
+    async def stop(self):
+        """
+        Close the connection and stop reconnecting. run() returns shortly after.
+        """
+        self.stopping = True
+        self.wakeup.set()
+        if self.connect_task is None or self.connect_task.done():
+            return
+        try:
+            await asyncio.wait_for(self.room.disconnect(), DISCONNECT_TIMEOUT)
+        except Exception:
+            # Not established yet, or stuck: drop the connection instead
+            self.connect_task.cancel()
+
+    def downtime(self):
+        """
+        Total seconds spent disconnected, including the current window
+        """
+        downtime = sum(end - start for start, end in self.downtime_windows)
+        if self.down_since is not None:
+            downtime += time.time() - self.down_since
+        return downtime
+
+    def stats(self):
+        return {
+            'connects': self.num_connects,
+            'reconnects': self.num_reconnects,
+            'heartbeat_timeouts': self.num_timeouts,
+            'downtime_windows': len(self.downtime_windows) + (self.down_since is not None),
+            'downtime_sec': self.downtime(),
+        }
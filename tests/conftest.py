@@ -0,0 +1,91 @@
+"""
+    The application modules live at the top of the repository, make them importable from the tests.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    """
+    The QApplication of the Qt tests, on the offscreen platform so that no display is needed
+    """
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    QtWidgets = pytest.importorskip('PyQt5.QtWidgets')
+    import gui  # noqa: F401, sets the application attributes, which must happen before the QApplication exists
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+class FakeRoom():
+    """
+        Stands in for bilibili_api's LiveDanmaku. connect() dispatches the scripted events, then stays
+        connected until disconnect(), or ends the connection: 'close' returns, an exception is raised.
+    """
+
+    def __init__(self, events=(), outcome='wait'):
+        self.events, self.outcome = list(events), outcome
+        self.handlers = {}  # event name -> async handler
+        self.closed = None
+
+    async def connect(self):
+        import asyncio
+        self.closed = asyncio.Event()
+        for event in self.events:
+            handler = self.handlers.get(event['data']['cmd'])
+            if handler is not None:
+                await handler(event)
+        if isinstance(self.outcome, Exception):
+            raise self.outcome
+        if self.outcome != 'close':
+            await self.closed.wait()
+
+    async def disconnect(self):
+        self.closed.set()
+
+
+class LiveRooms():
+    """
+        Script of the connections opened by ConnectionSupervisor, one FakeRoom per connection, for the
+        given room or any room. Once the script is exhausted, connections stay open without any event.
+        Room infos are served from `infos`, rooms missing there are live.
+    """
+
+    def __init__(self):
+        self.script, self.rooms = [], []    # [(room id or None, FakeRoom)], FakeRooms connected
+        self.infos = {}     # room_id -> (title, anchor name, live status)
+        self.num_info_calls = 0
+
+    async def get_room_info(self, room_id):
+        self.num_info_calls += 1
+        return self.infos.get(room_id, (f"room {room_id}", 'anchor', 1))
+
+    def add(self, events=(), outcome='wait', room_id=None):
+        self.script.append((room_id, FakeRoom(events, outcome)))
+
+    def make_room(self, supervisor):
+        room = FakeRoom()
+        for position, (room_id, scripted) in enumerate(self.script):
+            if room_id is None or room_id == supervisor.room_id:
+                room = self.script.pop(position)[1]
+                break
+        for name, handler in supervisor.listeners.items():
+            room.handlers[name] = supervisor._watched(handler)
+        self.rooms.append(room)
+        return room
+
+
+@pytest.fixture
+def live_rooms(monkeypatch):
+    """
+    Replace the live connections and the room info API by scripted FakeRooms and infos
+    """
+    from core import Danmuku
+    from supervisor import ConnectionSupervisor
+    rooms = LiveRooms()
+    monkeypatch.setattr(Danmuku, 'get_room_info', lambda danmuku, room_id: rooms.get_room_info(room_id))
+    monkeypatch.setattr(ConnectionSupervisor, '_make_room', lambda supervisor: rooms.make_room(supervisor))
+    return rooms
@@ -0,0 +1,60 @@
+import datetime
+
+import pytest
+
+from activity import ActivityWindow, parse_time
+from participants import ParticipantStore
+
+
+def test_entries_slide_out_of_the_window():
+    window = ActivityWindow(window=60, num_buckets=6)
+    window.add(1, 1, 1000.0)
+    window.add(2, 2, 1030.0)
+    window.add(1, 3, 1050.0)
+    assert window.active(1050.0) == {1: 4, 2: 2}
+    assert window.active(1065.0) == {1: 3, 2: 2}
+    assert window.active(1095.0) == {1: 3}
+    assert window.active(10000.0) == {}
+    assert window.num_expired == 6
+
+
+def test_late_entries_out_of_the_window_are_ignored():
+    window = ActivityWindow(window=60, num_buckets=6)
+    window.add(1, 1, 2000.0)
+    window.add(2, 1, 1900.0)
+    assert window.active(2000.0) == {1: 1}
+
+
+def test_only_the_scheduled_entries_count():
+    window = ActivityWindow(start=1000.0, end=2000.0)
+    for uid, when in ((1, 999.0), (2, 1000.0), (3, 1999.0), (4, 2000.0), (2, 1500.0)):
+        window.add(uid, 1, when)
+    assert window.active() == {2: 2, 3: 1}
+
+
+def test_the_window_stops_sliding_at_the_scheduled_end():
+    window = ActivityWindow(window=60, end=1060.0, num_buckets=6)
+    window.add(1, 1, 1010.0)
+    assert window.active(5000.0) == {1: 1}
+
+
+def test_snapshot_counts_the_entries_in_the_window():
+    pytest.importorskip('numpy')
+    store = ParticipantStore()
+    window = ActivityWindow(window=60, num_buckets=6)
+    for uid, when in ((1, 900.0), (2, 1000.0), (1, 1010.0), (3, 1020.0), (3, 1030.0), (3, 1040.0)):
+        store.add(uid, f"n{uid}", 0, 1, when)
+        window.add(uid, 1, when)
+    snapshot = window.snapshot(store, now=1040.0)
+    assert list(snapshot.uids) == [1, 2, 3] and list(snapshot.counts) == [1, 1, 3]
+    snapshot = window.snapshot(store, min_count=2, now=1040.0)
+    assert list(snapshot.uids) == [3] and list(snapshot.names) == ['n3']
+    assert list(window.snapshot(store, exclude={1, 3}, now=1040.0).uids) == [2]
+
+
+def test_parse_time():
+    today = datetime.date.today()
+    assert parse_time('20:30') == datetime.datetime.combine(today, datetime.time(20, 30)).timestamp()
+    assert parse_time('2026-10-01 08:05') == datetime.datetime(2026, 10, 1, 8, 5).timestamp()
+    with pytest.raises(ValueError):
+        parse_time('8pm')
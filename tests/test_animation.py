@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+
+@pytest.fixture
+def animation(qapp):
+    from animation import LotteryAnimation
+
+    def play(names, offsets_ms, show_frame=None):
+        shown, finished = [], []
+        animation = LotteryAnimation(show_frame or shown.append, names, offsets_ms)
+        animation.finished.connect(lambda: finished.append(time.monotonic()))
+        animation.start()
+        deadline = time.monotonic() + 5
+        while not finished:
+            assert time.monotonic() < deadline, "the animation did not finish"
+            qapp.processEvents()
+            time.sleep(0.001)
+        return animation, shown, (finished[0] - animation.start_time) * 1000
+    return play
+
+
+def test_frames_slow_down(qapp):
+    from animation import frame_offsets
+    assert frame_offsets(10, 40, 10) == [0, 10, 30, 60]
+    assert frame_offsets(10, 10, 10) == [0]
+
+
+def test_every_frame_is_shown_in_order(animation):
+    _, shown, duration_ms = animation(['a', 'b', 'c', 'd'], [0, 20, 40, 60])
+    assert shown == ['a', 'b', 'c', 'd']
+    assert 60 <= duration_ms < 1000
+
+
+def test_overdue_frames_are_skipped(animation):
+    shown = []
+
+    def slow_show_frame(name):
+        shown.append(name)
+        if name == 'a':
+            time.sleep(0.1)     # The event loop is busy past the next two frames, 'c' is due when it is back
+    played, _, duration_ms = animation(['a', 'b', 'c', 'd'], [0, 20, 40, 150], slow_show_frame)
+    assert shown == ['a', 'c', 'd'] and played.num_skipped == 1
+    assert 150 <= duration_ms < 1000
@@ -0,0 +1,120 @@
+import json
+import os
+import time
+
+import checkpoint
+from checkpoint import Checkpointer
+from participants import ParticipantStore
+
+
+PARAMS = {'paizi': '甲', 'keyword': '抽奖'}
+
+
+def columns(store):
+    return (list(store.uids), list(store.names), list(store.counts), list(store.medal_levels),
+            list(store.first_seen), list(store.last_seen))
+
+
+def save(checkpointer, store, counters):
+    delta = checkpointer.delta(store, counters)
+    if delta is not None:
+        checkpointer.write(delta)
+    return delta
+
+
+def test_deltas_resume_into_the_same_store(tmp_path):
+    path = str(tmp_path / 'room.jsonl')
+    checkpointer = Checkpointer(path)
+    store = ParticipantStore()
+    assert checkpointer.load(store, PARAMS) is None
+    store.add(1, '一', 3, 1, 100.0, 100.0)
+    store.add(2, '二', 0, 1, 101.0, 101.0)
+    assert save(checkpointer, store, {'num_danmu': 2})['full']
+    store.add(1, '一', 4, 1, None, 102.0)
+    store.add(3, '三', 0, 1, 103.0, 103.0)
+    delta = save(checkpointer, store, {'num_danmu': 4})
+    assert not delta['full']
+    assert [row[0] for row in delta['rows']] == [3]
+    assert [update[0] for update in delta['updates']] == [0]
+    assert save(checkpointer, store, {'num_danmu': 4}) is None
+
+    resumed = ParticipantStore()
+    assert Checkpointer(path).load(resumed, PARAMS) == {'num_danmu': 4}
+    assert columns(resumed) == columns(store)
+    assert not resumed.dirty
+
+
+def test_compaction_rewrites_a_full_line(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoint, 'COMPACT_EVERY', 3)
+    path = str(tmp_path / 'room.jsonl')
+    checkpointer = Checkpointer(path)
+    store = ParticipantStore()
+    checkpointer.load(store, PARAMS)
+    for uid in range(4):
+        store.add(uid, str(uid))
+        save(checkpointer, store, {})
+    with open(path, encoding='utf-8') as f:
+        lines = [json.loads(line) for line in f]
+    assert len(lines) == 1 and lines[0]['full'] and len(lines[0]['rows']) == 4
+    assert lines[0]['session']['params'] == PARAMS
+
+
+def test_a_torn_line_is_dropped(tmp_path):
+    path = str(tmp_path / 'room.jsonl')
+    checkpointer = Checkpointer(path)
+    store = ParticipantStore()
+    checkpointer.load(store, PARAMS)
+    store.add(1, '一')
+    save(checkpointer, store, {'num_danmu': 1})
+    size = os.path.getsize(path)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"time": 1, "rows": [[2, ')
+
+    resumed = ParticipantStore()
+    assert Checkpointer(path).load(resumed, PARAMS) == {'num_danmu': 1}
+    assert list(resumed.uids) == [1]
+    assert os.path.getsize(path) == size
+
+
+def test_other_parameters_move_the_checkpoint_aside(tmp_path):
+    path = str(tmp_path / 'room.jsonl')
+    checkpointer = Checkpointer(path)
+    store = ParticipantStore()
+    checkpointer.load(store, PARAMS)
+    store.add(1, '一')
+    save(checkpointer, store, {})
+
+    resumed = ParticipantStore()
+    assert Checkpointer(path).load(resumed, {'paizi': None, 'keyword': None}) is None
+    assert len(resumed) == 0
+    assert not os.path.exists(path) and os.path.exists(path + '.stale')
+
+
+def test_an_old_checkpoint_is_not_resumed(tmp_path, monkeypatch):
+    path = str(tmp_path / 'room.jsonl')
+    checkpointer = Checkpointer(path)
+    store = ParticipantStore()
+    checkpointer.load(store, PARAMS)
+    store.add(1, '一')
+    save(checkpointer, store, {})
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + checkpoint.RESUME_MAX_AGE + 1)
+    assert Checkpointer(path).load(ParticipantStore(), PARAMS) is None
+    assert os.path.exists(path + '.stale')
+
+
+def test_reset_makes_the_next_delta_full(tmp_path):
+    path = str(tmp_path / 'room.jsonl')
+    checkpointer = Checkpointer(path)
+    store = ParticipantStore()
+    checkpointer.load(store, PARAMS)
+    store.add(1, '一')
+    save(checkpointer, store, {})
+    store.add(2, '二')
+    checkpointer.delta(store, {})     # Lost, e.g. the disk was full
+    checkpointer.reset()
+    store.add(3, '三')
+    delta = save(checkpointer, store, {})
+    assert delta['full'] and [row[0] for row in delta['rows']] == [1, 2, 3]
+    checkpointer.remove()
+    assert not os.path.exists(path)
@@ -0,0 +1,52 @@
+import asyncio
+
+from benchmarks.loadgen import make_danmu_event
+from core import Danmuku
+from dedup import DanmuDeduplicator
+from filters import FilterRules
+
+
+def make_danmuku(paizi=None, keyword=None):
+    """
+    A Danmuku set up as start_monitor would, without connecting to a live room
+    """
+    danmuku = Danmuku()
+    danmuku.reports = []
+    danmuku.new_danmu_callback = lambda num_danmu, participants: danmuku.reports.append(num_danmu)
+    danmuku.rules = FilterRules.parse(paizi, keyword)
+    return danmuku
+
+
+def feed(danmuku, events):
+    async def run():
+        for event in events:
+            await danmuku._on_event(event)
+    asyncio.run(run())
+
+
+def test_repeated_viewers_enter_once():
+    danmuku = make_danmuku()
+    feed(danmuku, [make_danmu_event(1, 'a', 'x'), make_danmu_event(2, 'b', 'y'), make_danmu_event(1, 'a', 'z')])
+    assert danmuku.num_danmu == 3
+    assert list(danmuku.participants) == ['a', 'b']
+    assert list(danmuku.participants.counts) == [2, 1]
+    assert danmuku.reports == [1, 2, 3]
+
+
+def test_stats_report_the_most_active_viewers():
+    danmuku = make_danmuku()
+    events = [make_danmu_event(uid, f"n{uid}", 'x') for uid in range(8)]
+    events += [make_danmu_event(3, 'n3', 'y'), make_danmu_event(6, 'n6', 'y'), make_danmu_event(6, 'n6', 'z')]
+    feed(danmuku, events)
+    assert danmuku.stats()['top_viewers'] == [['n6', 3], ['n3', 2], ['n0', 1], ['n1', 1], ['n2', 1]]
+
+
+def test_repeats_are_only_dropped_when_deduplication_is_on():
+    events = [make_danmu_event(1, 'a', '抽奖'), make_danmu_event(1, 'a', '抽奖'), make_danmu_event(1, 'a', '中奖')]
+    danmuku = make_danmuku()
+    feed(danmuku, events)
+    assert danmuku.num_danmu == 3
+    danmuku = make_danmuku()
+    danmuku.dedup = DanmuDeduplicator(30)
+    feed(danmuku, events)
+    assert danmuku.num_danmu == 2 and danmuku.stats()['dedup']['suppressed'] == 1
@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+from dedup import DanmuDeduplicator
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_repeats_within_the_window_are_suppressed(clock):
+    dedup = DanmuDeduplicator(10)
+    assert not dedup.is_repeat(1, '抽奖')
+    assert dedup.is_repeat(1, '抽奖')
+    assert not dedup.is_repeat(2, '抽奖')
+    assert not dedup.is_repeat(1, '中奖')
+    clock[0] += 5
+    assert dedup.is_repeat(1, '抽奖')
+    assert dedup.stats() == {'window_sec': 10, 'checked': 5, 'suppressed': 2, 'tracked': 3}
+
+
+def test_entries_expire_after_the_window(clock):
+    dedup = DanmuDeduplicator(10, num_buckets=4)
+    dedup.is_repeat(1, '抽奖')
+    clock[0] += 5
+    dedup.is_repeat(2, '抽奖')
+    # A repeat does not extend the window
+    clock[0] += 6
+    assert not dedup.is_repeat(1, '抽奖')
+    assert dedup.is_repeat(2, '抽奖')
+
+
+def test_everything_expires_after_a_long_pause(clock):
+    dedup = DanmuDeduplicator(10)
+    for uid in range(100):
+        dedup.is_repeat(uid, 'x')
+    clock[0] += 3600
+    assert not dedup.is_repeat(1, 'x')
+    assert dedup.stats()['tracked'] == 1
+    # Still rotating on schedule after the pause
+    clock[0] += 11
+    assert not dedup.is_repeat(1, 'x')
+
+
+def test_a_zero_window_disables_deduplication():
+    assert not DanmuDeduplicator(0)
+    assert DanmuDeduplicator(1)
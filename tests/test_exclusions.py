@@ -0,0 +1,71 @@
+import asyncio
+import os
+
+import pytest
+
+from benchmarks.loadgen import make_danmu_event
+from exclusions import BloomFilter, ExclusionIndex
+from test_core import feed, make_danmuku
+
+
+def test_bloom_filter_has_no_false_negatives_and_few_false_positives():
+    pytest.importorskip('numpy')
+    uids = list(range(1, 200001, 2)) + [-5, 2 ** 62]
+    bloom = BloomFilter(uids, error_rate=1e-3)
+    assert len(bloom) == len(uids)
+    assert all(uid in bloom for uid in uids)
+    false_positives = sum(uid in bloom for uid in range(0, 200000, 2))
+    assert false_positives < 100000 * 3e-3
+
+
+def test_an_empty_bloom_filter_contains_nothing():
+    pytest.importorskip('numpy')
+    bloom = BloomFilter([])
+    assert not any(uid in bloom for uid in range(1000))
+
+
+def write(path, text):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def test_files_and_uids_are_merged(tmp_path):
+    pytest.importorskip('numpy')
+    write(tmp_path / 'moderators.txt', "12345678    # moderator\n\n# comment only\n87654321\nnot a uid\n")
+    write(tmp_path / 'bots.txt', "\n".join(str(uid) for uid in range(1000, 1010)))
+    index = ExclusionIndex([str(tmp_path / 'moderators.txt'), str(tmp_path / 'bots.txt'),
+                            str(tmp_path / 'missing.txt')], uids=[42], bloom_min_size=10)
+    asyncio.run(index.reload())
+    assert all(uid in index for uid in (42, 12345678, 87654321, 1000, 1009))
+    assert 7 not in index
+    assert len(index) == 13
+    assert index.stats() == {'excluded_uids': 3, 'bloom_uids': 10, 'excluded_entries': 0, 'reloads': 1}
+
+
+def test_edited_files_are_reloaded(tmp_path):
+    path = str(tmp_path / 'exclude.txt')
+    write(path, "1\n")
+
+    async def run():
+        index = ExclusionIndex([path])
+        await index.reload()
+        assert 1 in index
+        watch_task = asyncio.create_task(index.watch(interval=0.01))
+        write(path, "2\n")
+        os.utime(path, ns=(0, 10 ** 18))    # Modification times may be coarse
+        for _ in range(200):
+            if 2 in index:
+                break
+            await asyncio.sleep(0.01)
+        watch_task.cancel()
+        return index
+    index = asyncio.run(asyncio.wait_for(run(), 5))
+    assert 2 in index and 1 not in index and index.num_reloads == 2
+
+
+def test_excluded_viewers_never_enter():
+    danmuku = make_danmuku()
+    danmuku.exclusions = ExclusionIndex(uids=[2])
+    feed(danmuku, [make_danmu_event(1, 'a', 'x'), make_danmu_event(2, 'b', 'x'), make_danmu_event(2, 'b', 'y')])
+    assert list(danmuku.participants.uids) == [1]
+    assert danmuku.num_excluded == 2 and danmuku.exclusions.stats()['excluded_entries'] == 2
@@ -0,0 +1,55 @@
+from filters import FilterRules, KeywordAutomaton, normalize
+
+
+def test_automaton_finds_overlapping_keywords():
+    automaton = KeywordAutomaton(['he', 'she', 'his', 'hers'])
+    assert automaton.search('ushers') == {0, 1, 3}
+    assert automaton.search('ahishe') == {0, 1, 2}
+    assert automaton.search('xyz') == set()
+
+
+def test_normalize_folds_width_case_and_emoji():
+    assert normalize('ＡＢＣ抽奖😀') == 'abc抽奖'
+
+
+def test_any_keyword():
+    rules = FilterRules.parse(keyword='抽奖 中奖')
+    assert rules.match('', '我要抽奖')
+    assert rules.match('', '中奖了')
+    assert not rules.match('', '你好')
+
+
+def test_required_and_excluded_keywords():
+    rules = FilterRules.parse(keyword='抽奖 +冲 -广告')
+    assert rules.match('', '抽奖冲冲冲')
+    assert not rules.match('', '抽奖')
+    assert not rules.match('', '抽奖冲 广告')
+
+
+def test_regex_keyword():
+    rules = FilterRules.parse(keyword=r'/第\d+名/')
+    assert rules.match('', '我是第12名')
+    assert not rules.match('', '第一名')
+
+
+def test_keywords_are_normalized():
+    rules = FilterRules.parse(keyword='ABC')
+    assert rules.match('', 'ａｂｃ')
+    assert not FilterRules.parse(keyword='ABC', normalized=False).match('', 'abc')
+
+
+def test_medal_rule():
+    rules = FilterRules.parse(paizi='甲,乙')
+    assert rules.match('甲')
+    assert rules.match('乙', 'anything')
+    assert not rules.match('丙', 'anything')
+    assert not FilterRules.parse()
+    assert rules
+
+
+def test_hits_count_every_rule():
+    rules = FilterRules.parse(paizi='甲', keyword='a -b /c+/')
+    rules.match('甲', 'a')
+    rules.match('甲', 'ab')
+    rules.match('甲', 'cc')
+    assert rules.hits() == {'medal:甲': 3, 'keyword:a': 2, 'keyword:-b': 1, 'regex:/c+/': 1}
@@ -0,0 +1,37 @@
+import pytest
+
+from participants import ParticipantStore
+
+
+@pytest.fixture
+def main_window(qapp, tmp_path, monkeypatch):
+    # The window keeps its history and room cache in the working directory
+    monkeypatch.chdir(tmp_path)
+    import gui
+    from ui import Ui_MainWindow
+    window = gui.MainWindow()
+    ui = Ui_MainWindow()
+    ui.setupUi(window)
+    window.setup_ui(ui)
+    yield window
+    window.history.close()
+
+
+def test_updates_are_coalesced_into_one_redraw(main_window):
+    store = ParticipantStore()
+    for uid in range(100):
+        store.add(uid, f"n{uid}")
+        main_window.update_monitor(uid + 1, store)
+    assert main_window.num_refreshes == 0
+
+    main_window.refresh_monitor()
+    assert main_window.num_refreshes == 1
+    assert main_window.num_coalesced == 99
+    assert main_window.ui.lcdNumber_num_danmu.intValue() == 100
+    assert main_window.ui.lcdNumber_num_viewer.intValue() == 100
+    assert main_window.viewer_model.rowCount() == 100
+
+
+def test_refresh_without_update_draws_nothing(main_window):
+    main_window.refresh_monitor()
+    assert main_window.num_refreshes == 0
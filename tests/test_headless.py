@@ -0,0 +1,53 @@
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.loadgen import make_danmu_event
+import headless
+from headless import Reporter, monitor
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_reporter_writes_json_lines_or_text():
+    stream = io.StringIO()
+    Reporter(True, stream).emit('stats', num_danmu=3)
+    Reporter(False, stream).emit('stats', num_danmu=3, num_viewers=2)
+    json_line, text_line = stream.getvalue().splitlines()
+    event = json.loads(json_line)
+    assert event['event'] == 'stats' and event['num_danmu'] == 3
+    assert text_line == "[stats] num_danmu: 3, num_viewers: 2"
+
+
+def run_monitor(monkeypatch, *args, **kwargs):
+    """
+    Run a monitoring session, returning the winners and the reported events
+    """
+    stream = io.StringIO()
+    # The reporter writes to the stdout of the time the module was loaded, report to a buffer instead
+    monkeypatch.setattr(headless, 'Reporter', lambda json_lines: Reporter(json_lines, stream))
+    winners = asyncio.run(monitor(*args, json_lines=True, **kwargs))
+    return winners, [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_monitor_streams_stats_and_draws_a_winner(live_rooms, monkeypatch):
+    live_rooms.add([make_danmu_event(1, 'a', '抽奖'), make_danmu_event(2, 'b', '你好'),
+                    make_danmu_event(3, 'c', '抽奖啦')])
+    winners, events = run_monitor(monkeypatch, [1], keyword='抽奖', duration=0.3, report_interval=0.1,
+                                  num_winners=2, seed=7)
+    kinds = [event['event'] for event in events]
+    assert kinds[:2] == ['room_info', 'start']
+    assert 'stats' in kinds
+    result = events[kinds.index('result')]
+    assert result['num_candidates'] == 2 and result['seed'] == 7
+    assert sorted(winners) == ['a', 'c'] and result['winners'] == winners
+
+
+def test_headless_mode_never_imports_qt():
+    code = ("import sys, danmuji, headless; danmuji.parse_args(['monitor', '--room', '1']); "
+            "sys.exit(any(module.startswith('PyQt5') for module in sys.modules))")
+    subprocess.run([sys.executable, '-c', code], check=True, cwd=ROOT)
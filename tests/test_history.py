@@ -0,0 +1,73 @@
+import csv
+
+import pytest
+
+from history import HistoryStore
+from participants import ParticipantStore
+
+
+def make_snapshot(*viewers):
+    store = ParticipantStore()
+    for uid, count in viewers:
+        store.add(uid, f"n{uid}", 0, count, 100.0)
+    return store.snapshot()
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = HistoryStore(str(tmp_path / 'history.sqlite3'))
+    # Room 1 every session, room 2 in the second one, viewer 1 entering all of them
+    history.record_session({1: make_snapshot((1, 3), (2, 1))}, 1000.0, 1100.0, [(1, 'n1')], 'uniform', 7, 'ab')
+    history.record_session({1: make_snapshot((1, 1)), 2: make_snapshot((1, 2), (3, 5))}, 2000.0, 2100.0,
+                           [(3, 'n3'), (1, 'n1')])
+    history.record_session({1: make_snapshot((1, 1), (2, 2))}, 3000.0, 3100.0)
+    history.flush()
+    yield history
+    history.close()
+
+
+def test_sessions_are_recorded_with_their_rooms_and_winners(history):
+    sessions = history.sessions()
+    assert [session['session_id'] for session in sessions] == [3, 2, 1]
+    assert sessions[1]['room_ids'] == '1,2' and sessions[1]['winners'] == 'n3,n1'
+    assert sessions[1]['num_participants'] == 2
+    assert sessions[2]['weighting'] == 'uniform' and sessions[2]['seed'] == 7
+    assert [session['session_id'] for session in history.sessions(room_id=2)] == [2]
+    assert history.stats()['sessions_written'] == 3 and history.stats()['participant_rows_written'] == 7
+
+
+def test_record_session_returns_the_session_id(history):
+    assert history.record_session({1: make_snapshot()}, 4000.0, 4100.0).result(5) == 4
+
+
+def test_regulars(history):
+    regulars = history.regulars(min_sessions=2)
+    assert [(row['uid'], row['num_sessions'], row['num_entries']) for row in regulars] == [(1, 3, 7), (2, 2, 3)]
+    assert [row['uid'] for row in history.regulars(room_id=1, last_sessions=2, min_sessions=2)] == [1]
+
+
+def test_winners_and_participations(history):
+    assert [(row['session_id'], row['rank'], row['uid']) for row in history.winners()] == \
+        [(2, 1, 3), (2, 2, 1), (1, 1, 1)]
+    assert [row['session_id'] for row in history.winners(since=1500)] == [2, 2]
+    participations = history.participations(1)
+    assert [row['session_id'] for row in participations] == [3, 2, 2, 1]
+    assert sorted((row['session_id'], row['room_id'], row['won']) for row in participations) == \
+        [(1, 1, 1), (2, 1, 1), (2, 2, 1), (3, 1, 0)]
+
+
+def test_export_csv(history, tmp_path):
+    path = str(tmp_path / 'participants.csv')
+    assert history.export('participants', path, since=1500, room_id=2) == 2
+    with open(path, encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert sorted((row['uid'], row['count']) for row in rows) == [('1', '2'), ('3', '5')]
+    with pytest.raises(ValueError):
+        history.export('bogus', path)
+
+
+def test_export_parquet(history, tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    path = str(tmp_path / 'winners.parquet')
+    assert history.export('winners', path) == 3
+    assert pq.read_table(path).column('uid').to_pylist() == [1, 3, 1]
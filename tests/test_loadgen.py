@@ -0,0 +1,54 @@
+import asyncio
+import json
+
+import pytest
+
+from benchmarks.loadgen import inject, load_events, make_danmu_event, percentiles, synthetic_events
+from sources import parse_danmu
+
+
+def test_generated_events_parse_like_live_ones():
+    entry = parse_danmu(make_danmu_event(42, 'a', '抽奖', '粉丝团', 7)['data'])
+    assert (entry.uid, entry.name, entry.text, entry.medal_name, entry.medal_level) == (42, 'a', '抽奖', '粉丝团', 7)
+
+
+def test_synthetic_traffic_is_reproducible():
+    events = synthetic_events(500, num_viewers=50, keyword_ratio=1, seed=3)
+    assert len(events) == 500
+    entries = [parse_danmu(event['data']) for event in events]
+    assert entries == [parse_danmu(event['data'])
+                       for event in synthetic_events(500, num_viewers=50, keyword_ratio=1, seed=3)]
+    assert len({entry.uid for entry in entries}) <= 50
+    assert all(entry.text.startswith('抽奖') for entry in entries)
+
+
+def test_unique_distribution_sends_every_danmu_from_a_new_viewer():
+    events = synthetic_events(100, distribution='unique')
+    assert len({parse_danmu(event['data']).uid for event in events}) == 100
+    with pytest.raises(ValueError):
+        synthetic_events(1, distribution='bogus')
+
+
+def test_recorded_events_keep_danmu_only(tmp_path):
+    path = tmp_path / 'events.jsonl'
+    gift = {'type': 'SEND_GIFT', 'data': {'cmd': 'SEND_GIFT'}}
+    path.write_text('\n'.join(json.dumps(event) for event in [make_danmu_event(1, 'a', 'x'), gift]) + '\n',
+                    encoding='utf-8')
+    assert [event['type'] for event in load_events(path)] == ['DANMU_MSG']
+
+
+def test_inject_feeds_every_event_and_reports_throughput():
+    seen = []
+
+    async def handler(event):
+        seen.append(event)
+
+    events = synthetic_events(2500)
+    report = asyncio.run(inject(handler, events))
+    assert seen == events
+    assert report['events'] == 2500 and report['events_per_sec'] > 0
+
+
+def test_percentiles():
+    assert percentiles(list(range(100))) == {'p50': 50, 'p95': 95, 'p99': 99}
+    assert percentiles([]) == {'p50': 0, 'p95': 0, 'p99': 0}
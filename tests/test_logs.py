@@ -0,0 +1,65 @@
+import atexit
+import json
+import logging
+import queue
+import time
+
+import pytest
+
+from logs import JsonFormatter, NonBlockingQueueHandler, RateLimitFilter, TextFormatter, setup_logging
+
+
+def make_record(msg='hello', **extra):
+    record = logging.makeLogRecord({'name': 'core', 'levelname': 'INFO', 'levelno': logging.INFO, 'msg': msg})
+    record.__dict__.update(extra)
+    return record
+
+
+def test_rate_limited_records_are_dropped_and_counted(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    rate_filter = RateLimitFilter({'danmu': 2})
+    assert [rate_filter.filter(make_record(rate_key='danmu')) for _ in range(5)] == [True, True, False, False, False]
+    assert all(rate_filter.filter(make_record()) for _ in range(5))
+    now[0] += 0.5
+    record = make_record(rate_key='danmu')
+    assert rate_filter.filter(record) and record.suppressed == 3
+    assert not rate_filter.filter(make_record(rate_key='danmu'))
+
+
+def test_a_full_queue_drops_records():
+    handler = NonBlockingQueueHandler(queue.Queue(2))
+    for _ in range(5):
+        handler.handle(make_record())
+    assert handler.queue.qsize() == 2 and handler.num_dropped == 3
+
+
+def test_formatters_report_the_suppressed_records():
+    assert TextFormatter('%(message)s').format(make_record(suppressed=4)) == \
+        "hello [4 similar messages suppressed]"
+    entry = json.loads(JsonFormatter().format(make_record('n=%d', args=(3,), suppressed=4, room_id=7)))
+    assert entry['message'] == 'n=3' and entry['suppressed'] == 4 and entry['room_id'] == 7
+    assert entry['logger'] == 'core' and 'rate_key' not in entry
+
+
+@pytest.fixture
+def root_logger():
+    root = logging.getLogger()
+    handlers, level = root.handlers, root.level
+    yield root
+    root.handlers = handlers
+    root.setLevel(level)
+
+
+def test_records_are_written_by_the_listener(tmp_path, root_logger):
+    path = tmp_path / 'danmuji.log'
+    listener = setup_logging('INFO', str(path), json_format=True)
+    logging.getLogger('core').info("Room %s", 7, extra={'room_id': 7})
+    logging.getLogger('core').debug("hidden")
+    listener.stop()
+    atexit.unregister(listener.stop)
+    for handler in listener.handlers:
+        handler.close()
+    with open(path, encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f]
+    assert [(entry['message'], entry['room_id']) for entry in entries] == [('Room 7', 7)]
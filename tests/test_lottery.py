@@ -0,0 +1,63 @@
+import pytest
+
+from participants import ParticipantStore
+
+
+np = pytest.importorskip('numpy')
+
+from lottery import LotteryEngine  # noqa: E402
+
+
+def make_snapshot(counts, medal_levels=None, first_seen=None):
+    store = ParticipantStore()
+    for row, count in enumerate(counts):
+        store.add(100 + row, f"n{row}", medal_levels[row] if medal_levels else 0, count,
+                  first_seen[row] if first_seen else 1000.0 + row)
+    return store.snapshot()
+
+
+def test_the_same_seed_draws_the_same_winners():
+    snapshot = make_snapshot([1] * 1000)
+    first = LotteryEngine(snapshot, seed=42)
+    second = LotteryEngine(snapshot, seed=42)
+    assert list(first.draw(5)) == list(second.draw(5))
+    assert first.fingerprint() == second.fingerprint()
+
+
+def test_winners_are_distinct():
+    engine = LotteryEngine(make_snapshot([1] * 10), 'danmu_count', seed=1)
+    winners = engine.draw(10)
+    assert sorted(winners) == list(range(10))
+    assert len(engine.draw(50)) == 10
+
+
+def test_weights_follow_the_weighting():
+    snapshot = make_snapshot([1, 3], medal_levels=[0, 9], first_seen=[10.0, 20.0])
+    assert list(LotteryEngine(snapshot).weights) == [1, 1]
+    assert list(LotteryEngine(snapshot, 'danmu_count').weights) == [1, 3]
+    assert list(LotteryEngine(snapshot, 'medal_level').weights) == [1, 10]
+    assert list(LotteryEngine(snapshot, 'first_seen').weights) == [2, 1]
+    with pytest.raises(ValueError):
+        LotteryEngine(snapshot, 'bogus')
+
+
+def test_weighted_draws_favour_heavier_candidates():
+    engine = LotteryEngine(make_snapshot([1, 9]), 'danmu_count', seed=0)
+    rows = engine.sample(10000)
+    assert 0.85 < np.mean(rows == 1) < 0.95
+
+
+def test_the_fingerprint_identifies_the_pool_and_weights():
+    snapshot = make_snapshot([1, 2])
+    assert LotteryEngine(snapshot).fingerprint() != LotteryEngine(snapshot, 'danmu_count').fingerprint()
+    assert LotteryEngine(snapshot).fingerprint() != LotteryEngine(make_snapshot([1, 2, 3])).fingerprint()
+
+
+def test_animation_frames_end_on_the_winner():
+    snapshot = make_snapshot([1] * 50)
+    engine = LotteryEngine(snapshot, seed=5)
+    winner = engine.draw(1)[0]
+    frames = engine.animation_frames(winner, 30)
+    assert len(frames) == 30 and frames[-1] == winner
+    again = LotteryEngine(snapshot, seed=5)
+    assert list(again.animation_frames(again.draw(1)[0], 30)) == list(frames)
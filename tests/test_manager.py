@@ -0,0 +1,46 @@
+import asyncio
+
+from benchmarks.loadgen import make_danmu_event
+from manager import MonitorManager
+
+
+def run_session(manager, room_ids, num_danmu, min_count=None, **kwargs):
+    reports = []
+
+    async def session():
+        await manager.start_monitor(lambda num_danmu, participants: reports.append((num_danmu, len(participants))),
+                                    room_ids, **kwargs)
+        while manager.num_danmu() < num_danmu:
+            await asyncio.sleep(0.01)
+        return await manager.stop_monitor(min_count)
+
+    return asyncio.run(asyncio.wait_for(session(), 5)), reports
+
+
+def test_rooms_are_merged_into_one_pool(live_rooms):
+    live_rooms.add([make_danmu_event(1, 'a', 'x'), make_danmu_event(2, 'b', 'x')], room_id=10)
+    live_rooms.add([make_danmu_event(2, 'b', 'y'), make_danmu_event(3, 'c', 'y')], room_id=20)
+    manager = MonitorManager()
+    snapshot, reports = run_session(manager, [10, 20], 4)
+
+    assert sorted(snapshot.uids) == [1, 2, 3]
+    assert dict(zip(snapshot.uids, snapshot.counts)) == {1: 1, 2: 2, 3: 1}
+    assert reports[-1] == (4, 3)    # A viewer chatting in both rooms enters once
+    assert sorted(manager.room_snapshots) == [10, 20]
+    assert list(manager.room_snapshots[20].uids) == [2, 3]
+
+
+def test_the_threshold_applies_to_the_merged_counts(live_rooms):
+    live_rooms.add([make_danmu_event(1, 'a', 'x'), make_danmu_event(2, 'b', 'x')], room_id=10)
+    live_rooms.add([make_danmu_event(2, 'b', 'y')], room_id=20)
+    snapshot, _ = run_session(MonitorManager(), [10, 20], 3, min_count=2)
+    assert list(snapshot.uids) == [2]
+
+
+def test_a_single_room_reports_its_own_pool(live_rooms):
+    live_rooms.add([make_danmu_event(1, 'a', 'x'), make_danmu_event(1, 'a', 'y')], room_id=10)
+    manager = MonitorManager()
+    snapshot, reports = run_session(manager, [10], 2)
+    assert list(snapshot.uids) == [1] and list(snapshot.counts) == [2]
+    assert reports == [(1, 1), (2, 1)]
+    assert manager.rooms == {}
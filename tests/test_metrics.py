@@ -0,0 +1,89 @@
+import json
+import random
+import threading
+
+import pytest
+
+from metrics import Histogram, Metrics, SessionProfiler
+
+
+def test_buckets_cover_the_values_in_order():
+    buckets = [Histogram.bucket(value) for value in range(1 << 20)]
+    assert buckets == sorted(buckets)
+    for value in (0, 7, 8, 100, 12345, 1 << 19):
+        assert abs(Histogram.bucket_value(Histogram.bucket(value)) - value) <= value / 8
+
+
+@pytest.mark.parametrize('q', [50, 90, 99])
+def test_percentiles_are_within_an_eighth_of_the_exact_value(q):
+    rng = random.Random(3)
+    values = [int(rng.lognormvariate(10, 2)) for _ in range(10000)]
+    histogram = Histogram()
+    for value in values:
+        histogram.record(value)
+    exact = sorted(values)[int(q / 100 * len(values)) - 1]
+    assert abs(histogram.percentile(q) - exact) <= exact / 8
+    assert histogram.max == max(values) and histogram.percentile(100) <= histogram.max
+
+
+def test_summary_in_microseconds():
+    histogram = Histogram()
+    assert histogram.summary()['p99_us'] == 0
+    for value in (1000, 3000):
+        histogram.record(value)
+    summary = histogram.summary()
+    assert summary['count'] == 2 and summary['mean_us'] == 2 and summary['max_us'] == 3
+
+
+def test_snapshot_and_dump(tmp_path):
+    metrics = Metrics()
+    metrics.record('filter', 500)
+    metrics.count('danmu', 3)
+    metrics.count('danmu')
+    metrics.gauge('queue', lambda: 7)
+    metrics.dump(str(tmp_path / 'metrics.json'))
+    with open(tmp_path / 'metrics.json', encoding='utf-8') as f:
+        snapshot = json.load(f)
+    assert snapshot['latency']['filter']['count'] == 1
+    assert snapshot['counters']['danmu']['total'] == 4
+    assert snapshot['gauges'] == {'queue': 7}
+    metrics.remove_gauge('queue')
+    metrics.reset()
+    assert metrics.snapshot()['latency'] == {} and metrics.snapshot()['gauges'] == {}
+
+
+def test_threads_add_stages_while_snapshots_are_taken():
+    metrics = Metrics()
+    errors = []
+
+    def record(thread_id):
+        for stage in range(200):
+            metrics.record(f"stage{thread_id}-{stage}", stage)
+            metrics.count(f"counter{thread_id}-{stage}")
+
+    def snapshot():
+        try:
+            while any(thread.is_alive() for thread in threads):
+                metrics.snapshot()
+        except RuntimeError as e:
+            errors.append(e)
+    threads = [threading.Thread(target=record, args=(thread_id,)) for thread_id in range(4)]
+    reader = threading.Thread(target=snapshot)
+    for thread in threads:
+        thread.start()
+    reader.start()
+    for thread in threads + [reader]:
+        thread.join()
+    assert errors == []
+    snapshot = metrics.snapshot()
+    assert len(snapshot['latency']) == len(snapshot['counters']) == 800
+
+
+def test_profiler_writes_its_report(tmp_path):
+    path = str(tmp_path / 'profile.txt')
+    profiler = SessionProfiler(path)
+    profiler.start()
+    sum(range(1000))
+    profiler.stop()
+    assert profiler.kind in ('pyinstrument', 'cProfile')
+    assert (tmp_path / 'profile.txt').stat().st_size > 0
@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+import pytest
+
+import overlay
+from overlay import OverlayServer
+
+
+def messages(queue):
+    """
+    Decoded messages queued to a client, None when the client was closed
+    """
+    received = []
+    while not queue.empty():
+        message = queue.get_nowait()
+        received.append(None if message is None else json.loads(message[0]))
+    return received
+
+
+def test_new_clients_receive_the_full_state():
+    server = OverlayServer()
+    server.update(num_danmu=3)
+    server.publish('result', winners=['a'], seed=1)
+    queue = server._subscribe()
+    assert messages(queue) == [{'event': 'state', 'stats': {'num_danmu': 3, 'num_viewers': 0},
+                                'result': {'winners': ['a'], 'seed': 1}}]
+    server.publish('result', winners=['b'], seed=2)
+    assert messages(queue) == [{'event': 'result', 'winners': ['b'], 'seed': 2}]
+    server.reset()
+    assert messages(queue) == [{'event': 'state', 'stats': {'num_danmu': 0, 'num_viewers': 0}}]
+
+
+def test_stats_updates_are_coalesced_into_deltas():
+    async def run():
+        server = OverlayServer(push_interval=0.01)
+        queue = server._subscribe()
+        push_task = asyncio.create_task(server._push_periodically())
+        for num_danmu in range(1, 101):
+            server.update(num_danmu=num_danmu, num_viewers=0)
+        await asyncio.sleep(0.05)
+        push_task.cancel()
+        return server, messages(queue)
+    server, received = asyncio.run(run())
+    assert received[1:] == [{'event': 'stats', 'num_danmu': 100}]
+    assert server.stats_summary() == {'clients': 1, 'messages': 1, 'dropped_clients': 0}
+
+
+def test_slow_clients_are_dropped(monkeypatch):
+    monkeypatch.setattr(overlay, 'CLIENT_QUEUE_SIZE', 3)
+    server = OverlayServer()
+    slow = server._subscribe()
+    for seed in range(3):
+        server.publish('result', winners=[], seed=seed)
+    assert server.stats_summary() == {'clients': 0, 'messages': 3, 'dropped_clients': 1}
+    # The handler sends what it can, then returns
+    assert messages(slow)[-1] is None
+
+
+def test_state_is_served_over_http():
+    aiohttp = pytest.importorskip('aiohttp')
+
+    async def run():
+        server = OverlayServer(port=0)
+        await server.start()
+        try:
+            server.update(num_viewers=2)
+            port = server.runner.addresses[0][1]
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"http://127.0.0.1:{port}/state") as response:
+                    return await response.json()
+        finally:
+            await server.stop()
+    assert asyncio.run(asyncio.wait_for(run(), 5)) == {'stats': {'num_danmu': 0, 'num_viewers': 2}}
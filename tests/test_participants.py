@@ -0,0 +1,95 @@
+import pytest
+
+from participants import NameArena, ParticipantStore
+
+
+def test_viewers_are_registered_once_by_uid():
+    store = ParticipantStore()
+    assert store.add(1, 'a')
+    assert store.add(2, 'b')
+    assert not store.add(1, 'a')
+    assert len(store) == 2
+    assert 1 in store and 3 not in store
+    assert list(store) == ['a', 'b']
+
+
+def test_viewers_sharing_a_name_are_distinct():
+    store = ParticipantStore()
+    store.add(1, 'same')
+    store.add(2, 'same')
+    assert list(store) == ['same', 'same']
+    assert list(store.uids) == [1, 2]
+
+
+def test_arrival_order_is_kept():
+    store = ParticipantStore()
+    for uid in (5, 3, 9, 3, 5, 1):
+        store.add(uid, f"n{uid}")
+    assert list(store.uids) == [5, 3, 9, 1]
+    assert store.index == {5: 0, 3: 1, 9: 2, 1: 3}
+
+
+def make_store():
+    store = ParticipantStore()
+    store.add(1, 'a', 0, 1, 100.0)
+    store.add(2, 'b', 5, 3, 200.0)
+    store.add(3, 'c', 2, 3, 300.0)
+    store.add(4, 'd', 0, 1, 400.0)
+    return store
+
+
+def test_repeat_entries_update_the_columns():
+    store = make_store()
+    assert not store.add(1, 'a', 3, 2, None, 500.0)
+    assert not store.add(1, 'a', 1, 1, None, 150.0)
+    assert (store.counts[0], store.medal_levels[0], store.first_seen[0], store.last_seen[0]) == (4, 3, 100.0, 500.0)
+    assert store.dirty == {0}
+
+
+def test_top_rows_are_sorted_with_ties_in_arrival_order():
+    pytest.importorskip('numpy')
+    store = make_store()
+    assert list(store.top(3)) == [1, 2, 0]
+    assert list(store.top(10, 'first_seen')) == [3, 2, 1, 0]
+    assert list(store.top(0)) == []
+    with pytest.raises(ValueError):
+        store.top(1, 'names')
+
+
+def test_select_applies_every_threshold():
+    pytest.importorskip('numpy')
+    store = make_store()
+    assert list(store.select()) == [0, 1, 2, 3]
+    assert list(store.select(min_count=2)) == [1, 2]
+    assert list(store.select(min_count=2, min_medal_level=3)) == [1]
+    assert list(store.select(first_seen_before=300.0, last_seen_after=100.0)) == [1]
+    assert list(store.select(exclude={1, 3})) == [1, 3]
+
+
+def test_snapshot_of_selected_rows():
+    pytest.importorskip('numpy')
+    store = make_store()
+    snapshot = store.snapshot(store.select(min_count=2))
+    assert list(snapshot.uids) == [2, 3] and list(snapshot.names) == ['b', 'c']
+    assert list(snapshot.counts) == [3, 3] and list(snapshot.medal_levels) == [5, 2]
+    full = store.snapshot()
+    store.add(5, 'e')
+    assert len(full.uids) == 4
+
+
+def test_name_arena_indexing():
+    names = NameArena(['a', '弹幕姬', '', 'émoji 😀'])
+    assert len(names) == 4
+    assert [names[row] for row in range(4)] == ['a', '弹幕姬', '', 'émoji 😀']
+    assert names[-1] == 'émoji 😀' and names[-4] == 'a'
+    assert names[1:3] == ['弹幕姬', ''] and names[::-2] == ['émoji 😀', '弹幕姬']
+    for row in (4, -5):
+        with pytest.raises(IndexError):
+            names[row]
+
+
+def test_name_arena_copies_are_independent():
+    names = NameArena(['a', 'b'])
+    copy = names.copy()
+    names.append('c')
+    assert list(copy) == ['a', 'b'] and list(names) == ['a', 'b', 'c']
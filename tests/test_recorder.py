@@ -0,0 +1,82 @@
+import os
+import time
+
+import pytest
+
+from recorder import EVENT_SIZE, SessionLog, SessionRecorder, message_hash
+
+
+pytest.importorskip('numpy')
+
+
+def written_events(path):
+    try:
+        return os.path.getsize(path + '.events') // EVENT_SIZE
+    except FileNotFoundError:   # Not opened by the writer thread yet
+        return 0
+
+
+@pytest.fixture
+def recorded(tmp_path):
+    path = str(tmp_path / 'session')
+    recorder = SessionRecorder(path, record_rejected=True)
+    recorder.record(1, 'a', '粉丝团', 5, '抽奖', True)
+    recorder.record(2, 'b', '', 0, '你好', False)
+    recorder.record(1, 'a', '粉丝团', 5, '抽奖啦', True)
+    recorder.record(3, 'c', '粉丝团', 12, '抽奖', True)
+    recorder.close()
+    log = SessionLog(path)
+    yield log
+    log.close()
+
+
+def test_names_are_stored_once_in_the_string_table(recorded):
+    assert recorded.strings == ['', 'a', '粉丝团', 'b', 'c']
+    assert os.path.getsize(recorded.path + '.events') == 4 * EVENT_SIZE
+
+
+def test_replay_gives_back_the_events(recorded):
+    events = list(recorded.replay())
+    assert [(uid, name, medal, level, accepted) for _, uid, name, medal, level, accepted, _ in events] == [
+        (1, 'a', '粉丝团', 5, True), (2, 'b', '', 0, False), (1, 'a', '粉丝团', 5, True), (3, 'c', '粉丝团', 12, True)]
+    assert events[0][-1] == message_hash('抽奖')
+
+
+def test_events_can_be_refiltered(recorded):
+    assert recorded.participants(recorded.select(accepted=True)) == [(1, 'a'), (3, 'c')]
+    assert recorded.participants(recorded.select(min_medal_level=10)) == [(3, 'c')]
+    assert int(recorded.select(msg='抽奖').sum()) == 2
+    assert int(recorded.select(medal='unknown').sum()) == 0
+
+
+def test_a_torn_trailing_record_is_ignored(tmp_path):
+    path = str(tmp_path / 'session')
+    recorder = SessionRecorder(path)
+    recorder.record(1, 'a', '', 0, 'x', True)
+    recorder.close()
+    with open(path + '.events', 'ab') as f:
+        f.write(b'\0' * (EVENT_SIZE // 2))
+    log = SessionLog(path)
+    assert len(log) == 1
+    log.close()
+
+
+def test_a_quiet_session_is_flushed_without_new_events(tmp_path):
+    path = str(tmp_path / 'session')
+    recorder = SessionRecorder(path, flush_interval=0.05)
+    recorder.record(1, 'a', '', 0, 'x', True)
+    deadline = time.monotonic() + 5
+    while not written_events(path):
+        assert time.monotonic() < deadline, "the buffered event was never written"
+        time.sleep(0.01)
+    recorder.close()
+
+
+def test_full_buffers_are_flushed(tmp_path):
+    path = str(tmp_path / 'session')
+    recorder = SessionRecorder(path, flush_interval=60, max_buffered_events=10)
+    for uid in range(25):
+        recorder.record(uid, f"n{uid}", '', 0, 'x', True)
+    assert len(recorder.events) == 5 * EVENT_SIZE    # Two buffers of 10 handed to the writer
+    recorder.close()
+    assert written_events(path) == 25
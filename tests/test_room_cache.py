@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+import pytest
+
+from manager import LIVE_STATUS_MAX_AGE, MonitorManager
+from room_cache import RoomInfoCache
+
+
+class Api():
+    def __init__(self, status=1, error=None):
+        self.calls, self.status, self.error = [], status, error
+
+    async def fetch(self, room_id):
+        self.calls.append(room_id)
+        await asyncio.sleep(0.01)
+        if self.error is not None:
+            raise self.error
+        return f"room {room_id}", 'anchor', self.status
+
+
+def cached(cache, room_id, age, status=1):
+    cache.entries[room_id] = (time.time() - age, (f"room {room_id}", 'anchor', status))
+
+
+def test_fresh_and_stale_entries_are_served_without_waiting():
+    async def run():
+        api, cache = Api(status=0), RoomInfoCache(ttl=60)
+        cached(cache, 1, 10)
+        cached(cache, 2, 120)
+        assert await cache.get(1, api.fetch) == ('room 1', 'anchor', 1)
+        assert await cache.get(2, api.fetch) == ('room 2', 'anchor', 1)
+        # Stale, refreshed in the background
+        await cache.fetching[2]
+        assert api.calls == [2]
+        assert await cache.get(2, api.fetch) == ('room 2', 'anchor', 0)
+        return cache
+    assert asyncio.run(run()).stats() == {'entries': 2, 'hits': 2, 'stale_hits': 1, 'misses': 0, 'errors': 0}
+
+
+def test_missing_and_too_old_entries_are_fetched():
+    async def run():
+        api, cache = Api(status=0), RoomInfoCache(max_age=3600)
+        cached(cache, 1, 7200)
+        assert await cache.get(1, api.fetch) == ('room 1', 'anchor', 0)
+        assert await cache.get(2, api.fetch, max_age=0) == ('room 2', 'anchor', 0)
+        return cache
+    assert asyncio.run(run()).num_misses == 2
+
+
+def test_concurrent_requests_share_one_api_call():
+    async def run():
+        api, cache = Api(), RoomInfoCache()
+        infos = await asyncio.gather(*(cache.get(1, api.fetch) for _ in range(10)))
+        return api, infos
+    api, infos = asyncio.run(run())
+    assert api.calls == [1] and len(set(infos)) == 1
+
+
+def test_errors_are_counted_and_raised():
+    async def run():
+        cache = RoomInfoCache()
+        with pytest.raises(OSError):
+            await cache.get(1, Api(error=OSError("offline")).fetch)
+        await cache.prefetch([2], Api(error=OSError("offline")).fetch)
+        return cache
+    cache = asyncio.run(run())
+    assert cache.num_errors == 2 and not cache.entries and not cache.fetching
+
+
+def test_least_recently_used_entries_are_evicted():
+    async def run():
+        api, cache = Api(), RoomInfoCache(max_entries=2)
+        await cache.get(1, api.fetch)
+        await cache.get(2, api.fetch)
+        await cache.get(1, api.fetch)
+        await cache.get(3, api.fetch)
+        return cache
+    cache = asyncio.run(run())
+    assert cache.recent(5) == [3, 1]
+
+
+def test_entries_persist_across_instances(tmp_path):
+    path = str(tmp_path / 'room_cache.json')
+
+    async def run():
+        cache = RoomInfoCache(path)
+        await cache.get(1, Api().fetch)
+        await cache.save_task
+    asyncio.run(run())
+    cache = RoomInfoCache(path)
+    assert cache.entries[1][1] == ('room 1', 'anchor', 1) and cache.age(1) < 60
+
+
+def test_sessions_start_from_the_cache_and_recheck_the_live_status(live_rooms):
+    live_rooms.infos[1] = ('room 1', 'anchor', 0)
+    rechecked = []
+
+    async def run():
+        cache = RoomInfoCache()
+        cached(cache, 1, LIVE_STATUS_MAX_AGE + 1, status=1)
+        cached(cache, 2, LIVE_STATUS_MAX_AGE + 1, status=1)
+        cached(cache, 3, 0, status=1)
+        infos = await MonitorManager(cache).get_room_info([1, 2, 3], lambda *args: rechecked.append(args))
+        assert rechecked == [] and all(info[2] == 1 for info in infos.values())
+        await asyncio.gather(*cache.fetching.values())
+        await asyncio.sleep(0)
+        return cache
+    asyncio.run(run())
+    # Only the room whose status changed is reported, the fresh entry is not rechecked
+    assert rechecked == [(1, ('room 1', 'anchor', 0))]
+    assert live_rooms.num_info_calls == 2
@@ -0,0 +1,59 @@
+import pytest
+
+from benchmarks.loadgen import make_danmu_event
+from sources import DEFAULT_SOURCE_WEIGHTS, PARSERS, Entry, parse_source_weights
+from test_core import feed, make_danmuku
+
+
+def make_gift_event(uid, viewer_name, coin_type='gold', medal_name=''):
+    return {'data': {'cmd': 'SEND_GIFT', 'data': {
+        'uid': uid, 'uname': viewer_name, 'giftName': '小心心', 'num': 2, 'coin_type': coin_type,
+        'medal_info': {'medal_name': medal_name, 'medal_level': 3 if medal_name else 0}}}}
+
+
+def make_super_chat_event(uid, viewer_name, msg):
+    return {'data': {'cmd': 'SUPER_CHAT_MESSAGE', 'data': {
+        'uid': uid, 'message': msg, 'price': 30, 'user_info': {'uname': viewer_name}, 'medal_info': None}}}
+
+
+def make_guard_event(uid, viewer_name):
+    return {'data': {'cmd': 'GUARD_BUY', 'data': {
+        'uid': uid, 'username': viewer_name, 'guard_level': 3, 'num': 1, 'price': 198000, 'gift_name': '舰长'}}}
+
+
+def parse(event):
+    return PARSERS[event['data']['cmd']](event['data'])
+
+
+def test_every_source_parses_into_an_entry():
+    assert parse(make_danmu_event(1, 'a', '抽奖', '粉丝团', 5)) == Entry('DANMU_MSG', 1, 'a', '粉丝团', 5, '抽奖')
+    assert parse(make_danmu_event(1, 'a', '抽奖')) == Entry('DANMU_MSG', 1, 'a', '', 0, '抽奖')
+    assert parse(make_gift_event(2, 'b', medal_name='粉丝团')) == \
+        Entry('SEND_GIFT', 2, 'b', '粉丝团', 3, '小心心 x2')
+    assert parse(make_super_chat_event(3, 'c', '加油')) == Entry('SUPER_CHAT_MESSAGE', 3, 'c', '', 0, '加油')
+    assert parse(make_guard_event(4, 'd')) == Entry('GUARD_BUY', 4, 'd', '', 0, '舰长')
+
+
+def test_free_gifts_enter_nobody():
+    assert parse(make_gift_event(2, 'b', 'silver')) is None
+
+
+def test_only_danmu_enter_by_default():
+    assert parse_source_weights(None) == DEFAULT_SOURCE_WEIGHTS == {'DANMU_MSG': 1}
+
+
+def test_weights_are_overridden_by_name():
+    assert parse_source_weights(['gift=2', 'SUPER_CHAT_MESSAGE=3', 'danmu=0']) == \
+        {'SEND_GIFT': 2, 'SUPER_CHAT_MESSAGE': 3}
+    with pytest.raises(ValueError):
+        parse_source_weights(['likes=1'])
+
+
+def test_paid_entries_skip_the_keyword_rules():
+    danmuku = make_danmuku(paizi='粉丝团', keyword='抽奖')
+    danmuku.source_weights = parse_source_weights(['gift=5'])
+    feed(danmuku, [make_gift_event(1, 'a', medal_name='粉丝团'), make_gift_event(2, 'b', 'silver', '粉丝团'),
+                   make_gift_event(3, 'c', medal_name='别的'), make_danmu_event(4, 'd', '你好', '粉丝团', 1)])
+    assert list(danmuku.participants.uids) == [1]
+    assert list(danmuku.participants.counts) == [5]
+    assert dict(danmuku.num_entries) == {'SEND_GIFT': 1}
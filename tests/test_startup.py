@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('numpy', 'bilibili_api', 'aiohttp')
+
+
+def loaded_heavy_modules(module):
+    """
+    Heavy modules loaded by importing `module` in a fresh interpreter
+    """
+    code = (f"import sys, {module}; "
+            f"print(' '.join(sorted({{name.split('.')[0] for name in sys.modules}} & set({HEAVY_MODULES!r}))))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True,
+                            env=dict(os.environ, QT_QPA_PLATFORM='offscreen'))
+    return result.stdout.split()
+
+
+@pytest.mark.parametrize('module', ['participants', 'core', 'manager', 'headless', 'danmuji'])
+def test_monitoring_modules_load_nothing_heavy(module):
+    assert loaded_heavy_modules(module) == []
+
+
+def test_the_main_window_loads_nothing_heavy():
+    pytest.importorskip('PyQt5.QtWidgets')
+    assert loaded_heavy_modules('gui') == []
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import random
+
+from benchmarks.loadgen import make_danmu_event
+from supervisor import ConnectionSupervisor
+
+
+def supervise(listeners, until, **kwargs):
+    """
+    Run a supervisor until the condition on it holds, then stop it and return it
+    """
+    async def run():
+        supervisor = ConnectionSupervisor(1, listeners, **kwargs)
+        task = asyncio.create_task(supervisor.run())
+        while not until(supervisor):
+            assert not task.done()
+            await asyncio.sleep(0.005)
+        await supervisor.stop()
+        await asyncio.wait_for(task, 5)
+        return supervisor
+    return asyncio.run(asyncio.wait_for(run(), 5))
+
+
+def test_reconnects_after_every_drop(live_rooms):
+    received = []
+
+    async def on_danmu(event):
+        received.append(event['data']['info'][1])
+    live_rooms.add([make_danmu_event(1, 'a', 'first')], 'close')
+    live_rooms.add([make_danmu_event(1, 'a', 'second')], ConnectionResetError())
+    live_rooms.add([make_danmu_event(1, 'a', 'third')])
+    supervisor = supervise({'DANMU_MSG': on_danmu}, lambda supervisor: len(received) == 3, backoff_base=0.01)
+
+    assert received == ['first', 'second', 'third']
+    stats = supervisor.stats()
+    assert stats['connects'] == 3 and stats['reconnects'] == 2 and stats['heartbeat_timeouts'] == 0
+    # The gap of each drop closes with the first event of the next connection
+    assert stats['downtime_windows'] == 2
+    assert all(start <= end for start, end in supervisor.downtime_windows)
+    assert supervisor.attempt == 0
+
+
+def test_backoff_doubles_up_to_the_maximum(live_rooms, monkeypatch, caplog):
+    monkeypatch.setattr(random, 'uniform', lambda low, high: 1)
+    for _ in range(5):
+        live_rooms.add(outcome='close')
+    with caplog.at_level(logging.WARNING, logger='supervisor'):
+        supervise({}, lambda supervisor: supervisor.num_connects == 6, backoff_base=0.001, backoff_max=0.004)
+    delays = [record.args[2] for record in caplog.records if 'reconnecting' in record.msg]
+    assert delays == [0.001, 0.002, 0.004, 0.004, 0.004]
+
+
+def test_a_silent_connection_times_out(live_rooms):
+    supervisor = supervise({}, lambda supervisor: supervisor.num_reconnects >= 1, heartbeat_timeout=0.04,
+                           backoff_base=0.001)
+    assert supervisor.num_timeouts >= 1
+    # Stopped before any event came back
+    assert supervisor.stats()['downtime_windows'] == 1 and supervisor.down_since is None
+
+
+def test_stop_interrupts_the_backoff(live_rooms):
+    live_rooms.add(outcome='close')
+
+    async def run():
+        supervisor = ConnectionSupervisor(1, {}, backoff_base=60)
+        task = asyncio.create_task(supervisor.run())
+        while supervisor.num_reconnects == 0:
+            await asyncio.sleep(0.005)
+        await supervisor.stop()
+        await asyncio.wait_for(task, 1)
+        return supervisor
+    supervisor = asyncio.run(run())
+    assert supervisor.num_connects == 1 and supervisor.downtime() >= 0
@@ -0,0 +1,50 @@
+import pytest
+
+from participants import ParticipantStore
+
+
+@pytest.fixture
+def models(qapp):
+    from viewer_model import ViewerFilterModel, ViewerListModel
+    model = ViewerListModel()
+    return model, ViewerFilterModel(model)
+
+
+def names(model):
+    return [model.data(model.index(row, 0)) for row in range(model.rowCount())]
+
+
+def test_rows_are_read_from_the_store(models):
+    model, _ = models
+    store = ParticipantStore()
+    store.add(1, 'a')
+    model.set_store(store)
+    assert names(model) == ['a']
+
+
+def test_sync_announces_only_new_viewers(models):
+    model, _ = models
+    store = ParticipantStore()
+    model.set_store(store)
+    inserted = []
+    model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+    store.add(1, 'a')
+    store.add(2, 'b')
+    assert model.sync() == 2
+    assert model.sync() == 0
+    store.add(3, 'c')
+    assert model.sync() == 1
+    assert inserted == [(0, 1), (2, 2)]
+    assert names(model) == ['a', 'b', 'c']
+
+
+def test_search_is_case_insensitive(models):
+    model, filter_model = models
+    store = ParticipantStore()
+    for uid, name in enumerate(['Alice', 'bob', 'ALina', '小明']):
+        store.add(uid, name)
+    model.set_store(store)
+    filter_model.setFilterFixedString('al')
+    assert names(filter_model) == ['Alice', 'ALina']
+    filter_model.setFilterFixedString('明')
+    assert names(filter_model) == ['小明']
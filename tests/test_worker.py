@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+from benchmarks.loadgen import make_danmu_event
+from core import Danmuku
+from supervisor import ConnectionSupervisor
+from worker import DanmuWorker
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_accepted_entries_are_merged_into_batches(live_rooms):
+    live_rooms.add([make_danmu_event(1, 'a', 'x', '粉丝团', 3), make_danmu_event(2, 'b', 'y'),
+                    make_danmu_event(1, 'a', 'z', '粉丝团', 5)])
+    danmuku = Danmuku()
+    worker = DanmuWorker(1, danmuku._filter_event, batch_interval=0.01)
+    worker.start()
+    batches = []
+    wait_for(lambda: batches.extend(worker.drain()) or sum(num_danmu for num_danmu, _ in batches) == 3)
+    asyncio.run(worker.stop())
+    worker.join(5)
+    assert not worker.is_alive() and worker.error is None
+
+    viewers = {}
+    for _, batch in batches:
+        viewers.update(batch)
+    assert viewers[1].name == 'a' and viewers[1].count == 2 and viewers[1].medal_level == 5
+    assert viewers[2].count == 1
+
+
+def test_a_worker_failing_to_connect_reports_its_error(monkeypatch):
+    def make_room(supervisor):
+        raise RuntimeError("no bilibili_api")
+    monkeypatch.setattr(ConnectionSupervisor, '_make_room', make_room)
+    worker = DanmuWorker(1, lambda event: None)
+    worker.start()
+    worker.join(5)
+    assert worker.connected.is_set()
+    assert isinstance(worker.error, RuntimeError)
+
+
+def test_threaded_monitor_collects_the_worker_batches(live_rooms):
+    live_rooms.add([make_danmu_event(uid, f"n{uid}", '抽奖') for uid in range(10)])
+
+    async def session():
+        danmuku = Danmuku()
+        await danmuku.start_monitor(lambda num_danmu, participants: None, 1, threaded=True)
+        while danmuku.num_danmu < 10:
+            await asyncio.sleep(0.01)
+        return danmuku, await danmuku.stop_monitor()
+
+    danmuku, snapshot = asyncio.run(asyncio.wait_for(session(), 5))
+    assert list(snapshot.names) == [f"n{uid}" for uid in range(10)]
+    assert danmuku.worker_error is None
+
+
+def test_threaded_monitor_reports_a_worker_stopping_on_its_own(live_rooms):
+    async def session():
+        danmuku = Danmuku()
+        await danmuku.start_monitor(lambda num_danmu, participants: None, 1, threaded=True)
+        worker = danmuku.worker
+        # The connection gives up without stop_monitor() asking for it
+        asyncio.run_coroutine_threadsafe(worker.supervisor.stop(), worker.loop)
+        await danmuku.start_monitor_task
+        return danmuku
+
+    danmuku = asyncio.run(asyncio.wait_for(session(), 5))
+    assert danmuku.worker_error == "exited on its own"
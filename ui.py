@@ -2,7 +2,7 @@
 
 # Form implementation generated from reading ui file 'ui\design5.ui'
 #
-# Created by: PyQt5 UI code generator 5.15.4
+# Created by: PyQt5 UI code generator 5.15.11
 #
 # WARNING: Any manual changes made to this file will be lost when pyuic5 is
 # run again.  Do not edit this file unless you know what you are doing.
@@ -116,14 +116,20 @@ class Ui_MainWindow(object):
         self.label_6.setSizePolicy(sizePolicy)
         self.label_6.setObjectName("label_6")
         self.verticalLayout_3.addWidget(self.label_6)
-        self.textBrowser_viewers = QtWidgets.QTextBrowser(self.centralwidget)
+        self.listView_viewers = QtWidgets.QListView(self.centralwidget)
         sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
         sizePolicy.setHorizontalStretch(0)
         sizePolicy.setVerticalStretch(3)
-        sizePolicy.setHeightForWidth(self.textBrowser_viewers.sizePolicy().hasHeightForWidth())
-        self.textBrowser_viewers.setSizePolicy(sizePolicy)
-        self.textBrowser_viewers.setObjectName("textBrowser_viewers")
-        self.verticalLayout_3.addWidget(self.textBrowser_viewers)
+        sizePolicy.setHeightForWidth(self.listView_viewers.sizePolicy().hasHeightForWidth())
+        self.listView_viewers.setSizePolicy(sizePolicy)
+        self.listView_viewers.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.listView_viewers.setUniformItemSizes(True)
+        self.listView_viewers.setObjectName("listView_viewers")
+        self.verticalLayout_3.addWidget(self.listView_viewers)
+        self.lineEdit_viewer_search = QtWidgets.QLineEdit(self.centralwidget)
+        self.lineEdit_viewer_search.setClearButtonEnabled(True)
+        self.lineEdit_viewer_search.setObjectName("lineEdit_viewer_search")
+        self.verticalLayout_3.addWidget(self.lineEdit_viewer_search)
         self.horizontalLayout_3.addLayout(self.verticalLayout_3)
         self.gridLayout = QtWidgets.QGridLayout()
         self.gridLayout.setObjectName("gridLayout")
@@ -213,6 +219,7 @@ class Ui_MainWindow(object):
         self.checkBox_keyword.setText(_translate("MainWindow", "包含以下关键词："))
         self.pushButton_lottery.setText(_translate("MainWindow", "开始统计"))
         self.label_6.setText(_translate("MainWindow", "参与观众："))
+        self.lineEdit_viewer_search.setPlaceholderText(_translate("MainWindow", "搜索观众"))
         self.label_2.setText(_translate("MainWindow", "弹幕数量："))
         self.label_3.setText(_translate("MainWindow", "观众数量："))
         self.label_5.setText(_translate("MainWindow", "统计结果："))
@@ -0,0 +1,62 @@
+"""
+    Qt item models backing the viewer panel of the main window.
+"""
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, QSortFilterProxyModel, Qt
+
+from participants import ParticipantStore
+
+
+class ViewerListModel(QAbstractListModel):
+    """
+        Read-only list model exposing the names in a ParticipantStore.
+
+        The model never copies the names: rows are looked up in the store on demand, so a
+        QListView only pays for the rows that are actually visible. Since the store is
+        append-only, new viewers are announced incrementally with beginInsertRows().
+    """
+
+    def __init__(self, parent=None):
+        super(ViewerListModel, self).__init__(parent)
+        self.store = ParticipantStore()
+        self.num_rows = 0   # Rows already announced to the views
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.num_rows
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return self.store.names[index.row()]
+        return None
+
+    def set_store(self, store):
+        """
+        Back the model by another participant store, e.g. when a new monitoring session starts.
+        """
+        self.beginResetModel()
+        self.store = store
+        self.num_rows = len(store)
+        self.endResetModel()
+
+    def sync(self):
+        """
+        Announce the viewers appended to the store since the last sync. Returns the number of new rows.
+        """
+        num_new = len(self.store) - self.num_rows
+        if num_new > 0:
+            self.beginInsertRows(QModelIndex(), self.num_rows, self.num_rows + num_new - 1)
+            self.num_rows += num_new
+            self.endInsertRows()
+        return num_new
+
+
+class ViewerFilterModel(QSortFilterProxyModel):
+    """
+        Case-insensitive substring filter over a ViewerListModel, used by the viewer search box.
+
+        The proxy only keeps a row mapping, the names stay in the participant store.
+    """
+
+    def __init__(self, source_model, parent=None):
+        super(ViewerFilterModel, self).__init__(parent)
+        self.setSourceModel(source_model)
+        self.setFilterCaseSensitivity(Qt.CaseInsensitive)
@@ -0,0 +1,150 @@
+"""
+    Danmu worker thread, keeping the live connection off the GUI event loop.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+
+from metrics import METRICS
+from supervisor import ConnectionSupervisor
+
+
+BATCH_INTERVAL = 0.05   # Seconds between two batches sent to the GUI thread
+MAX_QUEUED_BATCHES = 64
+
+logger = logging.getLogger(__name__)
+
+
+class PendingViewer():
+    """
+        Entries of a viewer accumulated in the current batch.
+    """
+
+    __slots__ = ('name', 'count', 'medal_level', 'first_seen', 'last_seen')
+
+    def __init__(self, name, count, medal_level, seen):
+        self.name, self.count, self.medal_level = name, count, medal_level
+        self.first_seen = self.last_seen = seen
+
+
+class DanmuWorker(threading.Thread):
+    """
+        Runs a live room connection in a dedicated thread with its own asyncio event loop.
+
+        Websocket decompression, JSON parsing and the event filter all happen in this thread. Accepted
+        entries are merged into batches of (num_danmu, {uid: PendingViewer}) and handed over through a
+        bounded queue. When the queue is full the worker does not block its loop: it keeps merging into
+        the current batch and retries on the next tick, which is counted as a deferred flush.
+    """
+
+    def __init__(self, room_id, event_filter, sources=('DANMU_MSG',), batch_interval=BATCH_INTERVAL,
+                 max_batches=MAX_QUEUED_BATCHES):
+        super(DanmuWorker, self).__init__(name=f"DanmuWorker-{room_id}", daemon=True)
+        self.room_id = room_id
+        self.event_filter = event_filter    # event -> (Entry, weight) or None
+        self.sources = sources              # Event types to subscribe to
+        self.batch_interval = batch_interval
+        self.queue = queue.Queue(maxsize=max_batches)
+        self.loop, self.supervisor = None, None
+        self.connected = threading.Event()
+        self.stopping = False
+        self.error = None   # Exception the thread died of
+        # Batch being built in the worker loop
+        self.num_danmu, self.viewers = 0, {}
+        # Backpressure metrics
+        self.num_batches, self.num_deferred, self.max_queue_depth = 0, 0, 0
+
+    def run(self):
+        METRICS.gauge(f"worker_queue_depth:{self.room_id}", self.queue.qsize)
+        # Not asyncio.new_event_loop(): under qasync the policy would hand out a QEventLoop, which cannot
+        # run outside of a QThread
+        self.loop = asyncio.DefaultEventLoopPolicy().new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._main())
+        except Exception as e:
+            self.error = e
+            logger.exception("Room %s worker thread failed", self.room_id)
+        finally:
+            self.connected.set()    # Never leave stop() waiting if the connection failed early
+            self.loop.close()
+            METRICS.remove_gauge(f"worker_queue_depth:{self.room_id}")
+
+    async def _main(self):
+        self.supervisor = ConnectionSupervisor(self.room_id, dict.fromkeys(self.sources, self._on_event))
+        self.connected.set()
+        flush_task = asyncio.create_task(self._flush_periodically())
+        try:
+            await self.supervisor.run()
+        finally:
+            flush_task.cancel()
+            # The last batch must not be lost, the GUI thread keeps draining until this thread exits
+            self._flush(block=True)
+
+    async def _on_event(self, event):
+        start = time.perf_counter_ns()
+        METRICS.count('events')
+        accepted = self.event_filter(event)
+        if accepted:
+            entry, weight = accepted
+            self.num_danmu += 1
+            now = time.time()
+            viewer = self.viewers.get(entry.uid)
+            if viewer is None:
+                self.viewers[entry.uid] = PendingViewer(entry.name, weight, entry.medal_level, now)
+            else:
+                viewer.count += weight
+                if entry.medal_level > viewer.medal_level:
+                    viewer.medal_level = entry.medal_level
+                viewer.last_seen = now
+            METRICS.count('danmu')
+        METRICS.record('worker_handler', time.perf_counter_ns() - start)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.batch_interval)
+            self._flush()
+
+    def _flush(self, block=False):
+        if not self.num_danmu:
+            return
+        try:
+            self.queue.put((self.num_danmu, self.viewers), block=block)
+        except queue.Full:
+            self.num_deferred += 1
+            return
+        self.num_danmu, self.viewers = 0, {}
+        self.num_batches += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+
+    def drain(self):
+        """
+        Returns all the batches currently queued. Called from the GUI thread.
+        """
+        batches = []
+        while True:
+            try:
+                batches.append(self.queue.get_nowait())
+            except queue.Empty:
+                return batches
+
+    async def stop(self):
+        """
+        Disconnect the room from the worker loop. The thread exits once the connection is closed.
+        """
+        self.stopping = True
+        await asyncio.get_running_loop().run_in_executor(None, self.connected.wait)
+        if not self.is_alive():
+            return
+        future = asyncio.run_coroutine_threadsafe(self.supervisor.stop(), self.loop)
+        await asyncio.wrap_future(future)
+
+    def stats(self):
+        return {
+            'batches': self.num_batches,
+            'deferred_flushes': self.num_deferred,
+            'queue_depth': self.queue.qsize(),
+            'max_queue_depth': self.max_queue_depth,
+        }